@@ -0,0 +1,169 @@
+import numpy as np
+from pyLIMA.magnification import magnification_Jacobian
+
+
+def astrometric_PSPL_Jacobian(pspl_model, telescope, pyLIMA_parameters):
+    """
+    The Jacobian of the PSPL astrometric positions (no blend), i.e. the derivatives
+    of [position_ra,position_dec] with the model parameters, see
+    astrometric_shifts.PSPL_shifts_no_blend,
+    astrometric_positions.xy_shifts_to_NE_shifts and
+    astrometric_positions.astrometric_positions_of_the_source
+
+    Parameters
+    ----------
+    pspl_model : object, a PSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+
+    Returns
+    -------
+    astrometric_jacobian : array, the (2*len(astrometry),n_parameters) Jacobian,
+    i.e. the ra rows then the dec rows. The columns follow the model parameters
+    order (telescopes fluxes excluded).
+    """
+    time = telescope.data_arrays('astrometry')['time']
+
+    tau, beta, trajectory_derivatives = magnification_Jacobian.trajectory_Jacobian(
+        pspl_model, telescope, pyLIMA_parameters, data_type='astrometry')[0]
+
+    # The source positions relative to the lens are (-tau,-beta)
+    source_x = -tau
+    source_y = -beta
+
+    theta_E = pyLIMA_parameters['theta_E']
+    piEN = pyLIMA_parameters['piEN']
+    piEE = pyLIMA_parameters['piEE']
+
+    denominator = source_x ** 2 + source_y ** 2 + 2
+
+    shift_x = theta_E * source_x / denominator
+    shift_y = theta_E * source_y / denominator
+
+    dshift_xdx = theta_E * (denominator - 2 * source_x ** 2) / denominator ** 2
+    dshift_xdy = -2 * theta_E * source_x * source_y / denominator ** 2
+    dshift_ydx = dshift_xdy
+    dshift_ydy = theta_E * (denominator - 2 * source_y ** 2) / denominator ** 2
+
+    # Rotation to North, East
+    angle = np.arctan2(piEE, piEN)
+    cos_angle = np.cos(angle)
+    sin_angle = np.sin(angle)
+
+    delta_dec = shift_x * cos_angle - sin_angle * shift_y
+    delta_ra = shift_x * sin_angle + cos_angle * shift_y
+
+    def rotate(dshift_x, dshift_y):
+
+        return (dshift_x * sin_angle + cos_angle * dshift_y,
+                dshift_x * cos_angle - sin_angle * dshift_y)
+
+    derivatives = {}
+
+    for key, (dtau, dbeta) in trajectory_derivatives.items():
+
+        dx = -dtau
+        dy = -dbeta
+
+        derivatives[key] = rotate(dshift_xdx * dx + dshift_xdy * dy,
+                                  dshift_ydx * dx + dshift_ydy * dy)
+
+    derivatives['theta_E'] = rotate(shift_x / theta_E, shift_y / theta_E)
+
+    dangledpiEN = -piEE / (piEN ** 2 + piEE ** 2)
+    dangledpiEE = piEN / (piEN ** 2 + piEE ** 2)
+
+    for key, dangle in [('piEN', dangledpiEN), ('piEE', dangledpiEE)]:
+
+        derivatives[key] = (derivatives[key][0] + delta_dec * dangle,
+                            derivatives[key][1] - delta_ra * dangle)
+
+    if telescope.astrometry['ra'].unit == 'deg':
+
+        shifts_scale = 1 / 3600. / 1000
+        proper_motion_scale = 1 / 365.25 / 3600 / 1000
+        parallax_scale = 1 / 3600 / 1000
+
+    else:
+
+        shifts_scale = 1 / telescope.pixel_scale
+        proper_motion_scale = 1 / 365.25
+        parallax_scale = 1 / telescope.pixel_scale
+
+    derivatives = {key: (value[0] * shifts_scale, value[1] * shifts_scale) for
+                   key, value in derivatives.items()}
+
+    time_ref = pspl_model.parallax_model[1]
+
+    if time_ref is None:
+
+        time_ref = pyLIMA_parameters['t0']
+
+        derivatives['t0'] = (
+            derivatives['t0'][0] - proper_motion_scale * pyLIMA_parameters[
+                'mu_source_E'],
+            derivatives['t0'][1] - proper_motion_scale * pyLIMA_parameters[
+                'mu_source_N'])
+
+    zeros = np.zeros(len(time))
+
+    earth_vector = telescope.Earth_positions_projected['astrometry']
+
+    derivatives['mu_source_E'] = (proper_motion_scale * (time - time_ref), zeros)
+    derivatives['mu_source_N'] = (zeros, proper_motion_scale * (time - time_ref))
+    derivatives['pi_source'] = (-earth_vector[1] * parallax_scale,
+                                -earth_vector[0] * parallax_scale)
+    derivatives['position_source_E_' + telescope.name] = (zeros + 1, zeros)
+    derivatives['position_source_N_' + telescope.name] = (zeros, zeros + 1)
+
+    derivatives = pspl_model.parameters_layout.chain_rule(derivatives,
+                                                          pyLIMA_parameters)
+
+    fluxes_keys = pspl_model.telescopes_fluxes_model_parameters({}).keys()
+
+    astrometric_jacobian = np.array(
+        [np.r_[derivatives.get(key, (zeros, zeros))] for key in
+         pspl_model.model_dictionnary.keys() if key not in fluxes_keys]).T
+
+    return astrometric_jacobian
+
+
+def astrometric_numerical_Jacobian(microlensing_model, telescope, pyLIMA_parameters):
+    """
+    The Jacobian of the astrometric positions of any models, see
+    magnification_Jacobian.numerical_Jacobian
+
+    Parameters
+    ----------
+    microlensing_model : object, a microlensing model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+
+    Returns
+    -------
+    astrometric_jacobian : array, the (2*len(astrometry),n_parameters) numerical
+    Jacobian
+    """
+    x = np.array([pyLIMA_parameters[key] for key in
+                  microlensing_model.model_dictionnary.keys()
+                  if key not in microlensing_model.telescopes_fluxes_model_parameters(
+                  {}).keys()], dtype=float)
+
+    astrometry = model_astrometry_numerical(x, microlensing_model, telescope)
+    steps = magnification_Jacobian.numerical_Jacobian_steps(microlensing_model, x)
+
+    astrometric_jacobian = magnification_Jacobian.numerical_Jacobian(
+        model_astrometry_numerical, x, astrometry, steps,
+        args=(microlensing_model, telescope),
+        computational_pool=microlensing_model.Jacobian_pool)
+
+    return astrometric_jacobian
+
+
+def model_astrometry_numerical(parameters, microlensing_model, telescope):
+
+    pym = microlensing_model.compute_pyLIMA_parameters(parameters)
+
+    astrometry = microlensing_model.model_astrometry(telescope, pym)
+
+    return np.concatenate(astrometry)
@@ -44,7 +44,7 @@ def astrometric_positions_of_the_source(telescope, pyLIMA_parameters, time_ref=N
     position_ra : array, the astrometric position in North, degree or pixels
     position_dec : array, the astrometric position in East, degree or pixels
     """
-    time = telescope.astrometry['time'].value
+    time = telescope.data_arrays('astrometry')['time']
 
     if time_ref is None:
         time_ref = pyLIMA_parameters['t0']
@@ -10,13 +10,27 @@ from pyLIMA import event
 
 
 class BOOTSTRAPfit(MLfit):
-    """Under Construction"""
-
-    def __init__(self, model, bootstrap_fitter='TRF', telescopes_fluxes_method='fit'):
+    """
+    Under Construction
+
+    Attributes
+    ----------
+    bootstrap_method : str, 'resample' to fit a new model on resampled data or
+    'weights' to fit the original model, the resampling being the integer
+    multiplicity of each residual (no new event, model or ephemerides)
+    """
+
+    def __init__(self, model, bootstrap_fitter='TRF', telescopes_fluxes_method='fit',
+                 bootstrap_method='resample'):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, telescopes_fluxes_method=telescopes_fluxes_method)
 
+        if bootstrap_method not in ['resample', 'weights']:
+            raise ValueError('Unknown bootstrap method: ' + str(bootstrap_method))
+
+        self.bootstrap_method = bootstrap_method
+
     def generate_new_model(self):
 
         # create a new event
@@ -60,13 +74,61 @@ class BOOTSTRAPfit(MLfit):
 
         return new_model
 
+    def generate_residuals_weights(self):
+        """
+        Resample the data as the multiplicity of each residual, in the order of
+        LMfit.objective_function (the photometry then the ra and dec of each
+        telescope)
+
+        Returns
+        -------
+        residuals_weights : array, the number of times each residual is drawn
+        """
+        weights = {'photometry': [], 'astrometry': []}
+
+        for tel in self.model.event.telescopes:
+
+            if (tel.lightcurve is not None) & self.model.photometry:
+
+                bootstrap_indexes_photometry = np.random.randint(0,
+                                                                 len(tel.lightcurve),
+                                                                 len(tel.lightcurve))
+
+                weights['photometry'].append(np.bincount(
+                    bootstrap_indexes_photometry, minlength=len(tel.lightcurve)))
+
+            if (tel.astrometry is not None) & self.model.astrometry:
+
+                bootstrap_indexes_astrometry = np.random.randint(0, len(tel.astrometry),
+                                                                 len(tel.astrometry))
+
+                astrometry_weights = np.bincount(bootstrap_indexes_astrometry,
+                                                 minlength=len(tel.astrometry))
+
+                weights['astrometry'].append(np.r_[astrometry_weights,
+                                                   astrometry_weights])
+
+        residuals_weights = np.concatenate(weights['photometry'] +
+                                           weights['astrometry']).astype(float)
+
+        return residuals_weights
+
     def new_step(self, popi, popo):
 
         from pyLIMA.fits import TRF_fit
         np.random.seed(popi)
-        updated_model = self.generate_new_model()
 
-        trf = TRF_fit.TRFfit(updated_model)
+        if self.bootstrap_method == 'weights':
+
+            trf = TRF_fit.TRFfit(self.model)
+            trf.residuals_weights = self.generate_residuals_weights()
+
+        else:
+
+            updated_model = self.generate_new_model()
+
+            trf = TRF_fit.TRFfit(updated_model)
+
         trf.model_parameters_guess = self.model_parameters_guess
 
         for key in self.fit_parameters.keys():
@@ -10,10 +10,15 @@ from pyLIMA.priors import parameters_priors
 class DEMCfit(MLfit):
     """
     Under Construction
+
+    Attributes
+    -----------
+    vectorize : bool, turns on to score all the walkers in one call of the batched
+    objective function (see MLfit.standard_objective_function_batch)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', loss_function='likelihood',
-                 DEMC_walkers=2, DEMC_links=5000):
+                 DEMC_walkers=2, DEMC_links=5000, vectorize=False):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -24,6 +29,7 @@ class DEMCfit(MLfit):
         self.DEMC_walkers = DEMC_walkers  # times number of dimension!
         self.DEMC_links = DEMC_links
         self.DEMC_chains = []
+        self.vectorize = vectorize
         self.priors = parameters_priors.default_parameters_priors(self.fit_parameters)
 
     def fit_type(self):
@@ -40,6 +46,29 @@ class DEMCfit(MLfit):
 
         return likelihood
 
+    def objective_function_batch(self, fit_process_parameters):
+        """
+        The vectorized objective function, for emcee vectorize=True
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (K,n) array of walkers positions
+
+        Returns
+        -------
+        ln_probability : array, the K values of the ln-probability
+        """
+        inside = self.fit_parameters_inside_limits_batch(fit_process_parameters)
+
+        ln_probability = np.full(len(fit_process_parameters), -np.inf)
+
+        if inside.any():
+
+            ln_probability[inside] = -self.standard_objective_function_batch(
+                fit_process_parameters[inside])
+
+        return ln_probability
+
     def fit(self, initial_population=[], computational_pool=False):
 
         start_time = python_time.time()
@@ -49,6 +78,14 @@ class DEMCfit(MLfit):
         number_of_parameters = len(self.fit_parameters)
         nwalkers = self.DEMC_walkers * number_of_parameters
 
+        if self.vectorize:
+
+            objective_function = self.objective_function_batch
+
+        else:
+
+            objective_function = self.objective_function
+
         if initial_population == []:
 
             import scipy.stats as ss
@@ -69,7 +106,14 @@ class DEMCfit(MLfit):
                 individual = np.array(individual)
                 individual = np.r_[individual]
 
-                objective = self.objective_function(individual)
+                if self.vectorize:
+
+                    objective = objective_function(individual[None, :])[0]
+
+                else:
+
+                    objective = objective_function(individual)
+
                 individual = np.r_[individual, objective]
 
                 initial_population.append(individual)
@@ -102,18 +146,19 @@ class DEMCfit(MLfit):
             with pool:
 
                 sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                                self.objective_function,
+                                                objective_function,
                                                 a=2.0,
                                                 moves=[(emcee.moves.DEMove(), 0.8), (
                                                     emcee.moves.DESnookerMove(), 0.2)],
-                                                pool=pool)
+                                                pool=pool, vectorize=self.vectorize)
 
                 sampler.run_mcmc(population, nlinks, progress=True)
         else:
 
             sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                            self.objective_function,
-                                            a=2.0, pool=pool)
+                                            objective_function,
+                                            a=2.0, pool=pool,
+                                            vectorize=self.vectorize)
 
             sampler.run_mcmc(population, nlinks, progress=True)
 
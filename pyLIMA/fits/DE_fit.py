@@ -20,11 +20,13 @@ class DEfit(MLfit):
     max_iteration : int, the total number of iteration
     display_progress : bool, turns on to display progress
     strategy : str, 'best1bin' or 'rand1bin' (default)
+    vectorized : bool, turns on to score a whole generation in one call of the
+    batched objective function (see MLfit.standard_objective_function_batch)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', loss_function='likelihood',
                  DE_population_size=10, max_iteration=10000,
-                 display_progress=False, strategy='rand1bin'):
+                 display_progress=False, strategy='rand1bin', vectorized=False):
 
         super().__init__(model, rescale_photometry=rescale_photometry,
                          rescale_astrometry=rescale_astrometry,
@@ -36,6 +38,7 @@ class DEfit(MLfit):
         self.fit_time = 0  # s
         self.display_progress = display_progress
         self.strategy = strategy
+        self.vectorized = vectorized
 
     def fit_type(self):
 
@@ -47,6 +50,22 @@ class DEfit(MLfit):
 
         return objective
 
+    def objective_function_batch(self, fit_process_parameters):
+        """
+        The vectorized version of objective_function, for scipy vectorized=True
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (n,S) array of S trial vectors
+
+        Returns
+        -------
+        objective : array, the S values of the objective function
+        """
+        objective = self.standard_objective_function_batch(fit_process_parameters.T)
+
+        return objective
+
     def fit(self, initial_population=[], computational_pool=None):
 
         start_time = python_time.time()
@@ -72,29 +91,57 @@ class DEfit(MLfit):
 
         bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
 
+        if self.vectorized:
+
+            # the whole generation is scored at once, so no pool
+            objective_function = self.objective_function_batch
+            worker = 1
+            updating = 'deferred'
+
+        else:
+
+            objective_function = self.objective_function
+            updating = 'immediate'
+
         differential_evolution_estimation = scipy.optimize.differential_evolution(
-            self.objective_function,
+            objective_function,
             bounds=bounds,
             mutation=(0.5, 1.0), popsize=int(self.DE_population_size),
             maxiter=self.max_iteration, tol=0.00,
             atol=1, strategy=self.strategy,
             recombination=0.7, polish=False, init=init,
-            disp=self.display_progress, workers=worker)
+            disp=self.display_progress, workers=worker,
+            updating=updating, vectorized=self.vectorized)
 
-        self.trials_parameters = np.array(self.trials_parameters)
-        self.trials_objective = np.array(self.trials_objective)
-        self.trials_priors = np.array(self.trials_priors)
+        self.merge_trials()
 
         print('DE converge to objective function : f(x) = ',
               str(differential_evolution_estimation['fun']))
         print('DE converge to parameters : = ',
               differential_evolution_estimation['x'].astype(str))
 
-        DE_population = np.c_[self.trials_parameters,self.trials_objective,self.trials_priors]
+        if len(self.trials_objective) != 0:
+
+            DE_population = np.c_[self.trials_parameters, self.trials_objective,
+                                  self.trials_priors]
+
+        else:
+
+            DE_population = np.zeros((0, len(self.priors_parameters) + 2))
 
         best = np.where(np.all(differential_evolution_estimation['x']==DE_population[:,:len(self.fit_parameters)]
-                               ,axis=1))[0][0]
-        results = DE_population[best,:-2]
+                               ,axis=1))[0]
+
+        if len(best) != 0:
+
+            results = DE_population[best[0], :-2]
+
+        else:
+
+            # The best trial has not been recorded, see trials_recorder
+            results = self.fit_process_parameters_with_fluxes(
+                differential_evolution_estimation['x'])
+
         results_log_likelihood = differential_evolution_estimation['fun']
 
         computation_time = python_time.time() - start_time
@@ -1,9 +1,12 @@
+import json
+import os
 import sys
 import time as python_time
 
 import numpy as np
 from pyLIMA.fits.ML_fit import MLfit
 from pyLIMA.fits import DE_fit
+from pyLIMA.fits.trials_recorder import TrialsRecorder
 from tqdm import tqdm
 
 
@@ -19,11 +22,21 @@ class GRIDfit(MLfit):
     max_iteration : int, the total number of iteration
     fix_parameters : dict, the parameters that are set on the grid
     grid_resolution : int, the resolution of the grid for each grid parameters
+    warm_start : bool, turns on to seed the DE population of each pixel with the
+    best models of the already converged neighbouring pixels
+    checkpoint : str, the file where the completed pixels are saved. If it exists,
+    the fit resumes and only the missing pixels are fitted
+    refinement_levels : int, the number of adaptive refinements of the grid. At
+    each level, the pixels with an objective function within refinement_threshold
+    of the current minimum are split in 2**len(fix_parameters) pixels
+    refinement_threshold : float, the objective function (i.e. chi2) threshold of
+    the adaptive refinement
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', DE_population_size=5,
                  max_iteration=2000,
-                 fix_parameters=[], grid_resolution=10):
+                 fix_parameters=[], grid_resolution=10, warm_start=False,
+                 checkpoint=None, refinement_levels=0, refinement_threshold=25):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -34,6 +47,10 @@ class GRIDfit(MLfit):
         self.max_iteration = max_iteration
         self.fix_parameters = fix_parameters
         self.grid_resolution = grid_resolution
+        self.warm_start = warm_start
+        self.checkpoint = checkpoint
+        self.refinement_levels = refinement_levels
+        self.refinement_threshold = refinement_threshold
         self.intervals = []
 
     def fit_type(self):
@@ -44,6 +61,7 @@ class GRIDfit(MLfit):
         """
 
         parameters_on_the_grid = []
+        self.intervals = []
 
         for parameter_name in self.fix_parameters:
             parameter_range = self.fit_parameters[parameter_name][1]
@@ -66,13 +84,92 @@ class GRIDfit(MLfit):
 
         return objective
 
+    def grid_indexes(self, hyper_grid):
+        """
+        The integer coordinates of the grid pixels
+
+        Parameters
+        ----------
+        hyper_grid : array, the grid, see construct_the_hyper_grid
+
+        Returns
+        -------
+        indexes : array, the (n_pixels,n_fix_parameters) pixels coordinates
+        """
+        lower_bounds = [self.fit_parameters[key][1][0] for key in self.fix_parameters]
+
+        indexes = np.round((hyper_grid - lower_bounds) / self.intervals).astype(int)
+
+        return indexes
+
+    def neighbours_models(self, pixel_index, indexes, models):
+        """
+        The best models of the fitted pixels next to a pixel (i.e. one step away
+        along one grid parameter)
+
+        Parameters
+        ----------
+        pixel_index : int, the pixel index in the grid
+        indexes : array, the pixels coordinates, see grid_indexes
+        models : dict, the best models of the fitted pixels
+
+        Returns
+        -------
+        neighbours : list, the best fit parameters of the neighbouring pixels
+        """
+        distance = np.abs(indexes - indexes[pixel_index]).sum(axis=1)
+
+        neighbours = [models[ind][:len(self.fit_parameters)] for ind in
+                      np.where(distance == 1)[0] if ind in models]
+
+        return neighbours
+
+    def initial_population(self, defit, neighbours):
+        """
+        A DE initial population, uniform in the pixel bounds, where the first
+        individuals are the neighbours best models
+
+        Parameters
+        ----------
+        defit : object, the DEfit of the pixel
+        neighbours : list, the best fit parameters of the neighbouring pixels
+
+        Returns
+        -------
+        population : array, the DE initial population
+        """
+        bounds = np.array([defit.fit_parameters[key][1] for key in
+                           defit.fit_parameters.keys()])
+
+        population_size = max(int(self.DE_population_size) * len(bounds), 5)
+
+        population = np.random.uniform(bounds[:, 0], bounds[:, 1],
+                                       (population_size, len(bounds)))
+
+        neighbours = np.array(neighbours)[:population_size]
+        population[:len(neighbours)] = np.clip(neighbours, bounds[:, 0],
+                                               bounds[:, 1])
+
+        return population
+
     def fit_on_grid_pixel(self, *fixed_parameters):
 
-        fixed_parameters, computational_pool = fixed_parameters[0]
+        fixed_parameters = fixed_parameters[0]
+        neighbours = []
+
+        if len(fixed_parameters) == 3:
+
+            fixed_parameters, computational_pool, neighbours = fixed_parameters
+
+        else:
+
+            fixed_parameters, computational_pool = fixed_parameters
 
         fixed_parameters = np.ravel(fixed_parameters)
         defit = DE_fit.DEfit(self.model,DE_population_size= self.DE_population_size,display_progress=False,
                              strategy='best1bin', loss_function='chi2',max_iteration=self.max_iteration)
+        # Only the best model is needed, the pixels trials are not kept
+        defit.trials_recorder = TrialsRecorder(mode='none')
 
         for key in self.fit_parameters:
 
@@ -82,45 +179,271 @@ class GRIDfit(MLfit):
 
             defit.fit_parameters[key][1] = [fixed_parameters[ind]+self.intervals[ind]/2, fixed_parameters[ind]+self.intervals[ind]/2]
 
-        defit.fit(computational_pool=computational_pool)
+        initial_population = []
+
+        if len(neighbours) != 0:
+
+            initial_population = self.initial_population(defit, neighbours)
+
+        defit.fit(initial_population=initial_population,
+                  computational_pool=computational_pool)
         fitted_parameters = defit.fit_results['best_model']
         best_model = np.append( fitted_parameters,self.objective_function(fitted_parameters))
         return best_model
 
-    def fit(self, computational_pool=None):
+    def fit_grid_pixels(self, pixels):
+        """
+        Fit a list of grid pixels, i.e. the work of one process of the grid engine
+
+        Parameters
+        ----------
+        pixels : list, the (pixel_index, pixel, neighbours) to fit
+
+        Returns
+        -------
+        results : list, the (pixel_index, best_model) of the pixels
+        """
+        results = [(pixel_index, self.fit_on_grid_pixel([pixel, None, neighbours]))
+                   for pixel_index, pixel, neighbours in pixels]
+
+        return results
+
+    def checkpoint_header(self):
+        """
+        The grid configuration recorded in the checkpoint file, so that a
+        checkpoint is only resumed by the same grid
+
+        Returns
+        -------
+        header : str, the JSON of the grid parameters, resolution and bounds
+        """
+        bounds = {key: [float(bound) for bound in self.fit_parameters[key][1]] for
+                  key in self.fit_parameters.keys()}
+
+        header = json.dumps({'fix_parameters': list(self.fix_parameters),
+                             'grid_resolution': int(self.grid_resolution),
+                             'bounds': bounds})
+
+        return header
+
+    def load_checkpoint(self, hyper_grid):
+        """
+        Load the pixels already fitted from the checkpoint file
+
+        Parameters
+        ----------
+        hyper_grid : array, the grid, see construct_the_hyper_grid
+
+        Returns
+        -------
+        models : dict, the best models of the fitted pixels
+        """
+        models = {}
+
+        if (self.checkpoint is None) or (not os.path.exists(self.checkpoint)):
+
+            return models
+
+        with open(self.checkpoint, 'r') as checkpoint_file:
+
+            header = checkpoint_file.readline()
+
+        if header.lstrip('# ').rstrip('\n') != self.checkpoint_header():
+
+            raise ValueError('The checkpoint ' + self.checkpoint + ' was written by a'
+                             ' different grid configuration: ' + header)
+
+        saved_pixels = np.loadtxt(self.checkpoint, ndmin=2)
+
+        # Pixels are saved by their centers, unique across the refinement levels:
+        # the centers of two levels are at least half of the current intervals apart
+        pixels_centers = hyper_grid + np.array(self.intervals) / 2
+        tolerance = np.array(self.intervals) / 4
+
+        for saved_pixel in saved_pixels:
+
+            pixel = saved_pixel[:hyper_grid.shape[1]]
+            index = np.where(np.all(np.abs(pixels_centers - pixel) <= tolerance,
+                                    axis=1))[0]
 
+            if len(index) != 0:
 
+                models[index[0]] = saved_pixel[hyper_grid.shape[1]:]
+
+        return models
+
+    def save_checkpoint(self, pixel, best_model):
+        """
+        Append a fitted pixel to the checkpoint file
+
+        Parameters
+        ----------
+        pixel : array, the grid parameters of the pixel
+        best_model : array, the best model of the pixel and its objective
+        """
+        if self.checkpoint is None:
+
+            return
+
+        pixel_center = pixel + np.array(self.intervals) / 2
+
+        if not os.path.exists(self.checkpoint):
+
+            with open(self.checkpoint, 'w') as checkpoint_file:
+
+                checkpoint_file.write('# ' + self.checkpoint_header() + '\n')
+
+        with open(self.checkpoint, 'a') as checkpoint_file:
+
+            np.savetxt(checkpoint_file, np.r_[pixel_center, best_model][None, :],
+                       fmt='%.17g')
+
+    def fit_the_pixels(self, hyper_grid, computational_pool=None, seeds=None):
+        """
+        Fit the pixels of a grid (with the current intervals). With a
+        computational_pool, the pixels are distributed across the workers, each
+        pixel being fitted by a serial DE. With warm_start, the pixels are fitted by
+        waves (the sum of the pixel coordinates), so that each pixel is seeded by
+        its neighbours of the previous wave.
+
+        Parameters
+        ----------
+        hyper_grid : array, the grid pixels
+        computational_pool : object, a pool of workers with a map method
+        seeds : list, the best models seeding each pixel (with warm_start), i.e.
+        the parent pixels of a refined grid
+
+        Returns
+        -------
+        population : array, the best model and objective of each pixel
+        """
+        indexes = self.grid_indexes(hyper_grid)
+        models = self.load_checkpoint(hyper_grid)
+
+        remaining_pixels = [ind for ind in range(len(hyper_grid)) if ind not in
+                            models]
+
+        if self.warm_start:
+
+            waves = indexes[remaining_pixels].sum(axis=1)
+            waves = [np.array(remaining_pixels)[waves == wave].tolist() for wave in
+                     np.unique(waves)]
+
+        else:
+
+            waves = [remaining_pixels]
+
+        if computational_pool is not None:
+
+            worker = getattr(computational_pool, 'imap_unordered',
+                             computational_pool.map)
+
+        with tqdm(total=len(hyper_grid), initial=len(models)) as progress_bar:
+
+            for wave in waves:
+
+                tasks = []
+
+                for ind in wave:
+
+                    neighbours = []
+
+                    if self.warm_start:
+
+                        neighbours = self.neighbours_models(ind, indexes, models)
+
+                        if seeds is not None:
+
+                            neighbours.append(seeds[ind][:len(self.fit_parameters)])
+
+                    tasks.append([(ind, hyper_grid[ind], neighbours)])
+
+                if computational_pool is not None:
+
+                    results = worker(self.fit_grid_pixels, tasks)
+
+                else:
+
+                    results = map(self.fit_grid_pixels, tasks)
+
+                for result in results:
+
+                    for pixel_index, best_model in result:
+
+                        models[pixel_index] = best_model
+                        self.save_checkpoint(hyper_grid[pixel_index], best_model)
+                        progress_bar.update(1)
+
+        population = np.array([models[ind] for ind in range(len(hyper_grid))])
+
+        return population
+
+    def refine_the_hyper_grid(self, hyper_grid, population, objective_minimum):
+        """
+        Split the pixels with an objective function within refinement_threshold of
+        objective_minimum in 2**len(fix_parameters) pixels, and halve the intervals
+
+        Parameters
+        ----------
+        hyper_grid : array, the grid pixels
+        population : array, the best model and objective of each pixel
+        objective_minimum : float, the current minimum of the objective function
+
+        Returns
+        -------
+        refined_grid : array, the new pixels
+        parents : array, the index of the parent pixel of each new pixel
+        """
+        selection = np.where(population[:, -1] <=
+                             objective_minimum + self.refinement_threshold)[0]
+
+        self.intervals = np.array(self.intervals) / 2
+
+        offsets = np.array(np.meshgrid(*[[0, 1]] * len(self.fix_parameters),
+                                       indexing='ij')).reshape(
+            len(self.fix_parameters), -1).T * self.intervals
+
+        refined_grid = (hyper_grid[selection][:, None, :] + offsets).reshape(
+            -1, len(self.fix_parameters))
+        parents = np.repeat(selection, len(offsets))
+
+        return refined_grid, parents
+
+    def fit(self, computational_pool=None):
+        """
+        Fit all the grid pixels (see fit_the_pixels), then refine the grid
+        refinement_levels times around the best pixels
+
+        Parameters
+        ----------
+        computational_pool : object, a pool of workers with a map method
+        """
         hyper_grid = self.construct_the_hyper_grid()
         start_time = python_time.time()
 
         self.bounds = [self.fit_parameters[key][1] for key in self.fit_parameters.keys()]
 
-        #if computational_pool is not None:
+        population = self.fit_the_pixels(hyper_grid,
+                                         computational_pool=computational_pool)
+        populations = [population]
 
-            #with computational_pool as pool, tqdm(total=len(hyper_grid)) as pbar:
+        for level in range(self.refinement_levels):
 
-            #    res = [pool.apply_async(self.fit_on_grid_pixel, args=(hyper_grid[i],),
-            #                            callback=lambda _: pbar.update(1)) for i in
-            #           range(len(hyper_grid))]
+            objective_minimum = np.min([pop[:, -1].min() for pop in populations])
 
-            #    population = np.array([r.get() for r in res])
+            hyper_grid, parents = self.refine_the_hyper_grid(hyper_grid, population,
+                                                             objective_minimum)
 
-        #else:
-        #    population = []
+            if len(hyper_grid) == 0:
 
-        #    for j in tqdm(range(len(hyper_grid))):
-        #        new_step = self.fit_on_grid_pixel([hyper_grid[j]])
-        #        population.append(new_step)
+                break
 
-        ###This is not clean, can not have a parallelization of the grid because of the Manage List of the DE fit
+            population = self.fit_the_pixels(hyper_grid,
+                                             computational_pool=computational_pool,
+                                             seeds=population[parents])
+            populations.append(population)
 
-        population = []
-
-        for j in tqdm(range(len(hyper_grid))):
-            new_step = self.fit_on_grid_pixel([hyper_grid[j], computational_pool])
-            population.append(new_step)
-
-        GRIDS_population = np.array(population)
+        GRIDS_population = np.concatenate(populations)
 
         computation_time = python_time.time() - start_time
         print(sys._getframe().f_code.co_name,
@@ -136,4 +459,3 @@ class GRIDfit(MLfit):
                                 best_model_index, -1],
                             'fit_time': computation_time,
                             'GRIDS_population': GRIDS_population}
-
@@ -4,6 +4,7 @@ import time as python_time
 import numpy as np
 import scipy
 from pyLIMA.fits.ML_fit import MLfit
+from scipy.optimize._numdiff import approx_derivative, group_columns
 
 
 class LMfit(MLfit):
@@ -13,6 +14,8 @@ class LMfit(MLfit):
     Attributes
     -----------
     guess : list, the starting point of the fit
+    residuals_weights : array, the integer multiplicity of each residual (e.g. the
+    bootstrap resampling), None by default
     """
     def __init__(self, model, telescopes_fluxes_method='fit', loss_function='chi2'):
         """The fit class has to be intialized with an event object."""
@@ -27,6 +30,7 @@ class LMfit(MLfit):
                          loss_function=loss_function)
 
         self.guess = []
+        self.residuals_weights = None
         #self.priors = None
 
     def fit_type(self):
@@ -61,10 +65,156 @@ class LMfit(MLfit):
         residuals = np.concatenate(residuals)
         errors = np.concatenate(errors)
 
+        if self.residuals_weights is not None:
+
+            return residuals / errors * self.residuals_weights ** 0.5
+
         return residuals / errors
 
-    def fit(self):
+    def residuals_Jacobian_sparsity(self):
+        """
+        The sparsity pattern of the residuals Jacobian: each telescope flux
+        parameter only changes the photometric residuals of its telescope
+
+        Returns
+        -------
+        sparsity : scipy.sparse.csr_matrix, the (n_residuals,n_fit_parameters)
+        pattern, None if the Jacobian is dense
+        """
+        keys = list(self.fit_parameters.keys())
+
+        fluxes_telescopes = {flux + '_' + telescope.name: telescope.name
+                             for telescope in self.model.event.telescopes
+                             for flux in ['fsource', 'fblend', 'gblend', 'ftotal']}
+        blocks = []
+
+        for data_type in ['photometry', 'astrometry']:
+
+            if not getattr(self.model, data_type):
+
+                continue
+
+            for telescope in self.model.event.telescopes:
+
+                if data_type == 'photometry':
+
+                    n_data = telescope.n_data('flux')
+
+                else:
+
+                    n_data = 2 * telescope.n_data('astrometry')
+
+                if n_data == 0:
+
+                    continue
+
+                block = np.ones((n_data, len(keys)), dtype=bool)
+
+                for ind, key in enumerate(keys):
+
+                    if key in fluxes_telescopes:
+
+                        block[:, ind] = (data_type == 'photometry') & (
+                                fluxes_telescopes[key] == telescope.name)
+
+                blocks.append(block)
+
+        sparsity = np.concatenate(blocks)
+
+        if sparsity.all():
+
+            return None
+
+        return scipy.sparse.csr_matrix(sparsity)
+
+    def grouped_numerical_Jacobian(self, sparsity, bounds, diff_step=None):
+        """
+        The '2-point' numerical Jacobian of the residuals, where the columns that do
+        not change the same residuals (e.g. the fluxes of different telescopes, see
+        residuals_Jacobian_sparsity) are evaluated together. The Jacobian is
+        returned dense, so scipy.optimize.least_squares keeps its exact trust region
+        solver (jac_sparsity would force lsmr).
+
+        Parameters
+        ----------
+        sparsity : scipy.sparse.csr_matrix, the Jacobian sparsity pattern
+        bounds : tuple, the (lower,upper) bounds of the fit parameters
+        diff_step : array, the relative steps of the fit parameters, see
+        numerical_Jacobian_steps
+
+        Returns
+        -------
+        objective_function : function, the objective_function keeping its last
+        evaluation, reused as the reference point of the Jacobian
+        jacobian_function : function, the dense numerical Jacobian
+        """
+        groups = group_columns(sparsity)
+        last_evaluation = {}
 
+        def objective_function(fit_process_parameters):
+
+            residuals = self.objective_function(fit_process_parameters)
+
+            last_evaluation['parameters'] = np.array(fit_process_parameters)
+            last_evaluation['residuals'] = residuals
+
+            return residuals
+
+        def jacobian_function(fit_process_parameters):
+
+            residuals = None
+
+            if np.array_equal(last_evaluation.get('parameters'),
+                              fit_process_parameters):
+
+                residuals = last_evaluation['residuals']
+
+            jacobian = approx_derivative(self.objective_function,
+                                         fit_process_parameters, method='2-point',
+                                         rel_step=diff_step, f0=residuals,
+                                         bounds=bounds, sparsity=(sparsity, groups))
+
+            return jacobian.toarray()
+
+        return objective_function, jacobian_function
+
+    def residuals_Jacobian(self, fit_process_parameters):
+
+        jacobian = super().residuals_Jacobian(fit_process_parameters)
+
+        if self.residuals_weights is not None:
+
+            jacobian = jacobian * self.residuals_weights[:, None] ** 0.5
+
+        return jacobian
+
+    def numerical_Jacobian_steps(self):
+        """
+        The relative steps of the '2-point' numerical Jacobian, see the model
+        Jacobian_steps
+
+        Returns
+        -------
+        diff_step : array, the relative step of each fit parameter, None if the
+        model has no Jacobian_steps
+        """
+        if not self.model.Jacobian_steps:
+
+            return None
+
+        diff_step = np.array([self.model.Jacobian_steps.get(
+            key, np.finfo(float).eps ** 0.5) for key in self.fit_parameters.keys()])
+
+        return diff_step
+
+    def fit(self, computational_pool=None):
+        """
+        Parameters
+        ----------
+        computational_pool : a pool object with a map method. If the model Jacobian
+        is numerical, the Jacobian columns are evaluated concurrently on the pool
+        (see magnification_Jacobian.numerical_Jacobian), None by default
+        """
         start_time = python_time.time()
 
         # use the analytical Jacobian (faster) if no second order are present,
@@ -80,13 +230,17 @@ class LMfit(MLfit):
         for telescope in self.model.event.telescopes:
             n_data = n_data + telescope.n_data('flux')
 
-        if self.model.Jacobian_flag != 'Numerical':
+        diff_step = None
+
+        if (self.model.Jacobian_flag != 'Numerical') | (computational_pool is not None):
 
             jacobian_function = self.residuals_Jacobian
+            self.model.Jacobian_pool = computational_pool
 
         else:
 
             jacobian_function = '2-point'
+            diff_step = self.numerical_Jacobian_steps()
 
         if self.loss_function == 'soft_l1':
 
@@ -98,12 +252,18 @@ class LMfit(MLfit):
 
         scaling = 10 ** np.floor(np.log10(np.abs(self.guess))) + 1
 
-        lm_fit = scipy.optimize.least_squares(self.objective_function, self.guess,
-                                              method='lm', max_nfev=50000,
-                                              jac=jacobian_function, loss=loss,
-                                              xtol=10 ** -10, ftol=10 ** -10,
-                                              gtol=10 ** -10,
-                                              x_scale=scaling)
+        try:
+
+            lm_fit = scipy.optimize.least_squares(self.objective_function, self.guess,
+                                                  method='lm', max_nfev=50000,
+                                                  jac=jacobian_function, loss=loss,
+                                                  xtol=10 ** -10, ftol=10 ** -10,
+                                                  gtol=10 ** -10, diff_step=diff_step,
+                                                  x_scale=scaling)
+
+        finally:
+
+            self.model.Jacobian_pool = None
 
         fit_results = lm_fit['x']
         fit_chi2 = lm_fit['cost'] * 2  # chi2
@@ -15,10 +15,12 @@ class MCMCfit(MLfit):
     -----------
     MCMC_walkers : int, the number of walkers = number_of_walkers*len(fit_parameters)
     MCMC_links : int, the total number of iteration
+    vectorize : bool, turns on to score all the walkers in one call of the batched
+    objective function (see MLfit.standard_objective_function_batch)
     """
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
                  telescopes_fluxes_method='polyfit', loss_function='likelihood',
-                 MCMC_walkers=2, MCMC_links=5000):
+                 MCMC_walkers=2, MCMC_links=5000, vectorize=False):
         """The fit class has to be intialized with an event object."""
 
         super().__init__(model, rescale_photometry=rescale_photometry,
@@ -28,12 +30,49 @@ class MCMCfit(MLfit):
 
         self.MCMC_walkers = MCMC_walkers  # times number of dimension!
         self.MCMC_links = MCMC_links
+        self.vectorize = vectorize
 
     def fit_type(self):
         return "Monte Carlo Markov Chain (Affine Invariant)"
 
     def objective_function(self, fit_process_parameters):
 
+        ln_probability = self.log_probability(fit_process_parameters)[0]
+
+        return ln_probability
+
+    def objective_function_batch(self, fit_process_parameters):
+        """
+        The vectorized version of objective_function
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (K,n) array of walkers positions
+
+        Returns
+        -------
+        ln_probability : array, the K values of the ln-probability
+        """
+        ln_probability = self.log_probability_batch(fit_process_parameters)[:, 0]
+
+        return ln_probability
+
+    def log_probability(self, fit_process_parameters):
+        """
+        The ln-probability given to emcee, followed by the blob of the sample, i.e.
+        [fit parameters, telescopes fluxes, objective, priors] as in
+        MCMC_chains_with_fluxes
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the walker position
+
+        Returns
+        -------
+        ln_probability_and_blob : array, the ln-probability and the blob
+        """
+        blob = np.zeros(len(self.priors_parameters) + 2)
+
         #if self.loss_function != 'likelihood':
 
         limits_check = self.fit_parameters_inside_limits(fit_process_parameters)
@@ -42,15 +81,64 @@ class MCMCfit(MLfit):
 
             bad_parameters = np.zeros(len(self.priors_parameters))
             bad_parameters[:len(self.fit_parameters)] = fit_process_parameters
-            self.trials_parameters.append(bad_parameters.tolist())
-            self.trials_priors.append(np.inf)
-            self.trials_objective.append(np.inf)
+            self.trials_recorder.record(bad_parameters, np.inf, np.inf)
+
+            blob[:-2] = bad_parameters
+            blob[-2:] = np.inf
+
+            return np.r_[-limits_check, blob] #i.e. -np.inf
+
+        objective, priors, trial = self.standard_objective_function(
+            fit_process_parameters, return_trial=True)
+
+        n_parameters = min(len(trial), len(blob) - 2)
+        blob[:n_parameters] = trial[:n_parameters]
+        blob[-2:] = objective, priors
+
+        return np.r_[-objective, blob]
+
+    def log_probability_batch(self, fit_process_parameters):
+        """
+        The vectorized version of log_probability, for emcee vectorize=True
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (K,n) array of walkers positions
+
+        Returns
+        -------
+        ln_probability_and_blob : array, the (K,1+m) ln-probabilities and blobs
+        """
+        inside = self.fit_parameters_inside_limits_batch(fit_process_parameters)
+
+        results = np.zeros((len(fit_process_parameters),
+                            len(self.priors_parameters) + 3))
+        results[:, 0] = -np.inf
 
-            return -limits_check #i.e. -np.inf
+        if (~inside).any():
 
-        objective = self.standard_objective_function(fit_process_parameters)
+            bad_parameters = np.zeros(((~inside).sum(), len(self.priors_parameters)))
+            bad_parameters[:, :len(self.fit_parameters)] = fit_process_parameters[
+                ~inside]
+            self.trials_recorder.record_batch(bad_parameters, np.inf, np.inf)
 
-        return -objective
+            results[~inside, 1:-2] = bad_parameters
+            results[~inside, -2:] = np.inf
+
+        if inside.any():
+
+            objective, priors, trials = self.standard_objective_function_batch(
+                fit_process_parameters[inside], return_trial=True)
+
+            n_parameters = min(trials.shape[1], len(self.priors_parameters))
+
+            results[inside, 0] = -objective
+            results[np.where(inside)[0][:, None], 1 + np.arange(n_parameters)] = \
+                trials[:, :n_parameters]
+            results[inside, -2] = objective
+            results[inside, -1] = priors
+
+        return results
 
     def fit(self, initial_population=[], computational_pool=False):
 
@@ -94,6 +182,14 @@ class MCMCfit(MLfit):
 
         nlinks = self.MCMC_links
 
+        if self.vectorize:
+
+            objective_function = self.log_probability_batch
+
+        else:
+
+            objective_function = self.log_probability
+
         if computational_pool:
 
             pool = computational_pool
@@ -117,28 +213,28 @@ class MCMCfit(MLfit):
             with pool:
 
                 sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                                self.objective_function, pool=pool)
+                                                objective_function, pool=pool,
+                                                vectorize=self.vectorize)
 
                 sampler.run_mcmc(population, nlinks, progress=True)
         else:
 
             sampler = emcee.EnsembleSampler(nwalkers, number_of_parameters,
-                                            self.objective_function, pool=pool)
+                                            objective_function, pool=pool,
+                                            vectorize=self.vectorize)
 
             sampler.run_mcmc(population, nlinks, progress=True)
 
         computation_time = python_time.time() - start_time
         print(sys._getframe().f_code.co_name, ' : ' + self.fit_type() + ' fit SUCCESS')
 
-        self.trials_parameters = np.array(self.trials_parameters)
-        self.trials_objective = np.array(self.trials_objective)
-        self.trials_priors = np.array(self.trials_priors)
+        self.merge_trials()
 
         self.trials_objective *= -1
         self.trials_priors *= -1
 
         MCMC_chains, MCMC_chains_with_fluxes = self.reconstruct_chains(
-            sampler.get_chain(), sampler.get_log_prob())
+            sampler.get_chain(), sampler.get_log_prob(), sampler.get_blobs())
 
         best_model_index = np.where(
             MCMC_chains[:, :, -2] == MCMC_chains[:, :, -2].max())
@@ -156,8 +252,23 @@ class MCMCfit(MLfit):
 
         self.print_fit_results()
 
-    def reconstruct_chains(self, mcmc_samples, mcmc_prob):
-
+    def reconstruct_chains(self, mcmc_samples, mcmc_prob, mcmc_blobs):
+        """
+        Build the MCMC chains, and the MCMC chains with the telescopes fluxes from
+        the blobs of the samples (see log_probability), in linear time
+
+        Parameters
+        ----------
+        mcmc_samples : array, the emcee chains
+        mcmc_prob : array, the emcee ln-probabilities
+        mcmc_blobs : array, the emcee blobs
+
+        Returns
+        -------
+        MCMC_chains : array, the chains with the ln-probability and priors
+        MCMC_chains_with_fluxes : array, the chains with the telescopes fluxes,
+        the ln-likelihood and the priors
+        """
         rangei, rangej, rangek = mcmc_samples.shape
 
         MCMC_chains = np.zeros((rangei, rangej, rangek + 2))
@@ -165,30 +276,10 @@ class MCMCfit(MLfit):
         MCMC_chains[:, :, -2] = mcmc_prob
         MCMC_chains[:, :, -1] = np.zeros(mcmc_prob.shape)
 
-        Rangei,Rangej = self.trials_parameters.shape
-        MCMC_chains_with_fluxes = np.zeros((rangei,rangej,Rangej+2))
-
-        for j in range(rangej):
-
-                unique_sample = np.unique(mcmc_samples[:,j],return_inverse=True,
-                                          axis=0)
-
-                unique_trials = []
-                unique_objective = []
-                unique_priors = []
-
-                for unique_values in unique_sample[0]:
-
-                    index = np.where(np.all(self.trials_parameters[:, :len(self.fit_parameters)]
-                                         == unique_values,axis=1))[0][0]
-
-                    unique_trials.append(self.trials_parameters[index].tolist())
-                    unique_objective.append(self.trials_objective[index].tolist())
-                    unique_priors.append(self.trials_priors[index].tolist())
-
-                MCMC_chains_with_fluxes[:,j][:,:-2] = np.array(unique_trials)[unique_sample[1].ravel()]
-                MCMC_chains_with_fluxes[:,j][:,-2] = np.array(unique_objective)[unique_sample[1].ravel()]
-                MCMC_chains_with_fluxes[:,j][:,-1] = np.array(unique_priors)[unique_sample[1].ravel()]
+        Rangej = len(self.priors_parameters)
+        MCMC_chains_with_fluxes = np.array(mcmc_blobs, dtype=float).reshape(
+            rangei, rangej, Rangej + 2)
+        MCMC_chains_with_fluxes[:, :, -2:] *= -1
 
         columns_to_swap = []
         if self.rescale_photometry:
@@ -1,11 +1,12 @@
 import sys
 from collections import OrderedDict
-from multiprocessing import Manager
 
 import numpy as np
 import pyLIMA.fits.objective_functions as objective_functions
+from pyLIMA.fits.trials_recorder import TrialsRecorder
 from pyLIMA.priors import parameters_boundaries
 from pyLIMA.priors import parameters_priors
+from pyLIMA.toolbox import flux_regression
 
 class FitException(Exception):
     pass
@@ -24,12 +25,18 @@ class MLfit(object):
     rescale_photometry : bool, turns on to rescale the photometric data
     rescale_astrometry : bool, turns on to rescale the astrometric data
     telescopes_fluxes_method : str, if not 'fit', then telescopes fluxes are
-    estimated via np.polyfit
+    estimated via the weighted linear regression, see flux_regression.solve_fluxes.
+    If 'marginalize', the likelihood is also analytically marginalized over the
+    telescopes fluxes, see fluxes_marginalization
     loss_function : str, the loss_function used ('chi2','likelihood' or 'soft_l1')
     fit_parameters : dict, dictionnary containing the parameters name and boundaries
     fit_results : dict, dictionnary containing the fit results
     priors : list, a list of parameters priors (None by default)
-    trials_parameters : list, a Manager().list() to collect all algorithm fit trials_parameters
+    trials_recorder : object, a TrialsRecorder collecting all algorithm fit trials
+    trials_parameters : array, the fit trials parameters, gathered from the
+    trials_recorder at the end of the fit (see merge_trials)
+    trials_objective : array, the fit trials objective function values
+    trials_priors : array, the fit trials priors values
     model_parameters_guess : list, a list containing the parameters guess
     rescale_photometry_parameters_guess : list, contains guess on rescaling photometry
     rescale_astrometry_parameters_guess : list, contains guess on rescaling astrometry
@@ -38,6 +45,9 @@ class MLfit(object):
     rescale_photometry_parameters_index : list, indexes of photometry rescaling
     parameters
     rescale_astrometry_parameters_index : list, indexes of astrometry rescaling
+    fluxes_priors : dict, the Gaussian priors [mean, covariance] of the (fsource,
+    fblend) of some telescopes (i.e. {telescope.name: [mean, covariance]}) for
+    the fluxes marginalization, flat priors by default
     """
 
     def __init__(self, model, rescale_photometry=False, rescale_astrometry=False,
@@ -55,6 +65,13 @@ class MLfit(object):
                 'rescaling.')
             loss_function = 'likelihood'
 
+        if (telescopes_fluxes_method == 'marginalize') & (
+                loss_function != 'likelihood'):
+            print(
+                'Switching to likelihood objective function because of telescopes '
+                'fluxes marginalization.')
+            loss_function = 'likelihood'
+
         self.loss_function = loss_function
 
         self.fit_parameters = []
@@ -62,10 +79,12 @@ class MLfit(object):
         self.fit_results = {}
         self.priors = None
         self.extra_priors = None
-        self.trials_parameters = Manager().list()  # to be recognize by all process during
-        # parallelization
-        self.trials_objective = Manager().list()
-        self.trials_priors = Manager().list()
+        self.fluxes_priors = {}
+        self.trials_recorder = TrialsRecorder()  # workers write their own files
+        # during parallelization
+        self.trials_parameters = []
+        self.trials_objective = []
+        self.trials_priors = []
 
         self.model_parameters_guess = []
         self.rescale_photometry_parameters_guess = []
@@ -265,6 +284,13 @@ class MLfit(object):
         self.priors = parameters_priors.default_parameters_priors(
             self.priors_parameters)
 
+        if self.telescopes_fluxes_method == 'marginalize':
+
+            # The fluxes priors are in the marginalization, see fluxes_priors
+            for key in self.model.telescopes_fluxes_model_parameters({}).keys():
+
+                self.priors[key] = None
+
     def fit_parameters_inside_limits(self, fit_process_parameters):
 
         for ind,key in enumerate(self.fit_parameters.keys()):
@@ -274,18 +300,44 @@ class MLfit(object):
 
                 return np.inf
 
-    def standard_objective_function(self, fit_process_parameters):
+    def fit_parameters_inside_limits_batch(self, fit_process_parameters):
+        """
+        Check which sets of fit_process_parameters are inside the fit boundaries
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (K,n) array of fit parameters
+
+        Returns
+        -------
+        inside : array, a boolean array of length K
+        """
+        bounds = np.array([self.fit_parameters[key][1] for key in
+                           self.fit_parameters.keys()])
+
+        parameters = fit_process_parameters[:, :len(bounds)]
+
+        inside = np.all((parameters >= bounds[:, 0]) & (parameters <= bounds[:, 1]),
+                        axis=1)
+
+        return inside
+
+    def standard_objective_function(self, fit_process_parameters,
+                                    return_trial=False):
         """
         Compute the objective function based on the model and fit_process_parameters
 
         Parameters
         ----------
         fit_process_parameters : list, list containing the fit parameters
+        return_trial : bool, if the priors and the trial are needed or not
 
         Returns
         -------
 
         objective : float, the value of the objective function
+        priors : float, the value of the priors
+        trial : list, the fit parameters and the telescopes fluxes (if not fitted)
         """
         if self.loss_function == 'likelihood':
             likelihood, priors, pyLIMA_parameters = self.model_likelihood(
@@ -324,16 +376,197 @@ class MLfit(object):
                         if self.model.blend_flux_parameter == 'noblend':
                             pass
 
-            self.trials_parameters.append(fit_process_parameters.tolist() + fluxes)
+            trial = fit_process_parameters.tolist() + fluxes
+
+        else:
+
+            trial = fit_process_parameters.tolist()
+
+        self.trials_recorder.record(trial, objective, priors)
+
+        if return_trial:
+
+            return objective, priors, trial
 
         else:
 
-            self.trials_parameters.append(fit_process_parameters.tolist())
+            return objective
+
+    def standard_objective_function_batch(self, fit_process_parameters,
+                                          return_trial=False):
+        """
+        Compute the objective function of K sets of fit_process_parameters at once,
+        see MLmodel.compute_the_microlensing_model_batch. Trials are recorded as in
+        standard_objective_function.
+
+        Parameters
+        ----------
+        fit_process_parameters : array, a (K,n) array of fit parameters
+        return_trial : bool, if the priors and the trials are needed or not
+
+        Returns
+        -------
+
+        objective : array, the K values of the objective function
+        priors : array, the K values of the priors
+        trials : array, the K fit parameters and telescopes fluxes (if not fitted)
+        """
+        parameters = np.atleast_2d(np.asarray(fit_process_parameters, dtype=float))
+
+        if self.model.astrometry:
+
+            results = [self.standard_objective_function(vector, return_trial=True)
+                       for vector in parameters]
+
+            objective = np.array([result[0] for result in results])
+
+            if return_trial:
+
+                priors = np.array([result[1] for result in results])
+                trials = np.array([result[2] for result in results])
+
+                return objective, priors, trials
+
+            else:
+
+                return objective
+
+        pyLIMA_parameters = self.model.compute_pyLIMA_parameters_batch(
+            parameters[:, self.model_parameters_index])
+
+        if self.rescale_photometry:
+
+            rescaling_photometry_parameters = 10 ** (
+                parameters[:, self.rescale_photometry_parameters_index])
+
+        chi2 = np.zeros(len(parameters))
+        ln_errors = np.zeros(len(parameters))
+        soft_l1 = np.zeros(len(parameters))
+        n_data = 0
+
+        ind = 0
+
+        for telescope in self.model.event.telescopes:
+
+            if telescope.lightcurve is not None:
+
+                microlensing_model = self.model.compute_the_microlensing_model_batch(
+                    telescope, pyLIMA_parameters)
+
+                data_arrays = telescope.data_arrays('photometry')
+                residuals = data_arrays['flux'] - microlensing_model['photometry']
+                err_flux = data_arrays['err_flux']
+
+                if self.rescale_photometry:
+
+                    err_flux = err_flux * rescaling_photometry_parameters[:,
+                                          ind:ind + 1]
+
+                normalised_residuals = residuals ** 2 / err_flux ** 2
+
+                chi2 += np.sum(normalised_residuals, axis=1)
+                soft_l1 += 2 * np.sum((1 + normalised_residuals) ** 0.5 - 1, axis=1)
+                ln_errors += np.sum(np.log(err_flux ** 2), axis=-1)
+                n_data += residuals.shape[1]
+
+                ind += 1
+
+        priors = np.zeros(len(parameters))
+
+        if self.loss_function == 'likelihood':
+
+            for ind, key in enumerate(self.fit_parameters.keys()):
+
+                if pyLIMA_parameters.get(key) is None:
+
+                    pyLIMA_parameters[key] = parameters[:, ind:ind + 1]
+
+            priors = -self.get_priors_probability_batch(pyLIMA_parameters)
+            objective = 0.5 * (chi2 + ln_errors + n_data * np.log(2 * np.pi)) + priors
+
+            if self.telescopes_fluxes_method == 'marginalize':
+
+                if not self.rescale_photometry:
+
+                    rescaling_photometry_parameters = None
+
+                objective += self.fluxes_marginalization(
+                    pyLIMA_parameters, rescaling_photometry_parameters)
+
+        if self.loss_function == 'chi2':
+
+            objective = chi2
+
+        if self.loss_function == 'soft_l1':
+
+            objective = soft_l1
+
+        if self.telescopes_fluxes_method != 'fit':
+
+            fluxes = []
+
+            for tel in self.model.event.telescopes:
+
+                if tel.lightcurve is not None:
+
+                    fluxes.append(pyLIMA_parameters['fsource_' + tel.name])
+
+                    if self.model.blend_flux_parameter == 'gblend':
+                        fluxes.append(pyLIMA_parameters['gblend_' + tel.name])
+
+                    if self.model.blend_flux_parameter == 'fblend':
+                        fluxes.append(pyLIMA_parameters['fblend_' + tel.name])
+
+                    if self.model.blend_flux_parameter == 'ftotal':
+                        fluxes.append(pyLIMA_parameters['ftotal_' + tel.name])
+
+            trials = np.hstack([parameters] + fluxes)
+
+        else:
+
+            trials = parameters
+
+        self.trials_recorder.record_batch(trials, objective, priors)
+
+        if return_trial:
+
+            return objective, priors, trials
+
+        else:
+
+            return objective
+
+    def merge_trials(self):
+        """
+        Gather the trials recorded by the trials_recorder (from all processes) into
+        trials_parameters, trials_objective and trials_priors
+        """
+        self.trials_parameters, self.trials_objective, self.trials_priors = \
+            self.trials_recorder.merge()
+
+    def fit_process_parameters_with_fluxes(self, fit_process_parameters):
+        """
+        Add the telescopes fluxes to fit_process_parameters if they are not fitted,
+        i.e. the same vector as the recorded trials parameters
+
+        Parameters
+        ----------
+        fit_process_parameters : array, the fit parameters
+
+        Returns
+        -------
+        parameters : array, the fit parameters and the telescopes fluxes
+        """
+        parameters = np.array(fit_process_parameters)
+
+        if self.telescopes_fluxes_method != 'fit':
+
+            fluxes = self.model.find_telescopes_fluxes(
+                parameters[self.model_parameters_index])
 
-        self.trials_objective.append(objective)
-        self.trials_priors.append(priors)
+            parameters = np.r_[parameters, list(fluxes.values())]
 
-        return objective
+        return parameters
 
     def get_priors_probability(self, pyLIMA_parameters):
         """
@@ -386,6 +619,74 @@ class MLfit(object):
 
         return ln_likelihood
 
+    def get_priors_probability_batch(self, pyLIMA_parameters):
+        """
+        Transform the prior probability to ln space for a batched pyLIMA_parameters,
+        see get_priors_probability
+
+        Parameters
+        ----------
+        pyLIMA_parameters : dict, a batched pyLIMA_parameters object
+
+        Returns
+        -------
+        ln_likelihood : array, the K values to add to the ln_likelihood from the
+        priors
+        """
+        n_batch = len(pyLIMA_parameters.vector)
+        ln_likelihood = np.zeros(n_batch)
+
+        if self.priors is not None:
+
+            for prior_key in self.priors.keys():
+
+                prior_pdf = self.priors[prior_key]
+
+                if prior_pdf is not None:
+
+                    probability = np.ravel(
+                        prior_pdf.pdf(pyLIMA_parameters[prior_key])) * np.ones(
+                        n_batch)
+                    good = probability > 0
+
+                    ln_likelihood[good] += np.log(probability[good])
+                    ln_likelihood[~good] += -10 ** 10
+
+        if self.extra_priors is not None:
+
+            for index in range(n_batch):
+
+                parameters = {key: self._batch_value(key, value, index) for key, value
+                              in pyLIMA_parameters.items()}
+
+                for extra_prior in self.extra_priors:
+
+                    probability = extra_prior.pdf(parameters)
+
+                    if probability > 0:
+
+                        ln_likelihood[index] += np.log(probability)
+
+                    else:
+
+                        ln_likelihood[index] += -10 ** 10
+
+        return ln_likelihood
+
+    @staticmethod
+    def _batch_value(key, value, index):
+
+        if not isinstance(value, np.ndarray):
+
+            return value
+
+        if key.startswith('flux_regression_'):
+
+            # The (5,K) weighted sums, see flux_regression.weighted_sums
+            return value[..., index]
+
+        return np.ravel(value)[index]
+
     def model_guess(self):
         """
         Try to estimate the microlensing parameters.
@@ -940,12 +1241,107 @@ class MLfit(object):
         ln_likelihood = 0.5*np.sum(residuals / errors + np.log(errors) +
                                 np.log(2 * np.pi))
 
+        if self.telescopes_fluxes_method == 'marginalize':
+
+            ln_likelihood += self.fluxes_marginalization(
+                pyLIMA_parameters, rescaling_photometry_parameters)
+
         prior = self.get_priors_probability(pyLIMA_parameters)
 
         ln_likelihood += -prior  # Default is -ln_likelihood
 
         return ln_likelihood, -prior, pyLIMA_parameters
 
+    def fluxes_marginalization(self, pyLIMA_parameters,
+                               rescaling_photometry_parameters=None):
+        """
+        The -ln of the analytical marginalization of the likelihood over the
+        telescopes (fsource, fblend) (only fsource if 'noblend'), i.e. the
+        likelihood is Gaussian around the regression fluxes, with covariance C
+        (see flux_regression.solve_fluxes). The -ln-likelihood at the estimated
+        fluxes has to be added (if 'noblend', the difference with the regression
+        source flux is included).
+
+        With flat priors: -ln(det(2*pi*C)**0.5).
+        With Gaussian priors N(mean, P) (see fluxes_priors):
+        -ln(det(2*pi*C)**0.5) - ln(N(fluxes|mean, C+P)).
+
+        Parameters
+        ----------
+        pyLIMA_parameters : dict, a pyLIMA_parameters object (or a batched one)
+        with the estimated fluxes, see MLmodel.derive_telescope_flux
+        rescaling_photometry_parameters : array, the errors rescaling of each
+        telescope (the last axis), if any
+
+        Returns
+        -------
+        ln_marginalization : float or array, the value(s) to add to the
+        -ln-likelihood
+        """
+        if self.model.blend_flux_parameter == 'noblend':
+
+            regression = 'noblend'
+            n_fluxes = 1
+
+        else:
+
+            regression = 'fblend'
+            n_fluxes = 2
+
+        ln_marginalization = 0
+
+        ind = 0
+
+        for telescope in self.model.event.telescopes:
+
+            if telescope.lightcurve is not None:
+
+                sums = pyLIMA_parameters['flux_regression_' + telescope.name]
+
+                if rescaling_photometry_parameters is not None:
+
+                    # The weights scale as 1/k**2, i.e. C as k**2
+                    sums = sums / rescaling_photometry_parameters[..., ind] ** 2
+
+                f_source, f_blend, covariance = flux_regression.solve_fluxes(
+                    sums, regression)
+
+                fluxes = np.moveaxis(np.array([f_source, f_blend]), 0, -1)[...,
+                         :n_fluxes]
+                covariance = covariance[..., :n_fluxes, :n_fluxes]
+
+                ln_marginalization = ln_marginalization - 0.5 * np.linalg.slogdet(
+                    2 * np.pi * covariance)[1]
+
+                if regression == 'noblend':
+
+                    # The -ln-likelihood is at the model source flux (e.g. the
+                    # median estimator), chi2(f) = chi2(f_regression)+(df)**2/C
+                    delta = np.reshape(pyLIMA_parameters['fsource_' + telescope.name],
+                                       np.shape(f_source)) - f_source
+
+                    ln_marginalization = ln_marginalization - 0.5 * delta ** 2 / \
+                                         covariance[..., 0, 0]
+
+                if telescope.name in self.fluxes_priors:
+
+                    mean, prior_covariance = self.fluxes_priors[telescope.name]
+
+                    total_covariance = covariance + np.atleast_2d(prior_covariance)[
+                                                    :n_fluxes, :n_fluxes]
+                    delta = fluxes - np.atleast_1d(mean)[:n_fluxes]
+
+                    chi2_prior = np.sum(delta * np.linalg.solve(
+                        total_covariance, delta[..., None])[..., 0], axis=-1)
+
+                    ln_marginalization = ln_marginalization + 0.5 * (
+                            chi2_prior + np.linalg.slogdet(
+                        2 * np.pi * total_covariance)[1])
+
+                ind += 1
+
+        return ln_marginalization
+
     def model_soft_l1(self, parameters):
         """
         Given a set of parameters, estimate the soft_l1 metric:
@@ -1111,8 +1507,8 @@ class MLfit(object):
 
     def residuals_Jacobian(self, fit_process_parameters):
         """
-        Given a set of parameters, estimate the Jacobian of residuals (no astrometry
-        yet)
+        Given a set of parameters, estimate the Jacobian of residuals, i.e. the
+        photometric rows then the astrometric rows (same order as model_residuals)
 
         Parameters
         ----------
@@ -1120,15 +1516,33 @@ class MLfit(object):
 
         Returns
         -------
-        photometric_jacobian : array, an array containing the derivative of the
-        residuals
+        jacobian : array, an array containing the derivative of the residuals
         """
-        photometric_jacobian = self.photometric_residuals_Jacobian(
-            fit_process_parameters)
+        jacobians = []
+
+        if self.model.photometry:
+
+            jacobians.append(self.photometric_residuals_Jacobian(
+                fit_process_parameters))
+
+        if self.model.astrometry:
+
+            astrometric_jacobian = self.astrometric_residuals_Jacobian(
+                fit_process_parameters)
 
-        # No Astrometry Yet
+            if jacobians:
 
-        return photometric_jacobian
+                # The astrometric residuals do not depend on the telescopes fluxes
+                n_columns = jacobians[0].shape[1]
+                astrometric_jacobian = np.c_[astrometric_jacobian, np.zeros((
+                    len(astrometric_jacobian),
+                    n_columns - astrometric_jacobian.shape[1]))]
+
+            jacobians.append(astrometric_jacobian)
+
+        jacobian = np.concatenate(jacobians)
+
+        return jacobian
 
     def photometric_residuals_Jacobian(self, fit_process_parameters):
         """
@@ -1145,59 +1559,76 @@ class MLfit(object):
 
         pyLIMA_parameters = self.model.compute_pyLIMA_parameters(fit_process_parameters)
 
-        count = 0
-        for telescope in self.model.event.telescopes:
+        if self.model.blend_flux_parameter != 'noblend':
 
-            if count == 0:
+            n_fluxes = 2
 
-                _jacobi = self.model.photometric_model_Jacobian(telescope,
-                                                                pyLIMA_parameters) / \
-                          telescope.lightcurve['err_flux'].value
+        else:
 
-            else:
+            n_fluxes = 1
 
-                _jacobi = np.c_[
-                    _jacobi, self.model.photometric_model_Jacobian(telescope,
-                                                                   pyLIMA_parameters) /
-                             telescope.lightcurve['err_flux'].value]
+        photometric_telescopes = [telescope for telescope in
+                                  self.model.event.telescopes if
+                                  telescope.lightcurve is not None]
 
-            count += 1
+        n_data = [len(telescope.lightcurve) for telescope in photometric_telescopes]
+        starts = np.r_[0, np.cumsum(n_data)]
 
-        # The objective function is : (data-model)/errors
+        jacobi = None
 
-        _jacobi = -_jacobi
-        # Split the fs and g derivatives in several columns correpsonding to
-        # each observatories
-        start_index = 0
+        # Block structure : the model parameters columns span all the data, each
+        # telescope fluxes columns only span the telescope data.
+        for ind, telescope in enumerate(photometric_telescopes):
 
-        if self.model.blend_flux_parameter != 'noblend':
-            jacobi = _jacobi[:-2]
-            dresdfs = _jacobi[-2]
-            dresdg = _jacobi[-1]
+            _jacobi = -self.model.photometric_model_Jacobian(telescope,
+                                                             pyLIMA_parameters) / \
+                      telescope.data_arrays('photometry')['err_flux']
+            # The objective function is : (data-model)/errors
 
-        else:
-            jacobi = _jacobi[:-1]
+            if jacobi is None:
+
+                n_model = len(_jacobi) - n_fluxes
+                jacobi = np.zeros((n_model + n_fluxes * len(n_data), starts[-1]))
+
+            rows = slice(starts[ind], starts[ind + 1])
+            jacobi[:n_model, rows] = _jacobi[:n_model]
+            jacobi[n_model + n_fluxes * ind:n_model + n_fluxes * (ind + 1), rows] = \
+                _jacobi[n_model:]
+
+        return jacobi.T
+
+    def astrometric_residuals_Jacobian(self, fit_process_parameters):
+        """
+        Given a set of parameters, estimate the Jacobian of astrometric residuals
+
+        Parameters
+        ----------
+        fit_process_parameters : , a pyLIMA_parameters object or an array of parameters
+
+        Returns
+        -------
+        jacobi : array, an array containing the derivative of the residuals, i.e.
+        the [ra,dec] rows of each telescope. The columns are the model parameters
+        (telescopes fluxes excluded).
+        """
+
+        pyLIMA_parameters = self.model.compute_pyLIMA_parameters(fit_process_parameters)
 
-            dresdfs = _jacobi[-1]
-            dresdg = None
+        jacobi = []
 
         for telescope in self.model.event.telescopes:
-            derivative_fs = np.zeros((len(dresdfs)))
-            index = np.arange(start_index, start_index + len(telescope.lightcurve))
 
-            if self.model.blend_flux_parameter != 'noblend':
-                derivative_g = np.zeros((len(dresdg)))
+            if telescope.astrometry is not None:
 
-                derivative_fs[index] = dresdfs[index]
-                derivative_g[index] = dresdg[index]
-                jacobi = np.r_[jacobi, np.array([derivative_fs, derivative_g])]
-            else:
-                derivative_fs[index] = dresdfs[index]
-                jacobi = np.r_[jacobi, [derivative_fs]]
+                astrometry = telescope.data_arrays('astrometry')
 
-            start_index = index[-1] + 1
+                # The objective function is : (data-model)/errors
+                jacobi.append(-self.model.astrometry_Jacobian(telescope,
+                                                              pyLIMA_parameters) /
+                              np.r_[astrometry['err_ra'], astrometry['err_dec']][:,
+                              None])
 
-        return jacobi.T
+        return np.concatenate(jacobi)
 
     def check_telescopes_fluxes_limits(self, telescopes_fluxes):
         """
@@ -11,8 +11,14 @@ class TRFfit(LMfit):
 
         return "Trust Region Reflective"
 
-    def fit(self):
-
+    def fit(self, computational_pool=None):
+        """
+        Parameters
+        ----------
+        computational_pool : a pool object with a map method. If the model Jacobian
+        is numerical, the Jacobian columns are evaluated concurrently on the pool
+        (see magnification_Jacobian.numerical_Jacobian), None by default
+        """
         starting_time = python_time.time()
 
         # use the analytical Jacobian (faster) if no second order are present,
@@ -37,13 +43,28 @@ class TRFfit(LMfit):
             n_data = n_data + telescope.n_data('flux')
             n_data = n_data + telescope.n_data('astrometry')
 
-        if self.model.Jacobian_flag != 'Numerical':
+        diff_step = None
+        objective_function = self.objective_function
+
+        if (self.model.Jacobian_flag != 'Numerical') | (computational_pool is not None):
 
             jacobian_function = self.residuals_Jacobian
+            self.model.Jacobian_pool = computational_pool
 
         else:
 
             jacobian_function = '2-point'
+            diff_step = self.numerical_Jacobian_steps()
+
+            sparsity = self.residuals_Jacobian_sparsity()
+
+            if sparsity is not None:
+
+                # Fewer residuals evaluations, with a dense Jacobian
+                objective_function, jacobian_function = \
+                    self.grouped_numerical_Jacobian(sparsity,
+                                                    (bounds_min, bounds_max),
+                                                    diff_step)
 
         if self.loss_function == 'soft_l1':
 
@@ -54,13 +75,21 @@ class TRFfit(LMfit):
 
             loss = 'linear'
 
-        trf_fit = scipy.optimize.least_squares(self.objective_function, self.guess,
-                                               method='trf',
-                                               bounds=(bounds_min, bounds_max),
-                                               max_nfev=50000, jac=jacobian_function,
-                                               loss=loss, xtol=10**-10, ftol=10**-10,
-                                               gtol=10**-10,
-                                               x_scale=scaling)
+        try:
+
+            trf_fit = scipy.optimize.least_squares(objective_function, self.guess,
+                                                   method='trf',
+                                                   bounds=(bounds_min, bounds_max),
+                                                   max_nfev=50000,
+                                                   jac=jacobian_function,
+                                                   loss=loss, xtol=10**-10,
+                                                   ftol=10**-10, gtol=10**-10,
+                                                   diff_step=diff_step,
+                                                   x_scale=scaling)
+
+        finally:
+
+            self.model.Jacobian_pool = None
         fit_results = trf_fit['x']
         fit_chi2 = trf_fit['cost'] * 2  # chi2
 
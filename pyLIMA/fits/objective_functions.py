@@ -36,10 +36,10 @@ def all_telescope_astrometric_residuals(model, pyLIMA_parameters, norm=False,
 
             # Find the residuals of telescope observation regarding the parameters
             # and model
-            astrometry = telescope.astrometry
+            astrometry = telescope.data_arrays('astrometry')
 
-            astro_ra = astrometry['ra'].value
-            astro_dec = astrometry['dec'].value
+            astro_ra = astrometry['ra']
+            astro_dec = astrometry['dec']
             microlensing_model = model.compute_the_microlensing_model(telescope,
                                                                       pyLIMA_parameters)
 
@@ -50,15 +50,15 @@ def all_telescope_astrometric_residuals(model, pyLIMA_parameters, norm=False,
 
             if rescaling_astrometry_parameters is not None:
 
-                err_ra = astrometry['err_ra'].value * (
+                err_ra = astrometry['err_ra'] * (
                     rescaling_astrometry_parameters_ra[ind])
-                err_dec = astrometry['err_dec'].value * (
+                err_dec = astrometry['err_dec'] * (
                     rescaling_astrometry_parameters_dec[ind])
 
             else:
 
-                err_ra = astrometry['err_ra'].value
-                err_dec = astrometry['err_dec'].value
+                err_ra = astrometry['err_ra']
+                err_dec = astrometry['err_dec']
 
             if norm:
                 residus_ra /= err_ra
@@ -113,9 +113,9 @@ def all_telescope_photometric_residuals(model, pyLIMA_parameters, norm=False,
 
             # Find the residuals of telescope observation regarding the parameters
             # and model
-            lightcurve = telescope.lightcurve
+            lightcurve = telescope.data_arrays('photometry')
 
-            flux = lightcurve['flux'].value
+            flux = lightcurve['flux']
 
             microlensing_model = model.compute_the_microlensing_model(telescope,
                                                                       pyLIMA_parameters)
@@ -127,11 +127,11 @@ def all_telescope_photometric_residuals(model, pyLIMA_parameters, norm=False,
                 # err_flux = lightcurve[
                 # 'err_flux'].value+rescaling_photometry_parameters[ind] * \
                 #           microlensing_model['photometry']
-                err_flux = lightcurve['err_flux'].value * \
+                err_flux = lightcurve['err_flux'] * \
                            rescaling_photometry_parameters[ind]
             else:
 
-                err_flux = lightcurve['err_flux'].value
+                err_flux = lightcurve['err_flux']
 
             if norm:
                 residus /= err_flux
@@ -0,0 +1,427 @@
+import glob
+import os
+import tempfile
+
+import numpy as np
+
+
+class TrialsRecorder(object):
+    """
+    Record the trials of a fit, i.e. the rows [fit_parameters (+fluxes), objective,
+    priors], in preallocated numpy buffers. The process that created the recorder
+    keeps the trials in memory, the other processes (i.e. the workers of a
+    computational pool) keep their own trials in a memory mapped file in directory,
+    i.e. written to disk in blocks by the system and not lost if a worker is
+    terminated. The buffers and files grow by doubling, up to max_trials rows in
+    'ring' and 'reservoir' modes, so the memory and disk use are bounded by the
+    number of recorded trials. The workers trials are gathered by merge at the end
+    of the fit.
+
+    Attributes
+    ----------
+    mode : str, 'all' (default) to keep all the trials, 'ring' to keep only the
+    last max_trials, 'reservoir' to keep a uniform random sample of max_trials or
+    'none' to disable the recorder
+    max_trials : int, the maximum number of trials kept in 'ring' and 'reservoir'
+    modes
+    subsample : int, keep only one trial every subsample trials
+    buffer_size : int, the initial number of rows of the buffers and workers files
+    directory : str, the directory of the workers files
+    buffer : array, the trials recorded by the main process
+    n_rows : int, the number of rows filled in the buffer
+    n_trials : int, the number of trials submitted to the recorder by this process
+    """
+
+    def __init__(self, mode='all', max_trials=10 ** 6, subsample=1,
+                 buffer_size=10 ** 4, directory=None):
+
+        if mode not in ['all', 'ring', 'reservoir', 'none']:
+            raise ValueError('Unknown trials recorder mode: ' + str(mode))
+
+        self.mode = mode
+        self.max_trials = int(max_trials)
+        self.subsample = max(int(subsample), 1)
+        self.buffer_size = int(buffer_size)
+
+        self.owner = os.getpid()
+
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(),
+                                     'pyLIMA_trials_' + str(self.owner) + '_' +
+                                     str(id(self)))
+
+        self.directory = directory
+        self.random_generator = np.random.default_rng()
+
+        self.buffer = None
+        self.n_rows = 0
+        self.n_trials = 0
+        self.n_stored = 0
+        self.worker_file = None
+
+    def __getstate__(self):
+
+        # The buffer stays in the main process, workers start with an empty one
+        state = self.__dict__.copy()
+        state['buffer'] = None
+        state['n_rows'] = 0
+        state['n_stored'] = 0
+        state['worker_file'] = None
+
+        return state
+
+    def clear(self):
+        """
+        Remove all the trials, including the workers files
+        """
+        self.buffer = None
+        self.n_rows = 0
+        self.n_trials = 0
+        self.n_stored = 0
+
+        for worker_file in glob.glob(os.path.join(self.directory, 'trials_*.bin')):
+
+            os.remove(worker_file)
+
+    def record(self, parameters, objective, priors):
+        """
+        Record one trial
+
+        Parameters
+        ----------
+        parameters : list, the fit parameters (and the telescopes fluxes)
+        objective : float, the objective function value
+        priors : float, the priors value
+        """
+        if self.mode == 'none':
+
+            return
+
+        self.n_trials += 1
+
+        if (self.n_trials - 1) % self.subsample != 0:
+
+            return
+
+        row = np.r_[np.ravel(parameters), objective, priors].astype(float)
+
+        self._store(row[None, :])
+
+    def record_batch(self, parameters, objective, priors):
+        """
+        Record K trials
+
+        Parameters
+        ----------
+        parameters : array, the (K,n) fit parameters (and the telescopes fluxes)
+        objective : array, the K objective function values
+        priors : array, the K priors values
+        """
+        if self.mode == 'none':
+
+            return
+
+        rows = np.c_[parameters, objective, priors].astype(float)
+
+        kept = (np.arange(self.n_trials, self.n_trials + len(rows)) %
+                self.subsample) == 0
+        self.n_trials += len(rows)
+
+        if kept.any():
+
+            self._store(rows[kept])
+
+    def _store(self, rows):
+
+        if os.getpid() != self.owner:
+
+            self._store_worker_rows(rows)
+
+            return
+
+        if self.mode == 'all':
+
+            self._grow_buffer(rows.shape[1], self.n_rows + len(rows))
+
+            self.buffer[self.n_rows:self.n_rows + len(rows)] = rows
+            self.n_rows += len(rows)
+
+        else:
+
+            self._grow_buffer(rows.shape[1], self.n_stored + len(rows))
+
+            self.n_stored = self._bounded_store(self.buffer, self.n_stored, rows)
+            self.n_rows = min(self.n_stored, len(self.buffer))
+
+    def _capacity(self, capacity, n_needed):
+        """
+        The number of rows of a buffer holding n_needed rows, i.e. the current
+        capacity doubled (at least buffer_size), up to max_trials in 'ring' and
+        'reservoir' modes
+
+        Parameters
+        ----------
+        capacity : int, the current number of rows of the buffer
+        n_needed : int, the number of rows submitted to the buffer
+
+        Returns
+        -------
+        capacity : int, the new number of rows of the buffer
+        """
+        if n_needed <= capacity:
+
+            return capacity
+
+        new_capacity = max(2 * capacity, n_needed, self.buffer_size)
+
+        if self.mode != 'all':
+
+            new_capacity = min(new_capacity, self.max_trials)
+
+        return max(new_capacity, capacity)
+
+    def _grow_buffer(self, width, n_needed):
+
+        if self.buffer is None:
+
+            self.buffer = np.zeros((0, width))
+
+        _check_rows_width(width, self.buffer.shape[1])
+
+        capacity = self._capacity(len(self.buffer), n_needed)
+
+        if capacity > len(self.buffer):
+
+            # Rings and reservoirs are filled in order until max_trials rows
+            new_buffer = np.zeros((capacity, width))
+            new_buffer[:self.n_rows] = self.buffer[:self.n_rows]
+            self.buffer = new_buffer
+
+    def _bounded_store(self, buffer, n_stored, rows):
+        """
+        Store rows in a ring or a reservoir buffer
+
+        Parameters
+        ----------
+        buffer : array, the ring or reservoir buffer, modified in place
+        n_stored : int, the number of rows already submitted to the buffer
+        rows : array, the new rows
+
+        Returns
+        -------
+        n_stored : int, the updated number of rows submitted to the buffer
+        """
+        size = len(buffer)
+
+        if self.mode == 'ring':
+
+            n_stored += max(len(rows) - size, 0)
+            rows = rows[-size:]
+
+            index = np.arange(n_stored, n_stored + len(rows)) % size
+            buffer[index] = rows
+
+            return n_stored + len(rows)
+
+        n_free = min(max(size - n_stored, 0), len(rows))
+        buffer[n_stored:n_stored + n_free] = rows[:n_free]
+        n_stored += n_free
+        rows = rows[n_free:]
+
+        # Algorithm R, each row replaces a random slot with probability size/seen
+        index = self.random_generator.integers(0, n_stored + np.arange(len(rows)) +
+                                               1)
+        kept = index < size
+
+        # When several rows replace the same slot, the last one wins
+        index, last = np.unique(index[kept][::-1], return_index=True)
+        buffer[index] = rows[kept][::-1][last]
+
+        return n_stored + len(rows)
+
+    def _worker_file_name(self, width):
+
+        return os.path.join(self.directory, 'trials_' + str(os.getpid()) + '_' +
+                            str(width) + '.bin')
+
+    def _map_worker_file(self, width, capacity=None):
+        """
+        Memory map the worker file, created (or extended with zeros) to capacity
+        rows if given
+
+        Parameters
+        ----------
+        width : int, the number of columns of the trials
+        capacity : int, the number of trials rows of the file
+
+        Returns
+        -------
+        worker_file : array, the memory mapped file, the first row holding the
+        number of submitted rows and the capacity
+        """
+        file_name = self._worker_file_name(width)
+
+        if capacity is not None:
+
+            with open(file_name, 'ab') as worker_file:
+
+                worker_file.truncate((capacity + 1) * width * 8)
+
+        n_rows = os.path.getsize(file_name) // (width * 8)
+        worker_file = np.memmap(file_name, dtype=np.float64, mode='r+',
+                                shape=(n_rows, width))
+
+        if capacity is not None:
+
+            worker_file[0, 1] = capacity
+
+        return worker_file
+
+    def _store_worker_rows(self, rows):
+
+        width = rows.shape[1]
+
+        if self.worker_file is None:
+
+            # The file is shared by all the copies of the recorder in this worker,
+            # and memory mapped, so it is up to date even if the worker is terminated
+            os.makedirs(self.directory, exist_ok=True)
+
+            if os.path.exists(self._worker_file_name(width)):
+
+                self.worker_file = self._map_worker_file(width)
+
+            else:
+
+                self.worker_file = self._map_worker_file(
+                    width, self._capacity(0, len(rows)))
+
+        elif int(self.worker_file[0, 1]) != len(self.worker_file) - 1:
+
+            # Extended by another copy of the recorder
+            self.worker_file = self._map_worker_file(width)
+
+        n_stored = int(self.worker_file[0, 0])
+        capacity = self._capacity(len(self.worker_file) - 1, n_stored + len(rows))
+
+        if capacity > len(self.worker_file) - 1:
+
+            self.worker_file.flush()
+            self.worker_file = self._map_worker_file(width, capacity)
+
+        if self.mode == 'all':
+
+            self.worker_file[n_stored + 1:n_stored + len(rows) + 1] = rows
+            self.worker_file[0, 0] = n_stored + len(rows)
+
+        else:
+
+            self.worker_file[0, 0] = self._bounded_store(self.worker_file[1:],
+                                                         n_stored, rows)
+
+    def _merge_reservoir(self, rows, n_seen):
+        """
+        Merge a reservoir of rows into the main reservoir, so that the result is
+        still a uniform sample of all the submitted rows
+
+        Parameters
+        ----------
+        rows : array, the reservoir to merge
+        n_seen : int, the number of rows submitted to this reservoir
+        """
+        self._grow_buffer(rows.shape[1], self.n_stored + n_seen)
+
+        n_total = self.n_stored + n_seen
+        n_sample = min(n_total, len(self.buffer))
+        n_new = self.random_generator.hypergeometric(n_seen, self.n_stored, n_sample)
+
+        current = self.buffer[self.random_generator.permutation(self.n_rows)[
+                              :n_sample - n_new]]
+        new = rows[self.random_generator.permutation(len(rows))[:n_new]]
+
+        self.buffer[:n_sample] = np.r_[current, new]
+        self.n_stored = n_total
+        self.n_rows = n_sample
+
+    def merge(self):
+        """
+        Gather the trials of the workers into the main process buffer (the workers
+        files are then removed) and return all the trials
+
+        Returns
+        -------
+        trials_parameters : array, the trials parameters
+        trials_objective : array, the trials objective function values
+        trials_priors : array, the trials priors values
+        """
+        for worker_file in sorted(glob.glob(os.path.join(self.directory,
+                                                         'trials_*.bin'))):
+
+            width = int(os.path.basename(worker_file)[:-4].split('_')[-1])
+            rows = np.fromfile(worker_file).reshape(-1, width)
+
+            if len(rows) == 0:
+
+                pass
+
+            elif self.mode == 'all':
+
+                self._store(rows[1:int(rows[0, 0]) + 1])
+
+            else:
+
+                n_seen = int(rows[0, 0])
+                rows = rows[1:min(n_seen, len(rows) - 1) + 1]
+
+                if (self.mode == 'ring') & (n_seen > len(rows)):
+
+                    rows = np.roll(rows, -(n_seen % len(rows)), axis=0)
+
+                if self.mode == 'ring':
+
+                    # The rows dropped by the worker ring are counted as submitted
+                    self.n_stored += n_seen - len(rows)
+                    self._store(rows)
+
+                else:
+
+                    self._merge_reservoir(rows, n_seen)
+
+            os.remove(worker_file)
+
+        if os.path.isdir(self.directory):
+
+            try:
+
+                os.rmdir(self.directory)
+
+            except OSError:
+
+                pass
+
+        if self.buffer is None:
+
+            return np.zeros((0, 0)), np.zeros(0), np.zeros(0)
+
+        if (self.mode == 'ring') & (self.n_stored > len(self.buffer)):
+
+            start = self.n_stored % len(self.buffer)
+            trials = np.roll(self.buffer, -start, axis=0)
+
+        else:
+
+            # A copy, so the caller can modify the trials (e.g. MCMC negates them)
+            trials = self.buffer[:self.n_rows].copy()
+
+        return trials[:, :-2], trials[:, -2], trials[:, -1]
+
+
+def _check_rows_width(width, buffer_width):
+    """
+    Raise a ValueError if the trials rows do not have the buffer width, i.e. the
+    trials of different parameters are recorded together
+    """
+    if width != buffer_width:
+
+        raise ValueError('The trials have ' + str(width - 2) + ' parameters, '
+                         'the recorded trials have ' + str(buffer_width - 2))
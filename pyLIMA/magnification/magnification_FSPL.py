@@ -33,6 +33,34 @@ interpol_db0 = interpolate.interp1d(zz, dB0, kind='linear')
 interpol_db1 = interpolate.interp1d(zz, dB1, kind='linear')
 YOO_TABLE = [zz, interpol_b0, interpol_b1, interpol_db0, interpol_db1]
 
+# [B0,B1,dB0/dz,dB1/dz] rows, to interpolate the four columns at once
+YOO_TABLE_VALUES = np.c_[b0, b1, dB0, dB1]
+
+
+def Yoo_table_interpolation(z_yoo):
+    """
+    Linear interpolation of the Yoo table, i.e. B0, B1 and their derivatives, with
+    a single search of the z_yoo positions in the table
+
+    Parameters
+    ----------
+    z_yoo : array, u/rho, inside the table range
+
+    Returns
+    -------
+    table_values : array, the [B0,B1,dB0/dz,dB1/dz] at z_yoo
+    """
+    # Same arithmetic as scipy interp1d(kind='linear')
+    index = np.clip(np.searchsorted(zz, z_yoo), 1, len(zz) - 1)
+
+    slope = (YOO_TABLE_VALUES[index] - YOO_TABLE_VALUES[index - 1]) / (
+            zz[index] - zz[index - 1])[:, None]
+
+    table_values = slope * (z_yoo - zz[index - 1])[:, None] + YOO_TABLE_VALUES[
+        index - 1]
+
+    return table_values.T
+
 
 def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False):
     """
@@ -41,9 +69,9 @@ def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False)
 
     Parameters
     ----------
-    tau : array, (t-t0)/tE
+    tau : array, (t-t0)/tE, can be 2D (one row per set of parameters)
     beta : array, [u0]*len(t)
-    rho : float, the normalized angular source radius
+    rho : float, the normalized angular source radius (or a column of rho)
     gamma : float, the linear microlensing limb darkening coefficient.
     return_impact_parameter : bool, if the impact parameter is needed or not
 
@@ -65,26 +93,27 @@ def magnification_FSPL_Yoo(tau, beta, rho, gamma, return_impact_parameter=False)
 
     z_yoo = impact_parameter / rho
 
-    magnification_fspl = np.zeros(len(magnification_pspl))
+    magnification_fspl = np.zeros(magnification_pspl.shape)
 
     # Far from the lens (z_yoo>>1), then PSPL.
-    indexes_PSPL = np.where((z_yoo > YOO_TABLE[0][-1]))[0]
+    indexes_PSPL = z_yoo > YOO_TABLE[0][-1]
 
     magnification_fspl[indexes_PSPL] = magnification_pspl[indexes_PSPL]
 
     # Very close to the lens (z_yoo<<1), then Witt&Mao limit.
-    indexes_WM = np.where((z_yoo < YOO_TABLE[0][0]))[0]
+    indexes_WM = z_yoo < YOO_TABLE[0][0]
 
     magnification_fspl[indexes_WM] = magnification_pspl[indexes_WM] * (
             2 * z_yoo[indexes_WM] - gamma *
             (2 - 3 * np.pi / 4) * z_yoo[indexes_WM])
 
     # FSPL regime (z_yoo~1), then Yoo et al derivatives
-    indexes_FSPL = np.where((z_yoo <= YOO_TABLE[0][-1]) & (z_yoo >= YOO_TABLE[0][0]))[0]
+    indexes_FSPL = (z_yoo <= YOO_TABLE[0][-1]) & (z_yoo >= YOO_TABLE[0][0])
+
+    b0, b1 = Yoo_table_interpolation(z_yoo[indexes_FSPL])[:2]
 
     magnification_fspl[indexes_FSPL] = magnification_pspl[indexes_FSPL] * (
-            YOO_TABLE[1](z_yoo[indexes_FSPL]) -
-            gamma * YOO_TABLE[2](z_yoo[indexes_FSPL]))
+            b0 - gamma * b1)
 
     if return_impact_parameter:
 
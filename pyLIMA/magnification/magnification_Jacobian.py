@@ -1,166 +1,533 @@
+import multiprocessing
+
 import numpy as np
-from scipy.optimize._numdiff import approx_derivative
+from pyLIMA.magnification import magnification_FSPL
 
+# The microlensing model of the ModelPool workers, set once by _initialize_worker
+_WORKER_MODEL = None
 
-def magnification_PSPL_Jacobian(pspl_model, telescope, pyLIMA_parameters):
+
+def trajectory_Jacobian(microlensing_model, telescope, pyLIMA_parameters,
+                        data_type='photometry'):
     """
-    The Jacobian of the PSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE]
+    The sources trajectories (tau,beta) and their derivatives for PSPL/FSPL models
+    with (or without) parallax and static double source. The parallax shifts are
+    linear in (piEN,piEE), see parallax.compute_parallax_curvature.
 
     Parameters
     ----------
-    pspl_model : object, a PSPL model object
+    microlensing_model : object, a PSPL or FSPL model object
     telescope : object, a telescope object
     pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    data_type : str, 'photometry' or 'astrometry'
 
     Returns
     -------
-    magnification_jacobian : array, the magnification Jacobian
-    Amplification : array, the magnification associated
+    trajectories : list, the [tau,beta,derivatives] of each source, where
+    derivatives is a dictionnary of (dtau/dp,dbeta/dp) for each parameter p
     """
-    time = telescope.lightcurve['time'].value
+    data_arrays = telescope.data_arrays(data_type)
+    time = data_arrays['time']
+
+    (source1_trajectory_x, source1_trajectory_y,
+     source2_trajectory_x, source2_trajectory_y,
+     dseparation, dalpha) = microlensing_model.sources_trajectory(
+        telescope, pyLIMA_parameters, data_type=data_type)
+
+    t0 = pyLIMA_parameters['t0']
+    tE = pyLIMA_parameters['tE']
+
+    zeros = np.zeros(len(time))
+
+    derivatives = {'t0': (zeros - 1 / tE, zeros),
+                   'u0': (zeros, zeros + 1),
+                   'tE': (-(time - t0) / tE ** 2, zeros)}
+
+    if microlensing_model.parallax_model[0] != 'None':
 
-    # Derivative of A = (u^2+2)/(u(u^2+4)^0.5). Amplification[0] is A(t).
-    # Amplification[1] is U(t).
-    Amplification = pspl_model.model_magnification(telescope, pyLIMA_parameters,
-                                                   return_impact_parameter=True)
-    dAmplificationdU = (-8) / (
-            Amplification[1] ** 2 * (Amplification[1] ** 2 + 4) ** 1.5)
+        delta_north, delta_east = data_arrays['deltas_positions']
 
-    # Derivative of U = (uo^2+(t-to)^2/tE^2)^0.5
-    dUdt0 = -(time - pyLIMA_parameters['t0']) / \
-            (pyLIMA_parameters['tE'] ** 2 * Amplification[1])
-    dUdu0 = pyLIMA_parameters['u0'] / Amplification[1]
-    dUdtE = -(time - pyLIMA_parameters['t0']) ** 2 / \
-            (pyLIMA_parameters['tE'] ** 3 * Amplification[1])
+        derivatives['piEN'] = (delta_north, delta_east)
+        derivatives['piEE'] = (delta_east, -delta_north)
 
-    # Derivative of the model
+    # No alpha in PSPL/FSPL, i.e. the source positions are (-tau,-beta)
+    trajectories = [[-source1_trajectory_x, -source1_trajectory_y, derivatives]]
 
-    dAdt0 = dAmplificationdU * dUdt0
-    dAdu0 = dAmplificationdU * dUdu0
-    dAdtE = dAmplificationdU * dUdtE
+    if source2_trajectory_x is not None:
 
-    magnification_jacobian = np.array([dAdt0, dAdu0, dAdtE]).T
+        derivatives_2 = derivatives.copy()
+        derivatives_2['tE'] = (-(time - t0 - pyLIMA_parameters['delta_t0']) /
+                               tE ** 2, zeros)
+        derivatives_2['delta_t0'] = (zeros - 1 / tE, zeros)
+        derivatives_2['delta_u0'] = (zeros, zeros + 1)
 
-    return magnification_jacobian, Amplification[0]
+        trajectories.append([-source2_trajectory_x, -source2_trajectory_y,
+                             derivatives_2])
 
+    return trajectories
 
-def magnification_FSPL_Jacobian(fspl_model, telescope, pyLIMA_parameters):
+
+def impact_parameter_Jacobian(tau, beta, derivatives):
     """
-    The Jacobian of the FSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE,
-    dA(t0/drho]
+    The impact parameter U = (tau^2+beta^2)^0.5 and its derivatives
 
     Parameters
     ----------
-    fspl_model : object, a FSPL model object
-    telescope : object, a telescope object
-    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    tau : array, the source trajectory along the lens motion
+    beta : array, the source trajectory perpendicular to the lens motion
+    derivatives : dict, the (dtau/dp,dbeta/dp) for each parameter p
 
     Returns
     -------
-    magnification_jacobian : array, the magnification Jacobian
+    impact_parameter : array, U(t)
+    impact_parameter_derivatives : dict, dU/dp for each parameter p
+    """
+    impact_parameter = (tau ** 2 + beta ** 2) ** 0.5
+
+    impact_parameter_derivatives = {
+        key: (tau * derivatives[key][0] + beta * derivatives[key][1]) /
+             impact_parameter for key in derivatives}
+
+    return impact_parameter, impact_parameter_derivatives
+
+
+def PSPL_magnification_derivatives(impact_parameter):
+    """
+    The PSPL magnification A = (U^2+2)/(U(U^2+4)^0.5) and dA/dU
+
+    Parameters
+    ----------
+    impact_parameter : array, U(t)
+
+    Returns
+    -------
+    magnification : array, A(t)
+    dAdU : array, the derivative of the magnification
     """
+    magnification = (impact_parameter ** 2 + 2) / (
+            impact_parameter * (impact_parameter ** 2 + 4) ** 0.5)
 
-    from pyLIMA.models import PSPL_model
-    from pyLIMA.magnification import magnification_FSPL
+    dAdU = (-8) / (impact_parameter ** 2 * (impact_parameter ** 2 + 4) ** 1.5)
 
-    yoo_table = magnification_FSPL.YOO_TABLE.copy()
+    return magnification, dAdU
 
-    time = telescope.lightcurve['time'].value
 
-    fake_model = PSPL_model.PSPLmodel(fspl_model.event)
-    # Derivative of A = Yoo et al (2004) method.
-    Amplification_PSPL = fake_model.model_magnification(telescope, pyLIMA_parameters,
-                                                        return_impact_parameter=True)
+def FSPL_magnification_derivatives(impact_parameter, rho, gamma):
+    """
+    The Yoo et al. (2004) FSPL magnification and its derivatives, dA/dU and
+    dA/drho. The Yoo table (B0,B1 and their derivatives) is interpolated once, see
+    magnification_FSPL.Yoo_table_interpolation.
+
+    Parameters
+    ----------
+    impact_parameter : array, U(t)
+    rho : float, the normalized angular source radius
+    gamma : float, the linear microlensing limb darkening coefficient
+
+    Returns
+    -------
+    magnification : array, A(t)
+    dAdu : array, the derivative of the magnification with U
+    dAdrho : array, the derivative of the magnification with rho
+    """
+    z_table = magnification_FSPL.YOO_TABLE[0]
 
-    dAmplification_PSPLdU = (-8) / (
-            Amplification_PSPL[1] ** 2 * (Amplification_PSPL[1] ** 2 + 4) ** (1.5))
+    magnification_PSPL, dAmplification_PSPLdU = PSPL_magnification_derivatives(
+        impact_parameter)
 
     # z_yoo=U/rho
-    z_yoo = Amplification_PSPL[1] / pyLIMA_parameters['rho']
+    z_yoo = impact_parameter / rho
 
-    dAdu = np.zeros(len(Amplification_PSPL[0]))
-    dAdrho = np.zeros(len(Amplification_PSPL[0]))
+    magnification = np.zeros(len(impact_parameter))
+    dAdu = np.zeros(len(impact_parameter))
+    dAdrho = np.zeros(len(impact_parameter))
 
     # Far from the lens (z_yoo>>1), then PSPL.
-    ind = np.where((z_yoo > yoo_table[0][-1]))[0]
+    ind = np.where((z_yoo > z_table[-1]))[0]
+    magnification[ind] = magnification_PSPL[ind]
     dAdu[ind] = dAmplification_PSPLdU[ind]
     dAdrho[ind] = -0.0
 
     # Very close to the lens (z_yoo<<1), then Witt&Mao limit.
-    ind = np.where((z_yoo < yoo_table[0][0]))[0]
+    ind = np.where((z_yoo < z_table[0]))[0]
+    magnification[ind] = magnification_PSPL[ind] * (
+            2 * z_yoo[ind] - gamma * (2 - 3 * np.pi / 4) * z_yoo[ind])
     dAdu[ind] = dAmplification_PSPLdU[ind] * (
-            2 * z_yoo[ind] - telescope.ld_gamma * (2 - 3 * np.pi / 4) * z_yoo[ind])
+            2 * z_yoo[ind] - gamma * (2 - 3 * np.pi / 4) * z_yoo[ind])
 
-    dAdrho[ind] = -Amplification_PSPL[0][ind] * Amplification_PSPL[1][
-        ind] / pyLIMA_parameters['rho'] ** 2 * \
-                  (2 - telescope.ld_gamma * (2 - 3 * np.pi / 4))
+    dAdrho[ind] = -magnification_PSPL[ind] * impact_parameter[ind] / rho ** 2 * \
+                  (2 - gamma * (2 - 3 * np.pi / 4))
 
     # FSPL regime (z_yoo~1), then Yoo et al derivatives
-    ind = np.where((z_yoo <= yoo_table[0][-1]) & (z_yoo >= yoo_table[0][0]))[0]
+    ind = np.where((z_yoo <= z_table[-1]) & (z_yoo >= z_table[0]))[0]
+
+    b0, b1, db0, db1 = magnification_FSPL.Yoo_table_interpolation(z_yoo[ind])
+
+    magnification[ind] = magnification_PSPL[ind] * (b0 - gamma * b1)
+
+    dAdu[ind] = dAmplification_PSPLdU[ind] * (b0 - gamma * b1) + \
+                magnification_PSPL[ind] * (db0 - gamma * db1) / rho
+
+    dAdrho[ind] = -magnification_PSPL[ind] * impact_parameter[ind] / rho ** 2 * \
+                  (db0 - gamma * db1)
+
+    return magnification, dAdu, dAdrho
+
+
+def sources_magnification_Jacobian(microlensing_model, telescope, pyLIMA_parameters,
+                                   finite_source=False):
+    """
+    The magnification Jacobian of PSPL/FSPL models, with parallax and static double
+    source, i.e. A = A1 + q_flux*A2. The columns follow the model parameters order
+    (telescopes fluxes excluded). The magnification is a by-product, so the models
+    do not need to compute it again.
+
+    Parameters
+    ----------
+    microlensing_model : object, a PSPL or FSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    finite_source : bool, FSPL (Yoo et al. 2004) or PSPL magnification
+
+    Returns
+    -------
+    magnification_jacobian : array, the magnification Jacobian (with the fancy
+    parameters if any, see ParametersLayout.chain_rule)
+    magnification : array, the magnification A(t)
+    """
+    trajectories = trajectory_Jacobian(microlensing_model, telescope,
+                                       pyLIMA_parameters)
+
+    derivatives = {}
+    total_magnification = 0
+
+    for ind, (tau, beta, trajectory_derivatives) in enumerate(trajectories):
+
+        impact_parameter, dUdp = impact_parameter_Jacobian(tau, beta,
+                                                          trajectory_derivatives)
+
+        if ind == 0:
+
+            rho_key = 'rho'
+            factor = 1
+
+        else:
+
+            rho_key = 'rho_2'
+            factor = pyLIMA_parameters['q_flux_' + telescope.filter]
+
+        if finite_source:
+
+            magnification, dAdU, dAdrho = FSPL_magnification_derivatives(
+                impact_parameter, pyLIMA_parameters[rho_key], telescope.ld_gamma)
+
+            derivatives[rho_key] = factor * dAdrho
+
+        else:
+
+            magnification, dAdU = PSPL_magnification_derivatives(impact_parameter)
+
+        if ind != 0:
+
+            derivatives['q_flux_' + telescope.filter] = magnification
+
+        total_magnification = total_magnification + factor * magnification
+
+        for key in dUdp:
+
+            derivatives[key] = derivatives.get(key, 0) + factor * dAdU * dUdp[key]
 
-    dAdu[ind] = dAmplification_PSPLdU[ind] * (yoo_table[1](z_yoo[ind]) - \
-                                              telescope.ld_gamma * yoo_table[2](
-                z_yoo[ind])) + \
-                Amplification_PSPL[0][ind] * \
-                (yoo_table[3](z_yoo[ind]) - \
-                 telescope.ld_gamma * yoo_table[4](
-                            z_yoo[ind])) * 1 / pyLIMA_parameters['rho']
+    derivatives = microlensing_model.parameters_layout.chain_rule(derivatives,
+                                                                  pyLIMA_parameters)
 
-    dAdrho[ind] = -Amplification_PSPL[0][ind] * Amplification_PSPL[1][
-        ind] / pyLIMA_parameters['rho'] ** 2 * \
-                  (yoo_table[3](z_yoo[ind]) - telescope.ld_gamma * yoo_table[4](
-                      z_yoo[ind]))
+    fluxes_keys = microlensing_model.telescopes_fluxes_model_parameters({}).keys()
 
-    dUdt0 = -(time - pyLIMA_parameters['t0']) / (
-            pyLIMA_parameters['tE'] ** 2 * Amplification_PSPL[1])
+    zeros = np.zeros(len(total_magnification))
+    magnification_jacobian = np.array(
+        [derivatives.get(key, zeros) for key in
+         microlensing_model.model_dictionnary.keys() if key not in fluxes_keys]).T
 
-    dUdu0 = pyLIMA_parameters['u0'] / Amplification_PSPL[1]
+    return magnification_jacobian, total_magnification
 
-    dUdtE = -(time - pyLIMA_parameters['t0']) ** 2 / (
-            pyLIMA_parameters['tE'] ** 3 * Amplification_PSPL[1])
 
-    # Derivative of the model
-    dAdt0 = dAdu * dUdt0
-    dAdu0 = dAdu * dUdu0
-    dAdtE = dAdu * dUdtE
-    dAdrho = dAdrho
+def magnification_PSPL_Jacobian(pspl_model, telescope, pyLIMA_parameters):
+    """
+    The Jacobian of the PSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE]
+    (and the parallax and static double source parameters if any)
+
+    Parameters
+    ----------
+    pspl_model : object, a PSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
 
-    magnification_jacobian = np.array([dAdt0, dAdu0, dAdtE, dAdrho]).T
+    Returns
+    -------
+    magnification_jacobian : array, the magnification Jacobian
+    Amplification : array, the magnification associated
+    """
+    magnification_jacobian, magnification = sources_magnification_Jacobian(
+        pspl_model, telescope, pyLIMA_parameters, finite_source=False)
 
-    return magnification_jacobian
+    return magnification_jacobian, magnification
 
 
-def magnification_numerical_Jacobian(microlensing_model, telescope, pyLIMA_parameters):
+def magnification_FSPL_Jacobian(fspl_model, telescope, pyLIMA_parameters,
+                                 return_magnification=False):
     """
-    The Jacobian of the any models, based on scipy approx_fprime
+    The Jacobian of the FSPL magnification, i.e. [dA(t)/dt0, dA(t)/du0,dA(t)/dtE,
+    dA(t0/drho] (and the parallax and static double source parameters if any)
+
+    Parameters
+    ----------
+    fspl_model : object, a FSPL model object
+    telescope : object, a telescope object
+    pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    return_magnification : bool, if the magnification is needed or not
+
+    Returns
+    -------
+    magnification_jacobian : array, the magnification Jacobian
+    magnification : array, the FSPL magnification (if return_magnification)
+    """
+    magnification_jacobian, magnification = sources_magnification_Jacobian(
+        fspl_model, telescope, pyLIMA_parameters, finite_source=True)
+
+    if return_magnification:
+
+        return magnification_jacobian, magnification
+
+    else:
+
+        return magnification_jacobian
+
+
+def numerical_Jacobian_steps(microlensing_model, parameters):
+    """
+    The absolute steps of the numerical Jacobians, i.e. h = rel_step * sign(x) *
+    max(1,|x|) (the scipy approx_derivative convention). The relative steps are
+    given in the model Jacobian_steps dictionnary, the default is the '2-point'
+    optimal step, i.e. the square root of the machine precision.
+
+    Parameters
+    ----------
+    microlensing_model : object, a microlensing model object
+    parameters : array, the model parameters (telescopes fluxes excluded)
+
+    Returns
+    -------
+    steps : array, the absolute steps
+    """
+    keys = [key for key in microlensing_model.model_dictionnary.keys()
+            if key not in microlensing_model.telescopes_fluxes_model_parameters(
+            {}).keys()]
+
+    relative_steps = np.array([microlensing_model.Jacobian_steps.get(
+        key, np.finfo(float).eps ** 0.5) for key in keys])
+
+    parameters = np.asarray(parameters, dtype=float)
+    signs = (parameters >= 0).astype(float) * 2 - 1
+
+    steps = relative_steps * signs * np.maximum(1, np.abs(parameters))
+
+    # The exact representable steps
+    steps = (parameters + steps) - parameters
+
+    return steps
+
+
+def numerical_Jacobian(function, parameters, base, steps, args=(),
+                       computational_pool=None):
+    """
+    Forward differences Jacobian of a function, reusing the base evaluation. The
+    perturbed evaluations (one per parameter) are independent and can be
+    distributed on a computational pool.
+
+    Parameters
+    ----------
+    function : callable, function(parameters,*args) returning an array
+    parameters : array, the parameters
+    base : array, function(parameters,*args)
+    steps : array, the absolute steps of each parameter
+    args : tuple, the extra arguments of function
+    computational_pool : a pool object with a map method (e.g.
+    multiprocessing.Pool or ModelPool), None to evaluate serially
+
+    Returns
+    -------
+    jacobian : array, the (len(base),len(parameters)) Jacobian
+    """
+    parameters = np.asarray(parameters, dtype=float)
+
+    perturbed_parameters = parameters + np.diag(steps)
+
+    if computational_pool is not None:
+
+        perturbed = computational_pool.map(_pool_function(function, args,
+                                                          computational_pool),
+                                           perturbed_parameters)
+
+    else:
+
+        perturbed = [function(perturbed_parameter, *args) for perturbed_parameter
+                     in perturbed_parameters]
+
+    jacobian = (np.array(perturbed) - base).T / steps
+
+    return jacobian
+
+
+class _PartialFunction(object):
+    """
+    function(parameters,*args), picklable for the computational pools
+    """
+
+    def __init__(self, function, args):
+
+        self.function = function
+        self.args = args
+
+    def __call__(self, parameters):
+
+        return self.function(parameters, *self.args)
+
+
+class _WorkerModelFunction(object):
+    """
+    function(parameters,microlensing_model,telescope) evaluated with the model of
+    the ModelPool workers, so that only the telescope index is pickled
+    """
+
+    def __init__(self, function, telescope_index):
+
+        self.function = function
+        self.telescope_index = telescope_index
+
+    def __call__(self, parameters):
+
+        telescope = _WORKER_MODEL.event.telescopes[self.telescope_index]
+
+        return self.function(parameters, _WORKER_MODEL, telescope)
+
+
+def _pool_function(function, args, computational_pool):
+    """
+    The picklable function(parameters,*args) mapped on the computational_pool,
+    without the model and telescope if the pool workers already hold them
+    """
+    if isinstance(computational_pool, ModelPool) and (len(args) == 2) and (
+            args[0] is computational_pool.microlensing_model):
+
+        telescopes = args[0].event.telescopes
+        indexes = [ind for ind, telescope in enumerate(telescopes) if
+                   telescope is args[1]]
+
+        if len(indexes) != 0:
+
+            return _WorkerModelFunction(function, indexes[0])
+
+    return _PartialFunction(function, args)
+
+
+def _initialize_worker(microlensing_model):
+
+    global _WORKER_MODEL
+
+    _WORKER_MODEL = microlensing_model
+
+
+class ModelPool(object):
+    """
+    A multiprocessing pool whose workers receive the microlensing model once, at
+    their start, instead of with every numerical Jacobian. The workers hold a
+    copy of the model at the pool creation, i.e. a ModelPool has to be created
+    after the model (and its event) is set up.
+
+    Attributes
+    ----------
+    microlensing_model : object, the microlensing model sent to the workers
+    pool : object, the multiprocessing.Pool
+    """
+
+    def __init__(self, microlensing_model, processes=None):
+
+        self.microlensing_model = microlensing_model
+        self.pool = multiprocessing.Pool(processes, initializer=_initialize_worker,
+                                         initargs=(microlensing_model,))
+
+    def map(self, function, iterable):
+
+        return self.pool.map(function, iterable)
+
+    def close(self):
+
+        self.pool.close()
+
+    def join(self):
+
+        self.pool.join()
+
+    def terminate(self):
+
+        self.pool.terminate()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.terminate()
+
+
+def magnification_numerical_Jacobian(microlensing_model, telescope, pyLIMA_parameters,
+                                     magnification=None):
+    """
+    The numerical Jacobian of any models, see numerical_Jacobian. The relative
+    steps are given by the model Jacobian_steps and the perturbed magnifications are
+    evaluated on the model Jacobian_pool, if any.
 
     Parameters
     ----------
     microlensing_model : object, a microlensing model object
     telescope : object, a telescope object
     pyLIMA_parameters : dict, a dictionnary containing the microlensing parameters
+    magnification : array, the magnification of pyLIMA_parameters if already
+    computed
 
     Returns
     -------
     magnification_jacobian_numerical : array, the numerical Jacobian
     """
 
-    x = [pyLIMA_parameters[key] for key in pyLIMA_parameters.keys() if key
-         not in microlensing_model.telescopes_fluxes_model_parameters({}).keys()]
+    # The model parameters only, i.e. not the standard parameters converted from
+    # the fancy parameters
+    x = np.array([pyLIMA_parameters[key] for key in
+                  microlensing_model.model_dictionnary.keys()
+                  if key not in microlensing_model.telescopes_fluxes_model_parameters(
+                  {}).keys()], dtype=float)
+
+    if magnification is None:
+
+        magnification = model_magnification_numerical(x, microlensing_model,
+                                                      telescope)
 
-    floors = np.zeros(len(x))
-    magnification_jacobian_numerical = approx_derivative(model_magnification_numerical,
-                                                         x, method='2-point', args=(
-            microlensing_model, telescope, floors))
+    steps = numerical_Jacobian_steps(microlensing_model, x)
 
-    return np.array(magnification_jacobian_numerical)
+    magnification_jacobian_numerical = numerical_Jacobian(
+        model_magnification_numerical, x, magnification, steps,
+        args=(microlensing_model, telescope),
+        computational_pool=microlensing_model.Jacobian_pool)
 
+    return magnification_jacobian_numerical
 
-def model_magnification_numerical(parameters, microlensing_model, telescope, floors=0):
-    # Trick here to stabilize t0 Jacobians
 
-    params = parameters + floors
-    pym = microlensing_model.compute_pyLIMA_parameters(params)
+def model_magnification_numerical(parameters, microlensing_model, telescope):
+    """
+    The magnification of a vector of model parameters, see
+    magnification_numerical_Jacobian
+    """
+    pym = microlensing_model.compute_pyLIMA_parameters(parameters)
 
     magnification = microlensing_model.model_magnification(telescope, pym)
 
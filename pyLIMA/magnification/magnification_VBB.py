@@ -67,12 +67,148 @@ def magnification_FSPL(tau, beta, rho, limb_darkening_coefficient,
     return np.array(magnification_fspl)
 
 
-def magnification_USBL(separation, mass_ratio, x_source, y_source, rho):
+def straight_trajectory(separation, x_source, y_source):
+    """
+    Find if the source trajectory is a straight line at constant separation, i.e.
+    the geometry of VBMicrolensing.BinaryLightCurve, and recover its parameters.
+
+    Parameters
+    ----------
+    separation : array, the projected normalised angular distance between
+    the two bodies
+    x_source : array, the horizontal positions of the source center in the source plane
+    y_source : array, the vertical positions of the source center in the source plane
+
+    Returns
+    -------
+    trajectory : tuple, (tau, u0, alpha) if the trajectory is straight, None otherwise
+    """
+    separation = np.asarray(separation, dtype=float)
+    x_source = np.asarray(x_source, dtype=float)
+    y_source = np.asarray(y_source, dtype=float)
+
+    if (len(x_source) < 2) | (separation.shape != x_source.shape):
+
+        return None
+
+    if np.any(separation != separation[0]):
+
+        return None
+
+    alpha = np.arctan2(y_source[0] - y_source[-1], x_source[0] - x_source[-1])
+
+    tau = -(x_source * np.cos(alpha) + y_source * np.sin(alpha))
+    beta = x_source * np.sin(alpha) - y_source * np.cos(alpha)
+
+    if (not np.all(np.isfinite(tau))) | (np.ptp(beta) > 10 ** -10):
+
+        return None
+
+    return tau, beta[0], alpha
+
+
+def magnification_binary_lightcurve(separation, mass_ratio, x_source, y_source,
+                                    rho):
+    """
+    The finite source binary lens magnification of a whole straight trajectory,
+    computed in a single call of VBMicrolensing.BinaryLightCurve (i.e. BinaryMag2
+    for each point, but without the Python loop).
+
+    Parameters
+    ----------
+    separation : array, the projected normalised angular distance between
+    the two bodies
+    mass_ratio : float, the mass ratio of the two bodies
+    x_source : array, the horizontal positions of the source center in the source plane
+    y_source : array, the vertical positions of the source center in the source plane
+    rho : float, the normalized angular source radius
+
+    Returns
+    -------
+    magnification : array, the binary lens magnification, None if the trajectory is
+    not straight
+    """
+    if (separation[0] <= 0) | (mass_ratio <= 0) | (rho <= 0):
+
+        return None
+
+    trajectory = straight_trajectory(separation, x_source, y_source)
+
+    if trajectory is None:
+
+        return None
+
+    tau, u0, alpha = trajectory
+
+    # log_tE = 0 and t0 = 0, so times are tau
+    lightcurve = VBM.BinaryLightCurve([np.log(separation[0]), np.log(mass_ratio), u0,
+                                       alpha, np.log(rho), 0.0, 0.0], tau)
+
+    magnification = np.empty(len(tau))
+    magnification[:] = lightcurve[0]
+
+    return magnification
+
+
+def finite_source_tiers(separation, mass_ratio, x_source, y_source, rho, tolerance):
+    """
+    Find the epochs where the point source magnification is accurate enough, with
+    the quadrupole and ghost images test of VBMicrolensing (computed by BinaryMag0,
+    see VBM.corrquad, VBM.corrquad2 and VBM.safedist). Only the other epochs need
+    the full contour integration.
+    See https://ui.adsabs.harvard.edu/abs/2018MNRAS.479.5157B/abstract
+
+    Parameters
+    ----------
+    separation : array, the projected normalised angular distance between
+    the two bodies
+    mass_ratio : float, the mass ratio of the two bodies
+    x_source : array, the horizontal positions of the source center in the source plane
+    y_source : array, the vertical positions of the source center in the source plane
+    rho : float, the normalized angular source radius
+    tolerance : float, the accuracy required on the magnification
+
+    Returns
+    -------
+    magnification_ps : array, the point source magnification
+    contour_mask : array, True where the contour integration is needed
+    """
+    magnification_ps = np.empty(len(x_source))
+    contour_mask = np.empty(len(x_source), dtype=bool)
+
+    rho2 = rho ** 2
+
+    for ind, (xs, ys, s) in enumerate(zip(x_source, y_source, separation)):
+
+        magnification_ps[ind] = VBM.BinaryMag0(s, mass_ratio, xs, ys)
+
+        quadrupole_test = 6 * VBM.corrquad * rho2 < tolerance
+        ghost_test = VBM.corrquad2 * (rho + 10 ** -3) < 1
+        planetary_caustic_test = (rho2 * s ** 2 < mass_ratio) | (
+                VBM.safedist > 4 * rho2)
+
+        contour_mask[ind] = not (quadrupole_test & ghost_test &
+                                 planetary_caustic_test)
+
+    return magnification_ps, contour_mask
+
+
+def magnification_USBL(separation, mass_ratio, x_source, y_source, rho,
+                       batched=True, finite_source_tolerance=None):
     """
     The Uniform Source Binary Lens magnification, based on the work of Valerio Bozza,
     thanks :) Please cite the paper if you used this.
     See http://mnras.oxfordjournals.org/content/408/4/2188
 
+    If batched, straight trajectories at constant separation are computed in a single
+    VBMicrolensing call. Other trajectories (parallax, orbital motion...) are computed
+    point by point.
+
+    If finite_source_tolerance is given, the point by point magnifications are
+    tiered: the point source magnification is used where the finite source
+    correction is below this tolerance (see finite_source_tiers), and the contour
+    integration only for the other epochs.
+
     Parameters
     ----------
     separation : array, the projected normalised angular distance between
@@ -81,41 +217,57 @@ def magnification_USBL(separation, mass_ratio, x_source, y_source, rho):
     x_source : array, the horizontal positions of the source center in the source plane
     y_source : array, the vertical positions of the source center in the source plane
     rho : float, the normalized angular source radius
+    batched : bool, use the whole lightcurve evaluation when possible
+    finite_source_tolerance : float, the accuracy of the point source tier
 
     Returns
     -------
     magnification_usbl : array, the USBL magnification
     """
+    if batched:
+
+        magnification_usbl = magnification_binary_lightcurve(separation, mass_ratio,
+                                                             x_source, y_source, rho)
+
+        if magnification_usbl is not None:
+
+            return magnification_usbl
+
+    if finite_source_tolerance is not None:
+
+        magnification_usbl, contour_mask = finite_source_tiers(
+            separation, mass_ratio, x_source, y_source, rho, finite_source_tolerance)
 
-    magnification_usbl = []
+    else:
 
-    for xs, ys, s in zip(x_source, y_source, separation):
-       # print(s, mass_ratio, xs, ys, rho)
-        #magnification_vbb = VBB.BinaryMag2(s, mass_ratio, xs, ys, rho)
-       magnification_vbb = VBM.BinaryMag2(s, mass_ratio, xs, ys, rho)
+        magnification_usbl = np.empty(len(x_source))
+        contour_mask = np.ones(len(x_source), dtype=bool)
 
-       magnification_usbl.append(magnification_vbb)
-        #import decimal
-        #print(decimal.Decimal.from_float(s))
-        #print(decimal.Decimal.from_float(mass_ratio))
-        #print(decimal.Decimal.from_float(xs))
-        #print(decimal.Decimal.from_float(ys))
-        #print(decimal.Decimal.from_float(rho))
-        #print(decimal.Decimal.from_float(magnification_vbb))
-        #print('####')
+    for ind in np.where(contour_mask)[0]:
 
-        #if magnification_vbb<0:
-         #       breakpoint()
-    return np.array(magnification_usbl)
+        magnification_usbl[ind] = VBM.BinaryMag2(separation[ind], mass_ratio,
+                                                 x_source[ind], y_source[ind], rho)
+
+    return magnification_usbl
 
 
 def magnification_FSBL(separation, mass_ratio, x_source, y_source, rho,
-                       limb_darkening_coefficient):
+                       limb_darkening_coefficient, batched=False,
+                       finite_source_tolerance=None):
     """
     The Finite Source Binary Lens magnification, including limb-darkening, based on
     the work of Valerio Bozza, thanks :)  Please cite the paper if you used this.
     See http://mnras.oxfordjournals.org/content/408/4/2188
 
+    If batched, straight trajectories at constant separation are computed in a single
+    VBMicrolensing call, with the BinaryMag2 limb-darkening treatment (VBM.a1) instead
+    of BinaryMagDark. Other trajectories are computed point by point.
+
+    If finite_source_tolerance is given, the point by point magnifications are
+    tiered: the point source magnification is used where the finite source
+    correction is below this tolerance (see finite_source_tiers), and
+    BinaryMagDark only for the other epochs.
+
     Parameters
     ----------
     separation : array, the projected normalised angular distance between
@@ -125,23 +277,41 @@ def magnification_FSBL(separation, mass_ratio, x_source, y_source, rho,
     y_source : array, the vertical positions of the source center in the source plane
     rho : float, the normalized angular source radius
     limb_darkening_coefficient: the linear limb-darkening coefficient (a1)
+    batched : bool, use the whole lightcurve evaluation when possible
+    finite_source_tolerance : float, the accuracy of the point source tier
 
     Returns
     -------
     magnification_fsbl : array, the FSBL magnification
     """
+    if batched:
+
+        VBM.a1 = limb_darkening_coefficient
+
+        magnification_fsbl = magnification_binary_lightcurve(separation, mass_ratio,
+                                                             x_source, y_source, rho)
+
+        if magnification_fsbl is not None:
+
+            return magnification_fsbl
+
+    if finite_source_tolerance is not None:
+
+        magnification_fsbl, contour_mask = finite_source_tiers(
+            separation, mass_ratio, x_source, y_source, rho, finite_source_tolerance)
+
+    else:
 
-    magnification_fsbl = []
+        magnification_fsbl = np.empty(len(x_source))
+        contour_mask = np.ones(len(x_source), dtype=bool)
 
-    for xs, ys, s in zip(x_source, y_source, separation):
-        #magnification_VBB = VBB.BinaryMagDark(s, mass_ratio, xs, ys, rho,
-        #                                      limb_darkening_coefficient)
-        magnification_VBB = VBM.BinaryMagDark(s, mass_ratio, xs, ys, rho,
-                                              limb_darkening_coefficient)
+    for ind in np.where(contour_mask)[0]:
 
-        magnification_fsbl.append(magnification_VBB)
+        magnification_fsbl[ind] = VBM.BinaryMagDark(separation[ind], mass_ratio,
+                                                    x_source[ind], y_source[ind], rho,
+                                                    limb_darkening_coefficient)
 
-    return np.array(magnification_fsbl)
+    return magnification_fsbl
 
 
 def magnification_PSBL(separation, mass_ratio, x_source, y_source):
@@ -163,12 +333,10 @@ def magnification_PSBL(separation, mass_ratio, x_source, y_source):
     magnification_psbl : array, the PSBL magnification
     """
 
-    magnification_psbl = []
+    magnification_psbl = np.empty(len(x_source))
 
-    for xs, ys, s in zip(x_source, y_source, separation):
-#        magnification_VBB = VBB.BinaryMag0(s, mass_ratio, xs, ys)
-        magnification_VBB = VBM.BinaryMag0(s, mass_ratio, xs, ys)
+    for ind, (xs, ys, s) in enumerate(zip(x_source, y_source, separation)):
 
-        magnification_psbl.append(magnification_VBB)
+        magnification_psbl[ind] = VBM.BinaryMag0(s, mass_ratio, xs, ys)
 
-    return np.array(magnification_psbl)
+    return magnification_psbl
@@ -27,13 +27,15 @@ class FSBLmodel(USBLmodel):
                 data_type='photometry')
 
             separation = dseparation + pyLIMA_parameters['separation']
+            tolerance = self.finite_source_tolerance
 
             source1_magnification = magnification_VBB.magnification_FSBL(separation,
                                                      pyLIMA_parameters['mass_ratio'],
                                                      source1_trajectory_x,
                                                      source1_trajectory_y,
                                                      pyLIMA_parameters['rho'],
-                                                     linear_limb_darkening)
+                                                     linear_limb_darkening,
+                                                     finite_source_tolerance=tolerance)
 
             if source2_trajectory_x is not None:
                 # need to update limb_darkening
@@ -43,7 +45,8 @@ class FSBLmodel(USBLmodel):
                                                      source1_trajectory_x,
                                                      source1_trajectory_y,
                                                      pyLIMA_parameters['rho_2'],
-                                                     linear_limb_darkening)
+                                                     linear_limb_darkening,
+                                                     finite_source_tolerance=tolerance)
 
                 blend_magnification_factor = pyLIMA_parameters['q_flux_' +
                                                                telescope.filter]
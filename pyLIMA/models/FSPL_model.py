@@ -17,6 +17,12 @@ class FSPLmodel(MLmodel):
 
         return 'FSPL'
 
+    def model_batch_capable(self):
+        """
+        The magnification broadcasts, except with orbital motion
+        """
+        return self.orbital_motion_model[0] == 'None'
+
     def paczynski_model_parameters(self):
         """
         [to,u0,tE,rho]
@@ -88,21 +94,17 @@ class FSPLmodel(MLmodel):
 
         if self.Jacobian_flag == 'Analytical':
 
-            magnification_jacobian = magnification_Jacobian.magnification_FSPL_Jacobian(
-                self, telescope, pyLIMA_parameters)
+            magnification_jacobian, amplification = \
+                magnification_Jacobian.magnification_FSPL_Jacobian(
+                    self, telescope, pyLIMA_parameters, return_magnification=True)
 
         else:
 
+            amplification = self.model_magnification(telescope, pyLIMA_parameters,
+                                                     return_impact_parameter=False)
             magnification_jacobian = \
                 magnification_Jacobian.magnification_numerical_Jacobian(
                     self, telescope,
-                    pyLIMA_parameters)
-
-        amplification = self.model_magnification(telescope, pyLIMA_parameters,
-                                                 return_impact_parameter=False)
+                    pyLIMA_parameters, magnification=amplification)
 
         return magnification_jacobian, amplification
-
-    def astrometry_Jacobian(self, telescope, pyLIMA_parameters):
-
-        pass
@@ -8,6 +8,12 @@ class FSPLargemodel(FSPLmodel):
 
         return 'FSPLarge'
 
+    def model_batch_capable(self):
+        """
+        VBB magnification is computed point by point
+        """
+        return False
+
     def paczynski_model_parameters(self):
         """
         [to,u0,tE,rho]
@@ -7,10 +7,13 @@ import numpy as np
 import pyLIMA.parallax.parallax
 import pyLIMA.priors.parameters_boundaries
 import pyLIMA.xallarap.xallarap
+from pyLIMA.astrometry import astrometric_Jacobian
 from pyLIMA.magnification import magnification_Jacobian
 from pyLIMA.models import pyLIMA_fancy_parameters
+from pyLIMA.models.parameters_layout import ParametersLayout
 from pyLIMA.orbitalmotion import orbital_motion
 from pyLIMA.orbitalmotion import orbital_motion_3D
+from pyLIMA.toolbox import flux_regression
 
 
 class MLmodel(object):
@@ -31,6 +34,9 @@ class MLmodel(object):
     'Circular' or 'Keplerian') and t0,kep
     blend_flux_parameter : str, the blend flux parameter type ('fblend',
     'gblend=fblend/fsource' or 'noblend')
+    noblend_flux_estimator : str, the estimator of the source fluxes if 'noblend',
+    'median' (default, i.e. median(flux/A)) or 'regression' (the weighted least
+    squares, see flux_regression.solve_fluxes)
     photometry : bool, True if any telescopes in event object contains photometric data
     astrometry : bool, True if any telescopes in event object contains astrometric data
     model_dictionnary : dict, that represents the model parameters, including fancy
@@ -40,15 +46,25 @@ class MLmodel(object):
     parameters to pyLIMA standards
     pyLIMA_to_fancy_dictionnary = dict, that contains the names to transforms pyLIMA
     standards to fancy parameters
+    parameters_layout : a ParametersLayout object, the compiled model parameters
+    used to build the pyLIMA_parameters objects
     pyLIMA_to_fancy : dict, that contains the functions to transforms fancy
     parameters to pyLIMA standards
     fancy_to_pyLIMA : dict, that contains the functions to transforms pyLIMA
     standards to fancy parameters
     Jacobian_flag : str, indicates if an analytical Jacobian is available for this model
+    Jacobian_steps : dict, the relative steps of the numerical Jacobians for some
+    model parameters, e.g. {'t0': 10**-10}, the default is the square root of the
+    machine precision
+    Jacobian_pool : a pool object with a map method, to evaluate the numerical
+    Jacobians columns concurrently (not pickled), None by default. A
+    magnification_Jacobian.ModelPool sends the model to its workers only once
     standard_parameters_boundaries : list[[float,float]], a list of list containing
     the lower and upper limits of standards parameters
     origin : list [str,[float,float]], a list containing the choice of the system
     origin, the floats indicating the X,Y origin
+    shared_timelines : dict, the SharedTimeline of each telescope sharing its
+    trajectory with other telescopes
     """
     __metaclass__ = abc.ABCMeta
 
@@ -63,22 +79,36 @@ class MLmodel(object):
         self.double_source_model = double_source
         self.orbital_motion_model = orbital_motion
         self.blend_flux_parameter = blend_flux_parameter
+        self.noblend_flux_estimator = 'median'
 
         self.photometry = False
         self.astrometry = False
 
         self.model_dictionnary = {}
         self.pyLIMA_standards_dictionnary = {}
+        self.parameters_layout = None
 
         self.fancy_parameters = fancy_parameters
         self.Jacobian_flag = 'Numerical'
+        self.Jacobian_steps = {}
+        self.Jacobian_pool = None
         self.standard_parameters_boundaries = []
 
         self.origin = origin
+        self.shared_timelines = {}
 
         self.check_data_in_event()
         self.define_pyLIMA_standard_parameters()
         self.define_model_parameters()
+        self.define_shared_timelines()
+
+    def __getstate__(self):
+
+        # Pools can not be pickled, the workers evaluate the Jacobians serially
+        state = self.__dict__.copy()
+        state['Jacobian_pool'] = None
+
+        return state
 
     @abc.abstractmethod
     def model_type(self):
@@ -128,11 +158,11 @@ class MLmodel(object):
         amplification : array, the magnification
 
         """
-        magnification_jacobian = \
-            magnification_Jacobian.magnification_numerical_Jacobian(
-                self, telescope, pyLIMA_parameters)
         amplification = self.model_magnification(telescope, pyLIMA_parameters,
                                                  return_impact_parameter=False)
+        magnification_jacobian = \
+            magnification_Jacobian.magnification_numerical_Jacobian(
+                self, telescope, pyLIMA_parameters, magnification=amplification)
 
         return magnification_jacobian, amplification
 
@@ -297,7 +327,10 @@ class MLmodel(object):
                 model_dictionnary['mu_source_E'] = len(model_dictionnary)
 
                 parameter += 1
-                self.Jacobian_flag = 'Numerical'
+
+                if not self.astrometry_Jacobian_capable():
+
+                    self.Jacobian_flag = 'Numerical'
 
             if (telescope.astrometry is not None) & (parameter == 1):
                 model_dictionnary['position_source_N_' + telescope.name] = len(
@@ -327,15 +360,15 @@ class MLmodel(object):
         import copy
         jack = copy.copy(self.Jacobian_flag)
 
+        # Parallax and static double source keep the analytical Jacobians of
+        # PSPL/FSPL, see magnification_Jacobian.trajectory_Jacobian
         if self.parallax_model[0] != 'None':
-            jack = 'Numerical'
             model_dictionnary['piEN'] = len(model_dictionnary)
             model_dictionnary['piEE'] = len(model_dictionnary)
 
             self.event.compute_parallax_all_telescopes(self.parallax_model)
 
         if self.double_source_model[0] == 'Static':
-            jack = 'Numerical'
             model_dictionnary['delta_t0'] = len(model_dictionnary)
             model_dictionnary['delta_u0'] = len(model_dictionnary)
 
@@ -349,7 +382,6 @@ class MLmodel(object):
             model_dictionnary['xi_mass_ratio'] = len(model_dictionnary)
 
         if self.double_source_model[0] != 'None':
-            jack = 'Numerical'
 
             if 'rho' in model_dictionnary.keys():
                 model_dictionnary['rho_2'] = len(model_dictionnary)
@@ -435,8 +467,6 @@ class MLmodel(object):
 
         if self.fancy_parameters is not None:
 
-            self.Jacobian_flag = 'Numerical'
-
             for key_parameter in self.fancy_parameters.fancy_parameters.keys():
 
                 try:
@@ -455,6 +485,106 @@ class MLmodel(object):
         self.model_dictionnary = OrderedDict(
             sorted(self.model_dictionnary.items(), key=lambda x: x[1]))
 
+        self.parameters_layout = ParametersLayout(self.model_dictionnary,
+                                                  self.fancy_parameters)
+
+        # Analytical Jacobians are composed with the fancy parameters derivatives
+        if not self.parameters_layout.differentiable:
+
+            self.Jacobian_flag = 'Numerical'
+
+    def define_shared_timelines(self):
+        """
+        Group the telescopes with photometry that share the same source trajectory,
+        i.e. same location (if parallax), filter and limb-darkening. The
+        magnification of a group is then computed once on the union of the
+        telescopes times, see shared_magnification. The timelines are rebuilt when
+        the telescopes data or parallax deltas change.
+        """
+        groups = {}
+
+        for telescope in self.event.telescopes:
+
+            if telescope.lightcurve is not None:
+
+                key = (telescope.filter, telescope.ld_gamma, telescope.ld_sigma,
+                       telescope.ld_a1, telescope.ld_a2)
+
+                if self.parallax_model[0] != 'None':
+
+                    key += (telescope.location, telescope.spacecraft_name,
+                            telescope.altitude, telescope.longitude,
+                            telescope.latitude)
+
+                try:
+
+                    groups.setdefault(key, []).append(telescope)
+
+                except TypeError:
+
+                    # Unhashable attributes, the telescope is kept alone
+                    pass
+
+        self.shared_timelines = {}
+
+        for telescopes in groups.values():
+
+            if len(telescopes) > 1:
+
+                shared_timeline = SharedTimeline(telescopes)
+
+                for telescope in telescopes:
+
+                    self.shared_timelines[telescope.name] = shared_timeline
+
+    def shared_magnification(self, telescope, pyLIMA_parameters):
+        """
+        The magnification of a telescope, computed on the shared timeline of its
+        group if any. The group magnification is computed once for a given set of
+        parameters and reused for the other telescopes of the group.
+
+        Parameters
+        ----------
+        telescope : a telescope object
+        pyLIMA_parameters : a pyLIMA_parameters object
+
+        Returns
+        -------
+        magnification: array, the corresponding model magnification A(t)
+        """
+        shared_timeline = self.shared_timelines.get(telescope.name)
+
+        if (shared_timeline is not None) and (not shared_timeline.is_valid(telescope)):
+
+            # The data or the parallax changed, the timelines are rebuilt
+            self.define_shared_timelines()
+            shared_timeline = self.shared_timelines.get(telescope.name)
+
+        if (shared_timeline is None) or (not shared_timeline.is_valid(telescope)):
+
+            return self.model_magnification(telescope, pyLIMA_parameters)
+
+        parameters_key = tuple(pyLIMA_parameters.get(key) for key in
+                               self.pyLIMA_standards_dictionnary.keys()
+                               if key.split('_')[0] not in ['fsource', 'fblend',
+                                                            'gblend', 'ftotal'])
+
+        # Read and written in one step, so concurrent threads never pair a key
+        # with the magnification of other parameters
+        stored_magnification = shared_timeline.stored_magnification
+
+        if (stored_magnification is None) or (
+                stored_magnification[0] != parameters_key):
+
+            stored_magnification = (parameters_key, self.model_magnification(
+                shared_timeline.telescope, pyLIMA_parameters))
+            shared_timeline.stored_magnification = stored_magnification
+
+        magnification = stored_magnification[1][shared_timeline.indexes[
+            telescope.name]]
+
+        return magnification
+
     def print_model_parameters(self):
         """
         Print the model parameters currently defined
@@ -481,7 +611,7 @@ class MLmodel(object):
         astrometric_model = None
 
         if telescope.lightcurve is not None:
-            magnification = self.model_magnification(telescope, pyLIMA_parameters)
+            magnification = self.shared_magnification(telescope, pyLIMA_parameters)
 
             # f_source, f_blend = self.derive_telescope_flux(telescope,
             # pyLIMA_parameters, magnification)
@@ -500,10 +630,214 @@ class MLmodel(object):
 
         return microlensing_model
 
+    def astrometry_Jacobian_capable(self):
+        """
+        Check if the model has an analytical astrometric Jacobian, see
+        astrometry_Jacobian
+
+        Returns
+        -------
+        Jacobian_capable : bool, True if the astrometric Jacobian is analytical
+        """
+        return False
+
+    def astrometry_Jacobian(self, telescope, pyLIMA_parameters):
+        """
+        Parameters
+        ----------
+        telescope : a telescope object
+        pyLIMA_parameters : a pyLIMA_parameters object
+
+        Returns
+        -------
+        astrometric_jacobian : array, the Jacobian of the astrometric positions,
+        i.e. [dra(t)/dt0,...] rows then [ddec(t)/dt0,...] rows
+        """
+        astrometric_jacobian = astrometric_Jacobian.astrometric_numerical_Jacobian(
+            self, telescope, pyLIMA_parameters)
+
+        return astrometric_jacobian
+
+    def model_batch_capable(self):
+        """
+        Check if model_magnification can broadcast a batch of parameters, see
+        compute_the_microlensing_model_batch
+
+        Returns
+        -------
+        batch_capable : bool, True if the magnification can be computed for K sets
+        of parameters at once
+        """
+        return False
+
+    def compute_pyLIMA_parameters_batch(self, parameters_matrix):
+        """
+        Transform K vectors of model parameters into a batched pyLIMA_parameters
+        object, where each parameter is a column of shape (K,1)
+
+        Parameters
+        ----------
+        parameters_matrix : array, a (K,n) array of model parameters
+
+        Returns
+        -------
+        pyLIMA_parameters : a pyLIMAParameters object, the batched pyLIMA parameters
+        """
+        pyLIMA_parameters = self.parameters_layout.build_batch(parameters_matrix)
+
+        return pyLIMA_parameters
+
+    def compute_the_microlensing_model_batch(self, telescope, pyLIMA_parameters):
+        """
+        Find the photometric microlensing models of a telescope for K sets of
+        parameters. If the model can not broadcast (see model_batch_capable), the
+        models are computed one by one.
+
+        Parameters
+        ----------
+        telescope : a telescope object
+        pyLIMA_parameters : a batched pyLIMA_parameters object, see
+        compute_pyLIMA_parameters_batch
+
+        Returns
+        -------
+        microlensing_model : dict, the (K,N) photometric models, and the list of K
+        astrometric models if avalaible
+        """
+        photometric_model = None
+        astrometric_model = None
+
+        if self.model_batch_capable() & (telescope.astrometry is None):
+
+            if telescope.lightcurve is not None:
+
+                magnification = self.model_magnification(telescope, pyLIMA_parameters)
+                self.derive_telescope_flux_batch(telescope, pyLIMA_parameters,
+                                                 magnification)
+
+                f_source = pyLIMA_parameters['fsource_' + telescope.name]
+                f_blend = pyLIMA_parameters['fblend_' + telescope.name]
+
+                photometric_model = f_source * magnification + f_blend
+
+        else:
+
+            models = []
+            rows_parameters = []
+
+            for vector in pyLIMA_parameters.vector:
+
+                parameters = self.compute_pyLIMA_parameters(vector)
+                models.append(self.compute_the_microlensing_model(telescope,
+                                                                  parameters))
+                rows_parameters.append(parameters)
+
+            if telescope.lightcurve is not None:
+
+                photometric_model = np.array([model['photometry'] for model in
+                                              models])
+
+                for flux in ['fsource_', 'fblend_', 'gblend_', 'ftotal_']:
+
+                    key = flux + telescope.name
+                    pyLIMA_parameters[key] = np.array([[parameters[key]] for
+                                                       parameters in rows_parameters])
+
+                key = 'flux_regression_' + telescope.name
+
+                if key in rows_parameters[0]:
+
+                    pyLIMA_parameters[key] = np.array([parameters[key] for
+                                                       parameters in
+                                                       rows_parameters]).T
+
+            if telescope.astrometry is not None:
+
+                astrometric_model = [model['astrometry'] for model in models]
+
+        microlensing_model = {'photometry': photometric_model,
+                              'astrometry': astrometric_model}
+
+        return microlensing_model
+
+    def median_noblend_fluxes(self):
+        """
+        Check if the source fluxes are estimated by median(flux/A), i.e. 'noblend'
+        with the 'median' noblend_flux_estimator
+
+        Returns
+        -------
+        median : bool, True if the median estimator is used
+        """
+        median = (self.blend_flux_parameter == 'noblend') & (
+                self.noblend_flux_estimator == 'median')
+
+        return median
+
+    def derive_telescope_flux_batch(self, telescope, pyLIMA_parameters,
+                                    magnification):
+        """
+        Set fsource and fblend columns in the batched pyLIMA_parameters. If not
+        present, estimate them via the closed form of the weighted linear
+        regression for each row of the magnification, see
+        flux_regression.solve_fluxes.
+
+        Parameters
+        ----------
+        telescope : a telescope object
+        pyLIMA_parameters : a batched pyLIMA_parameters object
+        magnification : array, the (K,N) magnification at time t
+        """
+        if pyLIMA_parameters.get('fsource_' + telescope.name) is not None:
+
+            f_source = pyLIMA_parameters['fsource_' + telescope.name]
+
+            if self.blend_flux_parameter == 'fblend':
+                f_blend = pyLIMA_parameters['fblend_' + telescope.name]
+
+            if self.blend_flux_parameter == 'gblend':
+                g_blend = pyLIMA_parameters['gblend_' + telescope.name]
+                f_blend = f_source * g_blend
+
+            if self.blend_flux_parameter == 'ftotal':
+                f_total = pyLIMA_parameters['ftotal_' + telescope.name]
+                f_blend = f_total - f_source
+
+            if self.blend_flux_parameter == 'noblend':
+                f_blend = np.zeros(f_source.shape)
+
+        else:
+
+            data_arrays = telescope.data_arrays('photometry')
+
+            sums = flux_regression.weighted_sums(magnification, data_arrays)
+            f_source, f_blend, covariance = flux_regression.solve_fluxes(
+                sums, self.blend_flux_parameter)
+
+            if self.median_noblend_fluxes():
+
+                f_source = flux_regression.median_source_flux(magnification,
+                                                              data_arrays)
+
+            f_source = f_source[:, None]
+            f_blend = f_blend[:, None]
+
+            pyLIMA_parameters['flux_regression_' + telescope.name] = sums
+
+        with np.errstate(all='ignore'):
+
+            pyLIMA_parameters['fsource_' + telescope.name] = f_source
+            pyLIMA_parameters['fblend_' + telescope.name] = f_blend
+            pyLIMA_parameters['gblend_' + telescope.name] = f_blend / f_source
+            pyLIMA_parameters['ftotal_' + telescope.name] = f_source + f_blend
+
     def derive_telescope_flux(self, telescope, pyLIMA_parameters, magnification):
         """
-        Set fsource and fblend in pyLIMA_parameters. If not present, estimate vita
-        linear regression with the given magnification
+        Set fsource and fblend in pyLIMA_parameters. If not present, estimate them
+        via the closed form of the weighted linear regression with the given
+        magnification, see flux_regression.solve_fluxes. The weighted sums of the
+        regression are then kept in pyLIMA_parameters['flux_regression_'+name]
+        (e.g. for the fluxes covariance or marginalization).
 
         Parameters
         ----------
@@ -511,9 +845,10 @@ class MLmodel(object):
         pyLIMA_parameters : a pyLIMA_parameters object
         magnification : array, containing the magnificationa at time t
         """
-        try:
+        if pyLIMA_parameters.get('fsource_' + telescope.name) is not None:
+
             # Fluxes parameters are in the pyLIMA_parameters
-            f_source = 2 * pyLIMA_parameters['fsource_' + telescope.name] / 2
+            f_source = pyLIMA_parameters['fsource_' + telescope.name]
 
             if self.blend_flux_parameter == 'fblend':
                 f_blend = pyLIMA_parameters['fblend_' + telescope.name]
@@ -529,47 +864,99 @@ class MLmodel(object):
             if self.blend_flux_parameter == 'noblend':
                 f_blend = 0
 
-        except TypeError:
+        else:
 
-            # Fluxes parameters are estimated through np.polyfit
-            lightcurve = telescope.lightcurve
-            flux = lightcurve['flux'].value
-            err_flux = lightcurve['err_flux'].value
+            data_arrays = telescope.data_arrays('photometry')
 
-            try:
+            sums = flux_regression.weighted_sums(magnification, data_arrays)
+            f_source, f_blend, covariance = flux_regression.solve_fluxes(
+                sums, self.blend_flux_parameter)
 
-                if self.blend_flux_parameter == 'noblend':
+            if self.median_noblend_fluxes():
+
+                f_source = flux_regression.median_source_flux(magnification,
+                                                              data_arrays)
+
+            f_source = np.float64(f_source)
+            f_blend = np.float64(f_blend)
+
+            pyLIMA_parameters['flux_regression_' + telescope.name] = sums
+
+        with np.errstate(all='ignore'):
+
+            pyLIMA_parameters['fsource_' + telescope.name] = f_source
+            pyLIMA_parameters['fblend_' + telescope.name] = f_blend
+            pyLIMA_parameters['gblend_' + telescope.name] = f_blend / f_source
+            pyLIMA_parameters['ftotal_' + telescope.name] = f_source+f_blend
+
+    def derive_telescopes_fluxes(self, pyLIMA_parameters):
+        """
+        Estimate the fluxes of all telescopes with photometry in one vectorized
+        pass, see flux_regression.telescopes_weighted_sums and
+        flux_regression.solve_fluxes, and set them in pyLIMA_parameters. The fluxes
+        already in pyLIMA_parameters are kept.
+
+        Parameters
+        ----------
+        pyLIMA_parameters : a pyLIMA_parameters object
+
+        Returns
+        -------
+        fluxes_covariances : dict, the (2,2) covariance matrix of the estimated
+        (fsource, blend parameter) of each telescope, see
+        flux_regression.solve_fluxes
+        """
+        telescopes = []
+        magnifications = []
+
+        for telescope in self.event.telescopes:
+
+            if telescope.lightcurve is not None:
+
+                magnification = self.model_magnification(telescope,
+                                                         pyLIMA_parameters)
 
-                    f_source = np.median(flux / magnification)
-                    f_blend = 0.0
+                if pyLIMA_parameters.get('fsource_' + telescope.name) is not None:
+
+                    self.derive_telescope_flux(telescope, pyLIMA_parameters,
+                                               magnification)
 
                 else:
 
-                    f_source, f_blend = np.polyfit(magnification, flux, 1,
-                                                   w=1 / err_flux)
+                    telescopes.append(telescope)
+                    magnifications.append(magnification)
+
+        fluxes_covariances = {}
+
+        if telescopes:
+
+            sums = flux_regression.telescopes_weighted_sums(
+                magnifications, [telescope.data_arrays('photometry') for telescope in
+                                 telescopes])
+            f_source, f_blend, covariance = flux_regression.solve_fluxes(
+                sums, self.blend_flux_parameter)
 
-                    # if np.isinf(flux) | np.isinf(err_flux):
-                    #    breakpoint()
-                    # polynomial = np.polynomial.polynomial.Polynomial.fit(
-                    #    magnification, flux, deg=1,  w=1 / err_flux)
+            if self.median_noblend_fluxes():
 
-                    # f_blend,f_source = polynomial.convert().coef
-                    # breakpoint()
-                    # from sklearn import linear_model, datasets
-                    # ransac = linear_model.RANSACRegressor()
-                    # ransac.fit(magnification.reshape(-1, 1), flux)
-                    # f_source = ransac.estimator_.coef_[0]
-                    # f_blend = ransac.estimator_.intercept_
+                f_source = np.array([flux_regression.median_source_flux(
+                    magnification, telescope.data_arrays('photometry'))
+                    for magnification, telescope in zip(magnifications, telescopes)])
 
-            except ValueError:
+            for ind, telescope in enumerate(telescopes):
 
-                f_source = 0.0
-                f_blend = 0.0
+                with np.errstate(all='ignore'):
 
-        pyLIMA_parameters['fsource_' + telescope.name] = f_source
-        pyLIMA_parameters['fblend_' + telescope.name] = f_blend
-        pyLIMA_parameters['gblend_' + telescope.name] = f_blend / f_source
-        pyLIMA_parameters['ftotal_' + telescope.name] = f_source+f_blend
+                    pyLIMA_parameters['fsource_' + telescope.name] = f_source[ind]
+                    pyLIMA_parameters['fblend_' + telescope.name] = f_blend[ind]
+                    pyLIMA_parameters['gblend_' + telescope.name] = f_blend[ind] / \
+                                                                    f_source[ind]
+                    pyLIMA_parameters['ftotal_' + telescope.name] = f_source[ind] + \
+                                                                    f_blend[ind]
+
+                pyLIMA_parameters['flux_regression_' + telescope.name] = sums[:, ind]
+                fluxes_covariances[telescope.name] = covariance[ind]
+
+        return fluxes_covariances
 
     def find_telescopes_fluxes(self, parameters):
         """
@@ -585,14 +972,14 @@ class MLmodel(object):
         """
         pyLIMA_parameters = self.compute_pyLIMA_parameters(parameters)
 
+        self.derive_telescopes_fluxes(pyLIMA_parameters)
+
         keys = []
         fluxes = []
         for telescope in self.event.telescopes:
 
             if telescope.lightcurve is not None:
 
-                self.compute_the_microlensing_model(telescope, pyLIMA_parameters)
-
                 f_source = pyLIMA_parameters['fsource_' + telescope.name]
                 keys.append('fsource_' + telescope.name)
                 fluxes.append(f_source)
@@ -633,24 +1020,11 @@ class MLmodel(object):
 
          Returns
          -------
-         pyLIMA_parameters : dict, a dictionnary the pyLIMA parameters
+         pyLIMA_parameters : a pyLIMAParameters object, the dictionnary of the
+         pyLIMA parameters
          """
-
-        parameter_dictionnary = self.model_dictionnary.copy()
-        pyLIMA_parameters = collections.OrderedDict()
-
-        for ind, key_parameter in enumerate(parameter_dictionnary.keys()):
-
-            try:
-
-                pyLIMA_parameters[key_parameter] = model_parameters[ind]
-
-            except IndexError:
-
-                pyLIMA_parameters[key_parameter] = None
-
-        if self.fancy_parameters is not None:
-            self.fancy_to_pyLIMA_parameters(pyLIMA_parameters)
+        # fancy parameters are converted by the layout
+        pyLIMA_parameters = self.parameters_layout.build(model_parameters)
 
         if self.origin[0] != 'center_of_mass':
             self.change_origin(pyLIMA_parameters)
@@ -740,24 +1114,14 @@ class MLmodel(object):
         source2_trajectory_y : the y coordinates of source 2
         """
 
-        if data_type == 'photometry':
-
-            lightcurve = telescope.lightcurve
-            time = lightcurve['time'].value
-
-            if 'piEN' in pyLIMA_parameters.keys():
-                parallax_delta_positions = telescope.deltas_positions['photometry']
-
-        if data_type == 'astrometry':
+        data_arrays = telescope.data_arrays(data_type)
+        time = data_arrays['time']
 
-            astrometry = telescope.astrometry
-            time = astrometry['time'].value
-
-            if 'piEN' in pyLIMA_parameters.keys():
-                parallax_delta_positions = telescope.deltas_positions['astrometry']
+        if 'piEN' in pyLIMA_parameters.keys():
+            parallax_delta_positions = data_arrays['deltas_positions']
 
         tau = (time - pyLIMA_parameters['t0']) / pyLIMA_parameters['tE']
-        beta = np.array([pyLIMA_parameters['u0']] * len(tau))
+        beta = np.zeros(tau.shape) + pyLIMA_parameters['u0']
 
         if 'alpha' in pyLIMA_parameters.keys():
 
@@ -781,15 +1145,15 @@ class MLmodel(object):
 
             dseparation, dalpha = orbital_motion.orbital_motion_shifts(
                 self.orbital_motion_model,
-                telescope.lightcurve['time'].value,
+                time,
                 pyLIMA_parameters)
 
             alpha -= dalpha  # Binary axes is fixed
 
         else:
 
-            dseparation = np.array([0] * len(tau))
-            dalpha = np.array([0] * len(tau))
+            dseparation = np.zeros(tau.shape)
+            dalpha = np.zeros(tau.shape)
 
         tau += parallax_delta_tau
         beta += parallax_delta_beta
@@ -874,4 +1238,88 @@ class MLmodel(object):
             source2_delta_beta = delta_position_2_2
 
         return (source1_delta_tau, source1_delta_beta, source2_delta_tau,
-                source2_delta_beta)
\ No newline at end of file
+                source2_delta_beta)
+
+class SharedTimeline(object):
+    """
+    The union of the photometric times of telescopes sharing the same source
+    trajectory.
+
+    Attributes
+    ----------
+
+    telescope : a telescope object, a copy of the first telescope of the group
+    with the unique times (and parallax deltas) of the group
+    indexes : dict, the indexes of each telescope times in the unique times
+    lightcurves : dict, the lightcurves used to build the timeline, to detect
+    changes (i.e. trim_data)
+    deltas_positions : dict, the photometric parallax deltas used to build the
+    timeline, to detect changes (i.e. compute_parallax)
+    stored_magnification : tuple, the (parameters, magnification on the unique
+    times) of the last computed magnification, None if not computed yet
+    """
+
+    def __init__(self, telescopes):
+        import copy
+        from pyLIMA.toolbox import time_series
+
+        times = np.concatenate([telescope.lightcurve['time'].value
+                                for telescope in telescopes])
+
+        unique_times, unique_index, unique_inverse = np.unique(times,
+                                                               return_index=True,
+                                                               return_inverse=True)
+
+        self.telescope = copy.copy(telescopes[0])
+        self.telescope.clear_data_arrays()
+        self.telescope.lightcurve = time_series.construct_time_series(
+            np.c_[unique_times], ['time'], ['JD'])
+        self.telescope.deltas_positions = {}
+
+        try:
+
+            deltas = np.concatenate([telescope.deltas_positions['photometry']
+                                     for telescope in telescopes], axis=1)
+            self.telescope.deltas_positions['photometry'] = deltas[:, unique_index]
+
+        except (KeyError, ValueError, IndexError):
+
+            pass
+
+        self.indexes = {}
+        self.lightcurves = {}
+        self.deltas_positions = {}
+
+        start = 0
+
+        for telescope in telescopes:
+
+            end = start + len(telescope.lightcurve)
+
+            self.indexes[telescope.name] = unique_inverse.ravel()[start:end]
+            self.lightcurves[telescope.name] = telescope.lightcurve
+            self.deltas_positions[telescope.name] = telescope.deltas_positions.get(
+                'photometry')
+
+            start = end
+
+        self.stored_magnification = None
+
+    def is_valid(self, telescope):
+        """
+        Check that the telescope data and parallax deltas (e.g. compute_parallax
+        with a new t0_par) did not change since the timeline creation
+
+        Parameters
+        ----------
+        telescope : a telescope object
+
+        Returns
+        -------
+        valid : bool, True if the shared timeline can be used
+        """
+        valid = (self.lightcurves.get(telescope.name) is telescope.lightcurve) and (
+                self.deltas_positions.get(telescope.name) is
+                telescope.deltas_positions.get('photometry'))
+
+        return valid
@@ -1,5 +1,6 @@
 import numpy as np
 from pyLIMA.astrometry import astrometric_shifts, astrometric_positions
+from pyLIMA.astrometry import astrometric_Jacobian
 from pyLIMA.magnification import magnification_Jacobian
 from pyLIMA.magnification import magnification_PSPL
 from pyLIMA.models.ML_model import MLmodel
@@ -11,6 +12,12 @@ class PSPLmodel(MLmodel):
 
         return 'PSPL'
 
+    def model_batch_capable(self):
+        """
+        The magnification broadcasts, except with orbital motion
+        """
+        return self.orbital_motion_model[0] == 'None'
+
     def paczynski_model_parameters(self):
         """
         [t0,u0,tE]
@@ -134,15 +141,34 @@ class PSPLmodel(MLmodel):
 
         else:
 
+            amplification = self.model_magnification(telescope, pyLIMA_parameters,
+                                                     return_impact_parameter=False)
             magnification_jacobian = \
                 magnification_Jacobian.magnification_numerical_Jacobian(
                     self, telescope,
-                    pyLIMA_parameters)
-            amplification = self.model_magnification(telescope, pyLIMA_parameters,
-                                                     return_impact_parameter=False)
+                    pyLIMA_parameters, magnification=amplification)
 
         return magnification_jacobian, amplification
 
+    def astrometry_Jacobian_capable(self):
+        """
+        The PSPL astrometric positions (no blend) have an analytical Jacobian
+        """
+        return True
+
     def astrometry_Jacobian(self, telescope, pyLIMA_parameters):
+        """
+        [dra(t)/dt0,...] rows then [ddec(t)/dt0,...] rows
+        """
+        if self.Jacobian_flag == 'Analytical':
+
+            astrometric_jacobian = astrometric_Jacobian.astrometric_PSPL_Jacobian(
+                self, telescope, pyLIMA_parameters)
+
+        else:
+
+            astrometric_jacobian = \
+                astrometric_Jacobian.astrometric_numerical_Jacobian(
+                    self, telescope, pyLIMA_parameters)
 
-        pass
+        return astrometric_jacobian
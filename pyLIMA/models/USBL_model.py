@@ -8,8 +8,15 @@ class USBLmodel(MLmodel):
 
     def __init__(self, event, parallax=['None', 0.0], double_source=['None',0.0],
                  orbital_motion=['None', 0.0], blend_flux_parameter='fblend',
-                 origin=['center_of_mass', [0, 0]], fancy_parameters=None):
-        """The fit class has to be intialized with an event object."""
+                 origin=['center_of_mass', [0, 0]], fancy_parameters=None,
+                 finite_source_tolerance=None):
+        """The fit class has to be intialized with an event object.
+        finite_source_tolerance is the accuracy of the point source tier, i.e. the
+        contour integration is only used where the finite source correction is
+        larger (see magnification_VBB.finite_source_tiers), None to integrate every
+        epoch."""
+
+        self.finite_source_tolerance = finite_source_tolerance
 
         super().__init__(event, parallax=parallax, double_source=double_source,
                          orbital_motion=orbital_motion,
@@ -54,12 +61,14 @@ class USBLmodel(MLmodel):
                 data_type='photometry')
 
             separation = dseparation + pyLIMA_parameters['separation']
+            tolerance = self.finite_source_tolerance
 
             source1_magnification = magnification_VBB.magnification_USBL(separation,
                                                      pyLIMA_parameters['mass_ratio'],
                                                      source1_trajectory_x,
                                                      source1_trajectory_y,
-                                                     pyLIMA_parameters['rho'])
+                                                     pyLIMA_parameters['rho'],
+                                                     finite_source_tolerance=tolerance)
 
             if source2_trajectory_x is not None:
 
@@ -68,7 +77,9 @@ class USBLmodel(MLmodel):
                                                              'mass_ratio'],
                                                          source2_trajectory_x,
                                                          source2_trajectory_y,
-                                                         pyLIMA_parameters['rho_2'])
+                                                         pyLIMA_parameters['rho_2'],
+                                                         finite_source_tolerance=
+                                                         tolerance)
 
                 blend_magnification_factor = pyLIMA_parameters['q_flux_' +
                                                                telescope.filter]
@@ -0,0 +1,175 @@
+import numpy as np
+
+
+class ParametersLayout(object):
+    """
+    The compiled layout of the model parameters, built once by
+    MLmodel.define_model_parameters. It transforms a vector of model parameters
+    into a pyLIMAParameters object without copying the model dictionnary, looking
+    for the fancy parameters functions or catching IndexError at each call.
+
+    Attributes
+    ----------
+
+    model_keys : list, the model parameters names (including fancy parameters)
+    index : dict, the index of each model parameter in the vector
+    n_model_parameters : int, the number of model parameters
+    missing : list, the values of parameters not given, i.e. None
+    conversions : list, the (standard_key, function) to compute the standard
+    parameters from the fancy parameters
+    derivatives : list, the (standard_key, function) to compute the derivatives of
+    the standard parameters with the fancy parameters, i.e. the optional
+    <standard_key>_derivatives methods of the fancy parameters
+    differentiable : bool, if all the conversions have derivatives
+    """
+
+    def __init__(self, model_dictionnary, fancy_parameters=None):
+
+        self.model_keys = list(model_dictionnary.keys())
+        self.index = {key: ind for ind, key in enumerate(self.model_keys)}
+        self.n_model_parameters = len(self.model_keys)
+        self.missing = [None] * self.n_model_parameters
+        self.conversions = []
+        self.derivatives = []
+
+        if fancy_parameters is not None:
+
+            for standard_key, fancy_key in fancy_parameters.fancy_parameters.items():
+
+                if (fancy_key in self.index) & hasattr(fancy_parameters,
+                                                       standard_key):
+
+                    self.conversions.append((standard_key,
+                                             getattr(fancy_parameters, standard_key)))
+
+                    if hasattr(fancy_parameters, standard_key + '_derivatives'):
+
+                        self.derivatives.append(
+                            (standard_key, getattr(fancy_parameters,
+                                                   standard_key + '_derivatives')))
+
+        self.differentiable = len(self.derivatives) == len(self.conversions)
+
+    def build(self, model_parameters):
+        """
+        Create the pyLIMAParameters object of a vector of model parameters
+
+        Parameters
+        ----------
+        model_parameters : array, the model parameters, can be shorter than the
+        model (i.e. without the telescopes fluxes)
+
+        Returns
+        -------
+        pyLIMA_parameters : a pyLIMAParameters object
+        """
+        n_given = min(len(model_parameters), self.n_model_parameters)
+
+        vector = np.asarray(model_parameters[:n_given])
+
+        pyLIMA_parameters = pyLIMAParameters(zip(self.model_keys,
+                                                 vector.tolist() + self.missing[
+                                                                   n_given:]))
+        pyLIMA_parameters.vector = vector
+
+        for standard_key, conversion in self.conversions:
+
+            try:
+
+                pyLIMA_parameters[standard_key] = conversion(pyLIMA_parameters)
+
+            except Exception:
+
+                pass
+
+        return pyLIMA_parameters
+
+    def build_batch(self, parameters_matrix):
+        """
+        Create the pyLIMAParameters object of K vectors of model parameters. Each
+        parameter is a column of shape (K,1), so that the models can broadcast
+        against the (N,) time arrays.
+
+        Parameters
+        ----------
+        parameters_matrix : array, the (K,n) model parameters, n can be shorter
+        than the model (i.e. without the telescopes fluxes)
+
+        Returns
+        -------
+        pyLIMA_parameters : a pyLIMAParameters object
+        """
+        matrix = np.atleast_2d(np.asarray(parameters_matrix, dtype=float))
+        n_given = min(matrix.shape[1], self.n_model_parameters)
+
+        columns = [matrix[:, ind:ind + 1] for ind in range(n_given)]
+
+        pyLIMA_parameters = pyLIMAParameters(zip(self.model_keys,
+                                                 columns + self.missing[n_given:]))
+        pyLIMA_parameters.vector = matrix[:, :n_given]
+
+        for standard_key, conversion in self.conversions:
+
+            try:
+
+                pyLIMA_parameters[standard_key] = conversion(pyLIMA_parameters)
+
+            except Exception:
+
+                pass
+
+        return pyLIMA_parameters
+
+
+    def chain_rule(self, standard_derivatives, pyLIMA_parameters):
+        """
+        Transform derivatives with the standard parameters into derivatives with the
+        model parameters (i.e. the fancy parameters)
+
+        Parameters
+        ----------
+        standard_derivatives : dict, the derivatives with the standard parameters
+        pyLIMA_parameters : a pyLIMAParameters object
+
+        Returns
+        -------
+        derivatives : dict, the derivatives with the model parameters
+        """
+        derivatives = dict(standard_derivatives)
+
+        for standard_key, derivative in self.derivatives:
+
+            standard_derivative = derivatives.pop(standard_key, None)
+
+            if standard_derivative is None:
+
+                continue
+
+            for fancy_key, value in derivative(pyLIMA_parameters).items():
+
+                derivatives[fancy_key] = derivatives.get(fancy_key, 0) + \
+                                         standard_derivative * value
+
+        return derivatives
+
+
+class pyLIMAParameters(dict):
+    """
+    The pyLIMA parameters, a dictionnary built from the ParametersLayout. Other keys
+    (telescopes fluxes estimated on the fly, orbital motion quantities...) can be
+    added as usual.
+
+    Attributes
+    ----------
+
+    vector : array, the model parameters used to build the dictionnary (a (K,n)
+    matrix for a batch of parameters)
+    """
+    vector = None
+
+    def copy(self):
+
+        new_parameters = pyLIMAParameters(self)
+        new_parameters.vector = self.vector
+
+        return new_parameters
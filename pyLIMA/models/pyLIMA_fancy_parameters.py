@@ -32,6 +32,24 @@ class StandardFancyParameters(object):
 
         return 10 ** fancy_params['log_mass_ratio']
 
+    # The optional <standard>_derivatives return {fancy: d(standard)/d(fancy)}, so
+    # the analytical Jacobians can be used with the fancy parameters
+
+    def tE_derivatives(self, fancy_params):
+
+        return {'log_tE': 10 ** fancy_params['log_tE'] * np.log(10)}
+
+    def rho_derivatives(self, fancy_params):
+
+        return {'log_rho': 10 ** fancy_params['log_rho'] * np.log(10)}
+
+    def separation_derivatives(self, fancy_params):
+
+        return {'log_separation': 10 ** fancy_params['log_separation'] * np.log(10)}
+
+    def mass_ratio_derivatives(self, fancy_params):
+
+        return {'log_mass_ratio': 10 ** fancy_params['log_mass_ratio'] * np.log(10)}
 
     def log_tE(self, standard_params):
 
@@ -84,6 +102,29 @@ class StandardFancyParameters2(object):
     def mass_ratio(self, fancy_params):
         return 10 ** fancy_params['log_mass_ratio']
 
+    def tE_derivatives(self, fancy_params):
+
+        norm = fancy_params['tEsin'] ** 2 + fancy_params['tEcos'] ** 2
+
+        return {'tEcos': -fancy_params['tEcos'] / norm ** 1.5,
+                'tEsin': -fancy_params['tEsin'] / norm ** 1.5}
+
+    def alpha_derivatives(self, fancy_params):
+
+        norm = fancy_params['tEsin'] ** 2 + fancy_params['tEcos'] ** 2
+
+        return {'tEcos': -fancy_params['tEsin'] / norm,
+                'tEsin': fancy_params['tEcos'] / norm}
+
+    def rho_derivatives(self, fancy_params):
+        return {'log_rho': 10 ** fancy_params['log_rho'] * np.log(10)}
+
+    def separation_derivatives(self, fancy_params):
+        return {'log_separation': 10 ** fancy_params['log_separation'] * np.log(10)}
+
+    def mass_ratio_derivatives(self, fancy_params):
+        return {'log_mass_ratio': 10 ** fancy_params['log_mass_ratio'] * np.log(10)}
+
 def _t_center_to_t0(pyLIMA_parameters, x_center=0, y_center=0):
     #CROIN : https://iopscience.iop.org/article/10.1088/0004-637X/790/2/142/pdf
 
@@ -1,10 +1,26 @@
+import os
+
 import numpy as np
-from astroquery.jplhorizons import Horizons
 
 TIMEOUT_JPL = 120  # seconds. The time you allow telnetlib to discuss with JPL,
 # see space_parallax.
 JPL_TYPICAL_REQUEST_TIME_PER_LINE = 0.002  # seconds.
 
+HORIZONS_API_URL = 'https://ssd.jpl.nasa.gov/api/horizons.api'
+HORIZONS_OFFLINE = False  # if True, only the Horizons cache is used
+HORIZONS_CHUNK = 50  # epochs per request
+HORIZONS_MAX_WORKERS = 4  # concurrent requests
+HORIZONS_EPOCH_TOLERANCE = 10 ** -6  # days, to match the cached epochs
+
+# The CSV header names (or prefixes) of the Horizons quantities 1,3,20, in the
+# order of horizons_ephemerides: JD, RA, DEC, delta, dRA*cosD, dDEC/dt, deldot
+HORIZONS_COLUMNS = ['Date_________JDUT', 'R.A.', 'DEC', 'delta', 'dRA*cosD',
+                    'd(DEC)/dt', 'deldot']
+
+
+class EphemeridesException(Exception):
+    pass
+
 JPL_HORIZONS_ID = {
     'Geocentric': '500',
     'Kepler': '-227',
@@ -63,125 +79,432 @@ def horizons_obstimes(observatory):
 
     Returns
     -------
-    OBSERVATORY_TIME : str, the typical required sampling
+    OBSERVATORY_TIME : float, the typical required sampling in minutes
     """
 
-    OBSERVATORY_TIMES = JPL_HORIZONS_TIME.get(observatory, '14400m')
+    OBSERVATORY_TIMES = JPL_HORIZONS_TIME.get(observatory, 14400)
 
     return OBSERVATORY_TIMES
 
-def horizons_API(body, time_to_treat, observatory='Geocentric'):
+def horizons_API(body, time_to_treat, observatory='Geocentric', offline=None,
+                 cache_directory='default', url=None,
+                 max_workers=HORIZONS_MAX_WORKERS):
     """
-    Find the satellite ephemerides at JPL
+    Find the satellite ephemerides at JPL, see horizons_ephemerides
 
     Parameters
     ----------
     body : str, the satellite name
     time_to_treat : array, array of time to treat
     observatory :  the reference frame
+    offline : bool, read only the cache, default is HORIZONS_OFFLINE
+    cache_directory : str, the cache directory, None to disable the cache
+    url : str, the Horizons API url, default is HORIZONS_API_URL
+    max_workers : int, the number of concurrent requests
 
     Returns
     -------
     flag : str, success flag
     positions : array, [time,ra,dec,distance]
     """
+    ephemerides = horizons_ephemerides(body, time_to_treat, observatory=observatory,
+                                       offline=offline,
+                                       cache_directory=cache_directory, url=url,
+                                       max_workers=max_workers)
+
+    flag = 'Succes connection to JPL'
+    print('Successfully ephemeris from JPL!')
+
+    positions = ephemerides[:, :4]
+
+    return flag, positions
+
+
+def horizons_ephemerides(body, time_to_treat, observatory='Geocentric',
+                         offline=None, cache_directory='default', url=None,
+                         max_workers=HORIZONS_MAX_WORKERS):
+    """
+    Find the satellite ephemerides at JPL. The ephemerides are stored in a
+    persistent cache (one file per body and observatory, see HorizonsCache), so
+    only the missing epochs are requested, in chunks of HORIZONS_CHUNK epochs sent
+    concurrently. In offline mode, only the cache is used.
+    If the data are denser than the typical sampling of the body (see
+    horizons_obstimes), the ephemerides are requested on a regular grid aligned on
+    the sampling, so that the grid is shared between events.
+
+    Parameters
+    ----------
+    body : str, the satellite name
+    time_to_treat : array, array of time to treat
+    observatory :  the reference frame
+    offline : bool, read only the cache, default is HORIZONS_OFFLINE
+    cache_directory : str, the cache directory, None to disable the cache
+    url : str, the Horizons API url, default is HORIZONS_API_URL
+    max_workers : int, the number of concurrent requests
+
+    Returns
+    -------
+    ephemerides : array, [time,ra,dec,distance,ra_rate,dec_rate,distance_rate] in
+    JD, degree, AU, arcsec/hour (ra_rate includes cos(dec)) and km/s
+    """
+    if offline is None:
+
+        offline = HORIZONS_OFFLINE
 
     OBSERVATORY_ID = horizons_obscodes(observatory)
     Body = horizons_obscodes(body)
-    typical_sampling = horizons_obstimes(body)
+    typical_sampling = horizons_obstimes(body) / 24 / 60
 
-    #tstart = 'JD' + str(time_to_treat.min() - 1)
+    time_to_treat = np.atleast_1d(np.asarray(time_to_treat, dtype=float))
 
-    #tstop = 'JD' + str(time_to_treat.max() + 1)
+    if (len(time_to_treat) > 1) and (
+            np.median(np.diff(time_to_treat)) < typical_sampling):
 
-    #step = JPL_HORIZONS_TIME.get(body,'1440m')
+        start = np.floor(time_to_treat.min() / typical_sampling)
+        stop = np.ceil(time_to_treat.max() / typical_sampling)
 
-    DATES = []
-    RA = []
-    DEC = []
-    DISTANCES = []
+        TIME_TO_TREAT = np.arange(start, stop + 1) * typical_sampling
 
-    if np.median(np.diff(time_to_treat))<typical_sampling/24/60:
+    else:
 
-        TIME_TO_TREAT = np.arange(time_to_treat.min(),time_to_treat.max(),typical_sampling/24/60)
+        TIME_TO_TREAT = np.unique(time_to_treat)
 
-    else:
+    cache = HorizonsCache(Body, OBSERVATORY_ID, directory=cache_directory)
 
-        TIME_TO_TREAT = time_to_treat
+    missing_times = TIME_TO_TREAT[~cache.contains(TIME_TO_TREAT)]
 
-    start = 0
+    if len(missing_times) != 0:
 
-    while start < len(TIME_TO_TREAT):  # Split the time request in chunk of 50.
+        if offline:
 
-            end = start + 50
-            obj = Horizons(id=Body, location=OBSERVATORY_ID,
-                           epochs=TIME_TO_TREAT[start:end])
-            ephemerides = obj.ephemerides()
+            raise EphemeridesException(
+                str(len(missing_times)) + ' epochs of ' + str(body) +
+                ' are missing in the Horizons cache (offline mode)')
 
-            dates = ephemerides['datetime_jd'].data.data
-            ra = ephemerides['RA'].data.data
-            dec = ephemerides['DEC'].data.data
-            distances = ephemerides['delta'].data.data
+        chunks = [missing_times[start:start + HORIZONS_CHUNK] for start in
+                  range(0, len(missing_times), HORIZONS_CHUNK)]
 
-            DATES.append(dates)
-            RA.append(ra)
-            DEC.append(dec)
-            DISTANCES.append(distances)
+        new_ephemerides = horizons_query_chunks(Body, OBSERVATORY_ID, chunks,
+                                                url=url, max_workers=max_workers)
 
-            start = end
+        cache.update(new_ephemerides)
 
-    dates = np.concatenate(DATES)
-    ra = np.concatenate(RA)
-    dec = np.concatenate(DEC)
-    distances = np.concatenate(DISTANCES)
+    ephemerides = cache.select(TIME_TO_TREAT)
 
-    #obj = Horizons(id=Body, location=OBSERVATORY_ID,
-    #               epochs={'start': tstart, 'stop': tstop,
-    #                       'step': step})  # daily cadence for interpolation
-    #ephemerides = obj.ephemerides()
+    return ephemerides
 
-    #dates = ephemerides['datetime_jd'].data.data
-    #ra = ephemerides['RA'].data.data
-    #dec = ephemerides['DEC'].data.data
-    #distances = ephemerides['delta'].data.data
 
-    #if distances.min() < 0.002:  # Low orbits
+def horizons_query_chunks(body_id, observatory_id, chunks, url=None,
+                          max_workers=HORIZONS_MAX_WORKERS):
+    """
+    Send the Horizons requests of several chunks of epochs concurrently, through a
+    pooled HTTP session
 
-    #    # adding exact telescopes dates
-    #    DATES = [dates.tolist()]
-    #    RA = [ra.tolist()]
-    ##    DEC = [dec.tolist()]
-    #    DISTANCES = [distances.tolist()]
+    Parameters
+    ----------
+    body_id : str, the JPL code of the body
+    observatory_id : str, the JPL code of the observatory
+    chunks : list, the arrays of epochs (JD) of each request
+    url : str, the Horizons API url, default is HORIZONS_API_URL
+    max_workers : int, the number of concurrent requests
 
-    #    start = 0
+    Returns
+    -------
+    ephemerides : array, the ephemerides of all the chunks, see
+    horizons_ephemerides
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
 
-    #    while start < len(time_to_treat):  # Split the time request in chunk of 50.
+    max_workers = max(min(int(max_workers), len(chunks)), 1)
 
-    #        end = start + 50
-    #        obj = Horizons(id=Body, location=OBSERVATORY_ID,
-    #                       epochs=time_to_treat[start:end])
-    #        ephemerides = obj.ephemerides()
+    with requests.Session() as session:
 
-    #        dates = ephemerides['datetime_jd'].data.data
-    #        ra = ephemerides['RA'].data.data
-    #        dec = ephemerides['DEC'].data.data
-    #        distances = ephemerides['delta'].data.data
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
 
-    #        DATES.append(dates)
-    #        RA.append(ra)
-    #        DEC.append(dec)
-    #        DISTANCES.append(distances)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
 
-    #        start = end
+            results = list(executor.map(
+                lambda chunk: horizons_query(body_id, observatory_id, chunk,
+                                             url=url, session=session), chunks))
 
-    #    dates = np.concatenate(DATES)
-    #    ra = np.concatenate(RA)
-    #    dec = np.concatenate(DEC)
-    #    distances = np.concatenate(DISTANCES)
+    ephemerides = np.concatenate(results)
 
-    flag = 'Succes connection to JPL'
-    print('Successfully ephemeris from JPL!')
+    return ephemerides
 
-    positions = np.c_[dates, ra, dec, distances]
 
-    return flag, positions
+def horizons_query(body_id, observatory_id, epochs, url=None, session=None):
+    """
+    Request the observer ephemerides of a body at given epochs to the Horizons API,
+    i.e. the astrometric RA and DEC, their rates, the distance and its rate
+    (QUANTITIES 1,3,20)
+
+    Parameters
+    ----------
+    body_id : str, the JPL code of the body
+    observatory_id : str, the JPL code of the observatory
+    epochs : array, the epochs in JD
+    url : str, the Horizons API url, default is HORIZONS_API_URL
+    session : object, a requests.Session, a new one if None
+
+    Returns
+    -------
+    ephemerides : array, see horizons_ephemerides
+    """
+    if url is None:
+
+        url = HORIZONS_API_URL
+
+    if session is None:
+
+        import requests
+        session = requests.Session()
+
+    request_payload = {'format': 'text',
+                       'EPHEM_TYPE': 'OBSERVER',
+                       'QUANTITIES': "'1,3,20'",
+                       'COMMAND': '"' + str(body_id) + '"',
+                       'CENTER': "'" + str(observatory_id) + "'",
+                       'CSV_FORMAT': 'YES',
+                       'CAL_FORMAT': 'JD',
+                       'ANG_FORMAT': 'DEG',
+                       'APPARENT': 'AIRLESS',
+                       'REF_SYSTEM': 'ICRF',
+                       'EXTRA_PREC': 'YES',
+                       'SKIP_DAYLT': 'NO',
+                       'TLIST_TYPE': 'JD',
+                       'TLIST': '\n'.join([repr(float(epoch)) for epoch in epochs])}
+
+    response = session.get(url, params=request_payload, timeout=TIMEOUT_JPL)
+    response.raise_for_status()
+
+    ephemerides = parse_horizons_ephemerides(response.text)
+
+    return ephemerides
+
+
+def parse_horizons_ephemerides(text):
+    """
+    Parse the CSV ephemerides of an Horizons answer, i.e. the lines between $$SOE
+    and $$EOE. Horizons prints the quantities in its own (numerical) order, so the
+    columns are found from the header line above $$SOE (see HORIZONS_COLUMNS) and
+    reordered as in horizons_ephemerides. Missing quantities are NaN.
+
+    Parameters
+    ----------
+    text : str, the Horizons answer
+
+    Returns
+    -------
+    ephemerides : array, see horizons_ephemerides
+    """
+    if ('$$SOE' not in text) | ('$$EOE' not in text):
+
+        raise EphemeridesException('Unexpected Horizons answer: ' + text[-500:])
+
+    header, body = text.split('$$SOE', 1)
+
+    header_lines = [line for line in header.splitlines()
+                    if line.strip() and (line.strip().strip('*') != '')]
+
+    names = [name.strip() for name in header_lines[-1].split(',')]
+
+    columns = []
+
+    for key in HORIZONS_COLUMNS:
+
+        index = [ind for ind, name in enumerate(names) if name == key]
+
+        if len(index) == 0:
+
+            index = [ind for ind, name in enumerate(names) if name.startswith(key)]
+
+        columns.append(index[0] if len(index) != 0 else None)
+
+    if columns[0] is None:
+
+        raise EphemeridesException('Unexpected Horizons header: ' + header_lines[-1])
+
+    lines = body.split('$$EOE')[0].strip().splitlines()
+
+    ephemerides = np.full((len(lines), len(HORIZONS_COLUMNS)), np.nan)
+
+    for ind, line in enumerate(lines):
+
+        fields = line.split(',')
+
+        for ind_column, column in enumerate(columns):
+
+            try:
+
+                ephemerides[ind, ind_column] = float(fields[column])
+
+            except (TypeError, ValueError, IndexError):
+
+                pass
+
+    return ephemerides
+
+
+class HorizonsCache(object):
+    """
+    The persistent cache of the Horizons ephemerides of a body seen from an
+    observatory, i.e. a table of the ephemerides (see horizons_ephemerides) sorted
+    by epochs in a .npy file. Several processes can share the cache, the file is
+    replaced atomically.
+
+    Attributes
+    ----------
+    body_id : str, the JPL code of the body
+    observatory_id : str, the JPL code of the observatory
+    file_name : str, the cache file, None if the cache is disabled
+    ephemerides : array, the cached ephemerides
+    """
+
+    def __init__(self, body_id, observatory_id, directory='default'):
+
+        from pyLIMA.parallax.ephemerides_cache import default_cache_directory
+
+        if directory == 'default':
+
+            directory = os.path.join(default_cache_directory(), 'Horizons')
+
+        self.body_id = str(body_id)
+        self.observatory_id = str(observatory_id)
+        self.file_name = None
+        self.ephemerides = np.zeros((0, 7))
+
+        if directory is not None:
+
+            self.file_name = os.path.join(directory, self.body_id + '_' +
+                                          self.observatory_id + '.npy')
+
+            self.ephemerides = self.load()
+
+    def load(self):
+        """
+        Read the cache file
+
+        Returns
+        -------
+        ephemerides : array, the cached ephemerides (empty if no file)
+        """
+        try:
+
+            ephemerides = np.load(self.file_name)
+
+        except (OSError, ValueError):
+
+            ephemerides = np.zeros((0, 7))
+
+        return ephemerides
+
+    def contains(self, epochs):
+        """
+        Check which epochs are in the cache
+
+        Parameters
+        ----------
+        epochs : array, the epochs in JD
+
+        Returns
+        -------
+        mask : array, True for the cached epochs
+        """
+        index = self.index(epochs)
+
+        return index >= 0
+
+    def index(self, epochs):
+        """
+        Find the epochs in the cache, with a tolerance of HORIZONS_EPOCH_TOLERANCE
+
+        Parameters
+        ----------
+        epochs : array, the epochs in JD
+
+        Returns
+        -------
+        index : array, the index of the epochs in the cache, -1 if missing
+        """
+        cached_epochs = self.ephemerides[:, 0]
+
+        if len(cached_epochs) == 0:
+
+            return np.full(len(epochs), -1)
+
+        right = np.clip(np.searchsorted(cached_epochs, epochs), 0,
+                        len(cached_epochs) - 1)
+        left = np.maximum(right - 1, 0)
+
+        closest = np.where(np.abs(cached_epochs[left] - epochs) <
+                           np.abs(cached_epochs[right] - epochs), left, right)
+
+        index = np.where(np.abs(cached_epochs[closest] - epochs) <
+                         HORIZONS_EPOCH_TOLERANCE, closest, -1)
+
+        return index
+
+    def select(self, epochs):
+        """
+        The cached ephemerides of the given epochs (must be in the cache)
+
+        Parameters
+        ----------
+        epochs : array, the epochs in JD
+
+        Returns
+        -------
+        ephemerides : array, the ephemerides
+        """
+        index = self.index(epochs)
+
+        if np.any(index < 0):
+
+            raise EphemeridesException('Horizons did not return all the epochs of '
+                                       + self.body_id)
+
+        return self.ephemerides[index]
+
+    def update(self, new_ephemerides):
+        """
+        Add ephemerides to the cache and save it (merged with the current file, in
+        case another process updated it)
+
+        Parameters
+        ----------
+        new_ephemerides : array, the new ephemerides
+        """
+        tables = [self.ephemerides, new_ephemerides]
+
+        if self.file_name is not None:
+
+            tables.insert(0, self.load())
+
+        ephemerides = np.concatenate(tables)
+        # Keep the most recent value of duplicated epochs
+        ephemerides = ephemerides[::-1]
+        unique_epochs, unique_index = np.unique(ephemerides[:, 0],
+                                                return_index=True)
+        self.ephemerides = ephemerides[unique_index]
+
+        if self.file_name is not None:
+
+            temporary_file = self.file_name[:-4] + '_' + str(os.getpid()) + '.tmp'
+
+            try:
+
+                os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+
+                with open(temporary_file, 'wb') as file:
+
+                    np.save(file, self.ephemerides)
+
+                os.replace(temporary_file, self.file_name)
+
+            except OSError:
+
+                pass
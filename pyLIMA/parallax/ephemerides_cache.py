@@ -0,0 +1,240 @@
+import os
+
+import erfa
+import numpy as np
+from astropy.coordinates import solar_system_ephemeris
+from pyLIMA.parallax import astropy_ephemerides
+
+BLOCK_DAYS = 256  # days, the time span of one block of the Earth ephemerides grid
+GRID_STEP = 0.5  # days, the grid sampling, i.e. ~1e-9 AU with Hermite interpolation
+
+
+def default_cache_directory():
+    """
+    The directory of the pyLIMA persistent caches, i.e. $PYLIMA_CACHE_DIR or
+    ~/.pyLIMA/cache
+
+    Returns
+    -------
+    directory : str, the cache directory
+    """
+    directory = os.environ.get('PYLIMA_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'), '.pyLIMA',
+                                            'cache'))
+
+    return directory
+
+
+def cubic_Hermite_interpolation(s, step, position_0, position_1, speed_0, speed_1):
+    """
+    The cubic Hermite interpolation of positions (and speeds) between two nodes
+
+    Parameters
+    ----------
+    s : array, the (N,) normalized times between the nodes, i.e. in [0,1]
+    step : float or array, the time between the nodes
+    position_0 : array, the (N,3) positions at the first nodes
+    position_1 : array, the (N,3) positions at the second nodes
+    speed_0 : array, the (N,3) speeds at the first nodes
+    speed_1 : array, the (N,3) speeds at the second nodes
+
+    Returns
+    -------
+    positions : array, the (N,3) interpolated positions
+    speeds : array, the (N,3) interpolated speeds
+    """
+    s = np.asarray(s)[:, None]
+    step = np.reshape(step, (-1, 1))
+
+    speed_0 = speed_0 * step
+    speed_1 = speed_1 * step
+
+    # Cubic Hermite basis and derivatives
+    h00 = (1 + 2 * s) * (1 - s) ** 2
+    h10 = s * (1 - s) ** 2
+    h01 = s ** 2 * (3 - 2 * s)
+    h11 = s ** 2 * (s - 1)
+
+    dh00 = 6 * s * (s - 1)
+    dh10 = (1 - s) * (1 - 3 * s)
+    dh11 = s * (3 * s - 2)
+
+    positions = h00 * position_0 + h10 * speed_0 + h01 * position_1 + h11 * speed_1
+    speeds = (dh00 * (position_0 - position_1) + dh10 * speed_0 + dh11 * speed_1) / \
+             step
+
+    return positions, speeds
+
+
+class EarthEphemeridesCache(object):
+    """
+    The Earth barycentric positions and speeds, precomputed by astropy on a dense
+    grid (blocks of BLOCK_DAYS sampled every GRID_STEP in TT) and served by cubic
+    Hermite interpolation (positions and speeds at the grid nodes). The grid is in
+    TT to be smooth across the leap seconds, the UTC times are converted with ERFA.
+    The blocks are computed once, then kept in memory and saved on disk (if
+    possible), so the other sessions/processes only load them.
+
+    Attributes
+    ----------
+    ephemeris : str, the astropy solar system ephemeris used, e.g. 'builtin'
+    directory : str, the directory of the blocks files, None to keep the blocks
+    in memory only
+    blocks : dict, the (n_nodes,6) [X,Y,Z,VX,VY,VZ] grid of each block in memory
+    """
+
+    def __init__(self, ephemeris='builtin', directory='default'):
+
+        if directory == 'default':
+
+            directory = os.path.join(default_cache_directory(), 'Earth_ephemerides')
+
+        self.ephemeris = ephemeris
+        self.directory = directory
+        self.blocks = {}
+
+    def clear(self):
+        """
+        Remove the blocks from memory (the files are kept)
+        """
+        self.blocks = {}
+
+    def block_file(self, block):
+        """
+        The file name of a block
+
+        Parameters
+        ----------
+        block : int, the block index
+
+        Returns
+        -------
+        file_name : str, the block file name
+        """
+        file_name = os.path.join(self.directory, 'Earth_' + self.ephemeris + '_' +
+                                 str(BLOCK_DAYS) + '_' + str(GRID_STEP) + '_' +
+                                 str(block) + '.npy')
+
+        return file_name
+
+    def load_block(self, block):
+        """
+        Load the block grid from memory, disk or compute it with astropy
+
+        Parameters
+        ----------
+        block : int, the block index
+
+        Returns
+        -------
+        grid : array, the (n_nodes,6) [X,Y,Z,VX,VY,VZ] grid in AU and AU/day
+        """
+        if block in self.blocks:
+
+            return self.blocks[block]
+
+        grid = None
+
+        if self.directory is not None:
+
+            try:
+
+                grid = np.load(self.block_file(block))
+
+            except (OSError, ValueError):
+
+                grid = None
+
+        if grid is None:
+
+            nodes = block * BLOCK_DAYS + GRID_STEP * np.arange(
+                int(BLOCK_DAYS / GRID_STEP) + 1)
+
+            with solar_system_ephemeris.set(self.ephemeris):
+
+                Earth_ephemeris = astropy_ephemerides.Earth_ephemerides(nodes,
+                                                                         scale='tt')
+
+            grid = np.c_[Earth_ephemeris[0].xyz.value.T,
+                         Earth_ephemeris[1].xyz.value.T]
+
+            if self.directory is not None:
+
+                self.save_block(block, grid)
+
+        self.blocks[block] = grid
+
+        return grid
+
+    def save_block(self, block, grid):
+        """
+        Save a block on disk, through a temporary file so that concurrent processes
+        never read a partial file. Nothing is done if the directory is not writable.
+
+        Parameters
+        ----------
+        block : int, the block index
+        grid : array, the block grid
+        """
+        file_name = self.block_file(block)
+        temporary_file = file_name[:-4] + '_' + str(os.getpid()) + '.tmp'
+
+        try:
+
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(temporary_file, 'wb') as file:
+
+                np.save(file, grid)
+
+            os.replace(temporary_file, file_name)
+
+        except OSError:
+
+            pass
+
+    def Earth_ephemerides(self, time_to_treat):
+        """
+        Interpolate the Earth positions and speeds
+
+        Parameters
+        ----------
+        time_to_treat : array, the time in JD (UTC) to treat
+
+        Returns
+        -------
+        Earth_positions : array, the XYZ Earth positions in AU
+        Earth_speeds : array, the XYZ Earth speeds in AU/day
+        """
+        time = np.asarray(time_to_treat, dtype=float)
+        times = np.ravel(time)
+
+        # UTC to TT, i.e. TAI + 32.184 s
+        times_TAI = erfa.utctai(times, 0)
+        times = times_TAI[0] + (times_TAI[1] + 32.184 / 86400)
+
+        Earth_positions = np.zeros((len(times), 3))
+        Earth_speeds = np.zeros((len(times), 3))
+
+        blocks = np.floor(times / BLOCK_DAYS).astype(int)
+
+        for block in np.unique(blocks):
+
+            mask = blocks == block
+            grid = self.load_block(block)
+
+            steps = (times[mask] - block * BLOCK_DAYS) / GRID_STEP
+            index = np.clip(np.floor(steps).astype(int), 0, len(grid) - 2)
+
+            Earth_positions[mask], Earth_speeds[mask] = cubic_Hermite_interpolation(
+                steps - index, GRID_STEP, grid[index, :3], grid[index + 1, :3],
+                grid[index, 3:], grid[index + 1, 3:])
+
+        if time.ndim == 0:
+
+            return Earth_positions[0], Earth_speeds[0]
+
+        return Earth_positions, Earth_speeds
+
+
+EARTH_EPHEMERIDES_CACHE = EarthEphemeridesCache()
@@ -1,13 +1,34 @@
 import numpy as np
 from astropy import constants as astronomical_constants
-from astropy.coordinates import solar_system_ephemeris, spherical_to_cartesian
+from astropy.coordinates import spherical_to_cartesian
 from astropy.time import Time
-from pyLIMA.parallax import astropy_ephemerides
-from scipy import interpolate
+from pyLIMA.parallax import ephemerides_cache
 
 AU = astronomical_constants.au.value
 SPEED_OF_LIGHT = astronomical_constants.c.value
 EARTH_RADIUS = astronomical_constants.R_earth.value
+ARCSECOND = np.pi / 180 / 3600
+
+# The leading terms of the IAU 2000B nutation in longitude:
+# [l, l', F, D, Omega multipliers, sin, sin*t, cos] in 0.1 microarcsec
+NUTATION_TERMS = np.array([[0, 0, 0, 0, 1, -172064161, -174666, 33386],
+                           [0, 0, 2, -2, 2, -13170906, -1675, -13696],
+                           [0, 0, 2, 0, 2, -2276413, -234, 2796],
+                           [0, 0, 0, 0, 2, 2074554, 207, -698],
+                           [0, 1, 0, 0, 0, 1475877, -3633, 11817],
+                           [0, 1, 2, -2, 2, -516821, 1226, -524],
+                           [1, 0, 0, 0, 0, 711159, 73, -872],
+                           [0, 0, 2, 0, 1, -387298, -367, 380],
+                           [1, 0, 2, 0, 2, -301461, -36, 816],
+                           [0, -1, 2, -2, 2, 215829, -494, 111],
+                           [0, 0, 2, -2, 1, 128227, 137, 181],
+                           [-1, 0, 2, 0, 2, 123457, 11, 19],
+                           [-1, 0, 0, 2, 0, 156994, 10, -168],
+                           [1, 0, 0, 0, 1, 63110, 63, 27],
+                           [-1, 0, 0, 0, 1, -57976, -63, -189]], dtype=float)
+
+# The spacecraft trajectories from JPL Horizons, shared between telescopes
+SPACECRAFT_TRAJECTORIES = {}
 
 
 def EN_trajectory_angle(piEN, piEE):
@@ -118,7 +139,8 @@ def parallax_combination(telescope, parallax_model, North_vector, East_vector):
 
 def Earth_ephemerides(time_to_treat):
     """
-    Compute the Earth positions and speeds
+    Compute the Earth positions and speeds, interpolated from the precomputed grid
+    of astropy ephemerides, see ephemerides_cache.EarthEphemeridesCache
 
     Parameters
     ----------
@@ -129,36 +151,131 @@ def Earth_ephemerides(time_to_treat):
     Earth_positions : array, the XYZ Earth positions
     Earth_speeds : array, the XYZ Earth speeds
     """
-    with solar_system_ephemeris.set('builtin'):
-        Earth_ephemeris = astropy_ephemerides.Earth_ephemerides(time_to_treat)
-        Earth_positions = Earth_ephemeris[0].xyz.value.T
-        Earth_speeds = Earth_ephemeris[1].xyz.value.T
+    Earth_positions, Earth_speeds = \
+        ephemerides_cache.EARTH_EPHEMERIDES_CACHE.Earth_ephemerides(time_to_treat)
 
-        return Earth_positions, Earth_speeds
+    return Earth_positions, Earth_speeds
 
 
-def Earth_telescope_sidereal_times(time_to_treat, sidereal_type='mean'):
+def Earth_telescope_sidereal_times(time_to_treat, sidereal_type='mean',
+                                   method='astropy'):
     """
     Compute the sidereal time for a given time
 
     Parameters
     ----------
     time_to_treat : array, the time in JD to treat
+    sidereal_type : str, 'mean' or 'apparent'
+    method : str, 'astropy' or 'numpy' (much faster, see Greenwich_sidereal_times)
 
     Returns
     -------
     sidereal_time : array, the sidereal_time (angle with vernal point) at time t
     """
-    times = Time(time_to_treat, format='jd')
-    sideral_times = times.sidereal_time(sidereal_type,
-                                        'greenwich').value / 24 * 2 * np.pi
+    if method == 'numpy':
+
+        sideral_times = Greenwich_sidereal_times(time_to_treat,
+                                                 sidereal_type=sidereal_type)
+
+    else:
+
+        times = Time(time_to_treat, format='jd')
+        sideral_times = times.sidereal_time(sidereal_type,
+                                            'greenwich').value / 24 * 2 * np.pi
+
+    return sideral_times
+
+
+def Greenwich_sidereal_times(time_to_treat, sidereal_type='mean'):
+    """
+    Compute the Greenwich sidereal time with numpy only, i.e. the IAU 2006 GMST
+    (Earth rotation angle + precession polynomial). The apparent sidereal time adds
+    the equation of the equinoxes, from the leading terms of the IAU 2000B nutation
+    series and the main complementary terms.
+    UT1 and TT are approximated by UTC (the UT1-UTC offset needs the IERS
+    tables), so the difference with astropy is below 0.9 s of time, i.e. 7e-5 rad
+    (a few hundred meters for the telescope positions). The nutation truncation
+    is below 2e-7 rad.
+    See https://ui.adsabs.harvard.edu/abs/2006CeMDA..94..351C/abstract
+
+    Parameters
+    ----------
+    time_to_treat : array, the time in JD to treat
+    sidereal_type : str, 'mean' or 'apparent'
+
+    Returns
+    -------
+    sidereal_time : array, the sidereal_time (angle with vernal point) at time t
+    """
+    days = np.asarray(time_to_treat, dtype=float) - 2451545.0
+    centuries = days / 36525
+
+    Earth_rotation_angle = 2 * np.pi * (np.mod(days, 1.0) + 0.7790572732640 +
+                                        0.00273781191135448 * days)
+
+    precession = np.polyval([-0.0000000368, -0.000029956, -0.00000044, 1.3915817,
+                             4612.156534, 0.014506], centuries)
+
+    sideral_times = Earth_rotation_angle + precession * ARCSECOND
+
+    if sidereal_type == 'apparent':
+
+        sideral_times += equation_of_the_equinoxes(centuries)
+
+    sideral_times = np.mod(sideral_times, 2 * np.pi)
 
     return sideral_times
 
 
+def equation_of_the_equinoxes(centuries):
+    """
+    The equation of the equinoxes, i.e. the nutation in longitude projected on the
+    mean equator plus the complementary terms, in radians
+
+    Parameters
+    ----------
+    centuries : array, the Julian centuries since J2000
+
+    Returns
+    -------
+    equation : array, the equation of the equinoxes in radians
+    """
+    # Delaunay arguments l, l', F, D and Omega, IERS 2003
+    arguments = np.array([
+        np.polyval([1717915923.2178, 485868.249036], centuries),
+        np.polyval([129596581.0481, 1287104.79305], centuries),
+        np.polyval([1739527262.8478, 335779.526232], centuries),
+        np.polyval([1602961601.2090, 1072260.70369], centuries),
+        np.polyval([-6962890.5431, 450160.398036], centuries)]) * ARCSECOND
+
+    phases = np.dot(NUTATION_TERMS[:, :5], arguments.reshape(5, -1))
+    amplitudes = NUTATION_TERMS[:, 5, None] + NUTATION_TERMS[:, 6, None] * np.ravel(
+        centuries)
+
+    nutation_longitude = np.sum(amplitudes * np.sin(phases) +
+                                NUTATION_TERMS[:, 7, None] * np.cos(phases),
+                                axis=0).reshape(np.shape(centuries)) * 10 ** -7
+
+    mean_obliquity = np.polyval([-0.0000000434, -0.000000576, 0.00200340,
+                                 -0.0001831, -46.836769, 84381.406], centuries)
+
+    Omega = arguments[4]
+
+    equation = nutation_longitude * np.cos(mean_obliquity * ARCSECOND) + \
+               0.00264096 * np.sin(Omega) + 0.00006352 * np.sin(2 * Omega)
+
+    return equation * ARCSECOND
+
+
 def space_ephemerides(telescope, time_to_treat, data_type='photometry'):
     """
-    Compute the ephemerides of telescope in Space via JPL Horizons
+    Compute the ephemerides of telescope in Space via JPL Horizons. The
+    interpolated trajectory (see spacecraft_trajectory.SpacecraftTrajectory) is
+    stored in telescope.spacecraft_trajectory and reused as long as it covers the
+    data with nodes not sparser than the spacecraft sampling (see
+    JPL_ephemerides.horizons_obstimes). The trajectories from JPL Horizons are also
+    shared between the telescopes of the same spacecraft, see
+    SPACECRAFT_TRAJECTORIES.
 
     Parameters
     ----------
@@ -172,38 +289,48 @@ def space_ephemerides(telescope, time_to_treat, data_type='photometry'):
     Earth
     spacecraft_positions : array, the [time,ra,dec,distance] position of the spacecraft
     """
+    from pyLIMA.parallax.spacecraft_trajectory import SpacecraftTrajectory
+
     satellite_name = telescope.spacecraft_name
+    trajectory = telescope.spacecraft_trajectory
 
     if len(telescope.spacecraft_positions[data_type]) != 0:
 
         spacecraft_positions = telescope.spacecraft_positions[data_type]
 
+        if (trajectory is None) or (
+                trajectory.spacecraft_positions is not spacecraft_positions):
+
+            trajectory = SpacecraftTrajectory(spacecraft_positions)
+
     else:
 
-        # call JPL!
         from pyLIMA.parallax import JPL_ephemerides
-        spacecraft_positions = \
-            JPL_ephemerides.horizons_API(satellite_name, time_to_treat,
-                                         observatory='Geocentric')[1]
 
-    satellite_positions = np.array(spacecraft_positions)
-    dates = satellite_positions[:, 0].astype(float)
-    ra = satellite_positions[:, 1].astype(float)
-    dec = satellite_positions[:, 2].astype(float)
-    distances = satellite_positions[:, 3].astype(float)
+        # A trajectory is reused only if its nodes around the data are not sparser
+        # than the typical sampling of the spacecraft (or are the data epochs)
+        max_step = JPL_ephemerides.horizons_obstimes(satellite_name) / 24 / 60
+
+        if (trajectory is None) or (
+                not trajectory.covers(time_to_treat, max_step=max_step)):
+
+            trajectory = SPACECRAFT_TRAJECTORIES.get(satellite_name)
+
+        if (trajectory is None) or (
+                not trajectory.covers(time_to_treat, max_step=max_step)):
 
-    x, y, z = spherical_to_cartesian(r=distances, lat=dec * np.pi / 180,
-                                     lon=ra * np.pi / 180)
+            # call JPL!
+            ephemerides = JPL_ephemerides.horizons_ephemerides(satellite_name,
+                                                               time_to_treat,
+                                                               observatory='Geocentric')
+            trajectory = SpacecraftTrajectory(ephemerides)
 
-    interpolated_x = interpolate.interp1d(dates, x,fill_value="extrapolate")
-    interpolated_y = interpolate.interp1d(dates, y,fill_value="extrapolate")
-    interpolated_z = interpolate.interp1d(dates, z,fill_value="extrapolate")
+            SPACECRAFT_TRAJECTORIES[satellite_name] = trajectory
 
-    x_value = interpolated_x(time_to_treat)
-    y_value = interpolated_y(time_to_treat)
-    z_value = interpolated_z(time_to_treat)
+    telescope.spacecraft_trajectory = trajectory
+    spacecraft_positions = trajectory.spacecraft_positions
 
-    satellite_positions = -np.c_[x_value, y_value, z_value]
+    satellite_positions = -trajectory.positions_speeds(time_to_treat)[0]
 
     return satellite_positions, spacecraft_positions
 
@@ -0,0 +1,141 @@
+import numpy as np
+from astropy import constants as astronomical_constants
+from pyLIMA.parallax.ephemerides_cache import cubic_Hermite_interpolation
+
+AU_KM = astronomical_constants.au.value / 1000
+ARCSECOND_PER_HOUR = np.pi / 180 / 3600 * 24  # in rad/day
+NODES_TOLERANCE = 10 ** -6  # days, to identify a time with a node
+
+
+class SpacecraftTrajectory(object):
+    """
+    The geocentric trajectory of a spacecraft, built once from its ephemerides and
+    interpolated with cubic Hermite polynomials. The speeds at the nodes come from
+    the Horizons rates (RA, DEC and distance rates) when available, from finite
+    differences otherwise. Outside of the nodes, the trajectory is linearly
+    extrapolated. Only arrays are stored, so the object is cheap to pickle and
+    can be shared between telescopes.
+
+    Attributes
+    ----------
+    spacecraft_positions : array, the [time,ra,dec,distance] ephemerides
+    nodes : array, the ephemerides times in JD
+    positions : array, the (n,3) XYZ positions in AU at the nodes
+    speeds : array, the (n,3) XYZ speeds in AU/day at the nodes
+    velocity_aware : bool, True if the speeds come from the Horizons rates
+    """
+
+    def __init__(self, ephemerides):
+
+        ephemerides = np.asarray(ephemerides, dtype=float)
+
+        unique_times, unique_index = np.unique(ephemerides[:, 0], return_index=True)
+        ephemerides = ephemerides[unique_index]
+
+        self.spacecraft_positions = np.asarray(ephemerides[:, :4])
+        self.nodes = unique_times
+
+        ra = ephemerides[:, 1] * np.pi / 180
+        dec = ephemerides[:, 2] * np.pi / 180
+        distances = ephemerides[:, 3]
+
+        radial_vector = np.c_[np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra),
+                              np.sin(dec)]
+        self.positions = distances[:, None] * radial_vector
+
+        self.velocity_aware = (ephemerides.shape[1] >= 7) and np.all(
+            np.isfinite(ephemerides[:, 4:7]))
+
+        if self.velocity_aware:
+
+            ra_vector = np.c_[-np.sin(ra), np.cos(ra), np.zeros(len(ra))]
+            dec_vector = np.c_[-np.sin(dec) * np.cos(ra), -np.sin(dec) * np.sin(ra),
+                               np.cos(dec)]
+
+            ra_rate = ephemerides[:, 4] * ARCSECOND_PER_HOUR  # includes cos(dec)
+            dec_rate = ephemerides[:, 5] * ARCSECOND_PER_HOUR
+            distance_rate = ephemerides[:, 6] * 86400 / AU_KM
+
+            self.speeds = distance_rate[:, None] * radial_vector + \
+                          (distances * ra_rate)[:, None] * ra_vector + \
+                          (distances * dec_rate)[:, None] * dec_vector
+
+        elif len(self.nodes) > 1:
+
+            self.speeds = np.gradient(self.positions, self.nodes, axis=0)
+
+        else:
+
+            self.speeds = np.zeros(self.positions.shape)
+
+    def covers(self, time_to_treat, max_step=None):
+        """
+        Check if the times are inside the nodes and, if max_step is given, if each
+        time is a node or lies between nodes closer than max_step
+
+        Parameters
+        ----------
+        time_to_treat : array, the time in JD to treat
+        max_step : float, the maximum time between the nodes around the times
+
+        Returns
+        -------
+        covered : bool, True if no extrapolation (or too sparse interpolation) is
+        needed
+        """
+        times = np.atleast_1d(np.asarray(time_to_treat, dtype=float))
+
+        covered = (np.min(times) >= self.nodes[0]) & (np.max(times) <= self.nodes[-1])
+
+        if covered & (max_step is not None) & (len(self.nodes) > 1):
+
+            index = np.clip(np.searchsorted(self.nodes, times) - 1, 0,
+                            len(self.nodes) - 2)
+
+            distance_to_nodes = np.minimum(np.abs(times - self.nodes[index]),
+                                           np.abs(times - self.nodes[index + 1]))
+            steps = self.nodes[index + 1] - self.nodes[index]
+
+            covered = np.all((steps <= max_step) |
+                             (distance_to_nodes < NODES_TOLERANCE))
+
+        return bool(covered)
+
+    def positions_speeds(self, time_to_treat):
+        """
+        Interpolate the spacecraft positions and speeds
+
+        Parameters
+        ----------
+        time_to_treat : array, the time in JD to treat
+
+        Returns
+        -------
+        positions : array, the (N,3) XYZ positions in AU relative to Earth
+        speeds : array, the (N,3) XYZ speeds in AU/day relative to Earth
+        """
+        times = np.atleast_1d(np.asarray(time_to_treat, dtype=float))
+
+        if len(self.nodes) == 1:
+
+            positions = self.positions + (times - self.nodes[0])[:, None] * \
+                        self.speeds
+
+            return positions, np.repeat(self.speeds, len(times), axis=0)
+
+        index = np.clip(np.searchsorted(self.nodes, times) - 1, 0,
+                        len(self.nodes) - 2)
+        steps = self.nodes[index + 1] - self.nodes[index]
+        s = np.clip((times - self.nodes[index]) / steps, 0, 1)
+
+        positions, speeds = cubic_Hermite_interpolation(s, steps,
+                                                        self.positions[index],
+                                                        self.positions[index + 1],
+                                                        self.speeds[index],
+                                                        self.speeds[index + 1])
+
+        # Linear extrapolation outside the nodes
+        outside = times - np.clip(times, self.nodes[0], self.nodes[-1])
+        positions += outside[:, None] * speeds
+
+        return positions, speeds
@@ -12,6 +12,11 @@ class UniformDistribution(object):
 
     def pdf(self, x):
 
+        if np.ndim(x) != 0:
+
+            return np.where((x > self.bound_min) & (x < self.bound_max),
+                            self.probability, 0.0)
+
         if (x > self.bound_min) & (x < self.bound_max):
 
             return self.probability
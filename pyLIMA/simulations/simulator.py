@@ -368,6 +368,7 @@ def simulate_lightcurve(model, pyLIMA_parameters, add_noise=True,efficiency=None
             lightcurve_magnitude =  telescope.lightcurve_in_magnitude(telescope.lightcurve)
             telescope.lightcurve['mag'] = lightcurve_magnitude[:,1]
             telescope.lightcurve['err_mag'] = lightcurve_magnitude[:,2]
+            telescope.clear_data_arrays()
 
 
     model.define_pyLIMA_standard_parameters()
@@ -420,4 +421,6 @@ def simulate_astrometry(model, pyLIMA_parameters, add_noise=True):
             telescope.astrometry['err_ra'] = err_ra * unit.deg
             telescope.astrometry['dec'] = obs_dec * unit.deg
             telescope.astrometry['err_dec'] = err_dec * unit.deg
+            telescope.clear_data_arrays()
+
     model.define_pyLIMA_standard_parameters()
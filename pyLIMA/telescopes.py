@@ -8,7 +8,8 @@ import numpy as np
 from astropy import constants as astronomical_constants
 
 from pyLIMA.parallax import parallax
-from pyLIMA.toolbox.time_series import construct_time_series, clean_time_series
+from pyLIMA.toolbox.time_series import construct_time_series, clean_time_series, \
+    construct_data_arrays
 
 # Conventions for magnitude and flux lightcurves for all pyLIMA. If the injected
 # lightcurve format differs, please
@@ -44,6 +45,8 @@ class Telescope(object):
     Earth at time of observations
     sidereal_timesL dict, dictionnary of array containing the sidereal time (i.e.
     angle) of a telescope on Earth
+    sidereal_method : str, 'astropy' (default) or 'numpy' (much faster, see
+    parallax.Greenwich_sidereal_times) to compute the sidereal times
     Earth_positions_projects : dict, dictionnary of array containing the projected
     positions of Earth at time of observations
     Earth_speeds_projects : dict, dictionnary of array containing the projected
@@ -51,6 +54,8 @@ class Telescope(object):
     spacecraft_name : str, the name of the satellite for the JPL Horizons ephemrides
     spacecraft_positions : dict, a dictionnary of arrays containing the positions of
     the satellite
+    spacecraft_trajectory : object, the interpolated trajectory of the satellite,
+    see parallax.space_ephemerides
     ld_gamma : float, the microlensing linear limb darkening coefficient
     ld_sigma : float, the microlensing sqrt limb darkending coefficient
     ld_a1 : float, the classic linear  limb darkening coefficient
@@ -81,15 +86,19 @@ class Telescope(object):
         self.Earth_positions = {}
         self.Earth_speeds = {}
         self.sidereal_times = {}
+        self.sidereal_method = 'astropy'
         self.telescope_positions = {}
         self.Earth_positions_projected = {}
         self.Earth_speeds_projected = {}
+        self._data_arrays = {}
+        self._positions_state = None
 
         self.spacecraft_name = spacecraft_name  # give the true name of the
         # satellite, according to JPL horizon
         self.spacecraft_positions = spacecraft_positions.copy()  # only for space
         # base observatory, should be a list as
         # [dates(JD), ra(degree) , dec(degree) , distances(AU) ]
+        self.spacecraft_trajectory = None
 
         # Microlensing LD coefficients
         self.ld_gamma = 0
@@ -159,6 +168,15 @@ class Telescope(object):
 
         self.hidden()
 
+    def __getstate__(self):
+
+        # The data keys hold the table columns, which can not be pickled alone. The
+        # frozen arrays are rebuilt at the first call, see data_arrays
+        state = self.__dict__.copy()
+        state['_data_arrays'] = {}
+
+        return state
+
     def trim_data(self, photometry_mask=None, astrometry_mask=None):
         """
         Prune the telescope observations
@@ -168,6 +186,10 @@ class Telescope(object):
         photometry_mask : array, a boolean array to mask photometric data
         astrmetry_mask : array, a boolean array to mask astrometric data
         """
+        self.clear_data_arrays()
+
+        positions_initialized = self.positions_initialized()
+
         if photometry_mask is not None:
             self.lightcurve = self.lightcurve[photometry_mask]
 
@@ -194,6 +216,103 @@ class Telescope(object):
             self.telescope_positions['astrometry'] = \
                 self.telescope_positions['astrometry'][astrometry_mask]
 
+        if positions_initialized:
+
+            # The positions are trimmed with the data
+            self._positions_state = self._positions_key()
+
+    def data_arrays(self, data_type='photometry'):
+        """
+        Returns the frozen arrays of the photometry or astrometry, see
+        time_series.construct_data_arrays. The arrays are built at the first call
+        and rebuilt if the data, its columns or the deltas_positions objects
+        changed (i.e. trim_data, compute_parallax, simulations or new data), see
+        data_key.
+
+        Parameters
+        ----------
+        data_type : str, 'photometry' or 'astrometry'
+
+        Returns
+        -------
+        data_arrays : dict, the dictionnary of arrays, None if no data
+        """
+        if data_type == 'photometry':
+
+            data = self.lightcurve
+
+        else:
+
+            data = self.astrometry
+
+        if data is None:
+
+            return None
+
+        data_key = self.data_key(data_type)
+
+        try:
+
+            cached_key, data_arrays = self._data_arrays[data_type]
+
+            if same_data_keys(cached_key, data_key):
+
+                return data_arrays
+
+        except KeyError:
+
+            pass
+
+        data_arrays = construct_data_arrays(data, self.deltas_positions.get(data_type))
+        self._data_arrays[data_type] = (data_key, data_arrays)
+
+        return data_arrays
+
+    def data_key(self, data_type='photometry', columns=None):
+        """
+        The objects defining the photometry or astrometry, i.e. the table, its
+        columns and the deltas_positions. A new table, a replaced column (e.g.
+        lightcurve['flux'] = new_flux) or new parallax deltas give a different key,
+        see same_data_keys.
+
+        Parameters
+        ----------
+        data_type : str, 'photometry' or 'astrometry'
+        columns : list, the names of the columns to include, all by default
+
+        Returns
+        -------
+        data_key : tuple, the table, deltas_positions and columns objects
+        """
+        if data_type == 'photometry':
+
+            data = self.lightcurve
+
+        else:
+
+            data = self.astrometry
+
+        if data is None:
+
+            return (None,)
+
+        if columns is None:
+
+            columns = data.colnames
+
+        data_key = (data, self.deltas_positions.get(data_type)) + tuple(
+            data[column] if column in data.colnames else None for column in columns)
+
+        return data_key
+
+    def clear_data_arrays(self):
+        """
+        Clear the frozen arrays, needed only if the data values are modified in
+        place (e.g. lightcurve['flux'][0] = 1), since a replaced table or column
+        is detected, see data_key
+        """
+        self._data_arrays = {}
+
     def n_data(self, choice='magnitude'):
         """
         Returns the number of photometric data
@@ -240,6 +359,42 @@ class Telescope(object):
             self.find_sidereal_time()
             self.find_Earth_telescope_positions()
 
+        self._positions_state = self._positions_key()
+
+    def positions_initialized(self):
+        """
+        Check if the telescope positions (Earth ephemerides, sidereal times...) are
+        up to date, i.e. computed with the current data, spacecraft ephemerides,
+        location and methods
+
+        Returns
+        -------
+        initialized : bool, True if the positions do not need to be recomputed
+        """
+        if self._positions_state is None:
+
+            return False
+
+        positions_key = self._positions_key()
+
+        # The data and the spacecraft ephemerides are compared by identity
+        same_data = all(data is cached_data for data, cached_data in
+                        zip(positions_key[:4], self._positions_state[:4]))
+
+        initialized = same_data & (positions_key[4:] == self._positions_state[4:])
+
+        return initialized
+
+    def _positions_key(self):
+
+        positions_key = (self.lightcurve, self.astrometry,
+                         self.spacecraft_positions.get('photometry'),
+                         self.spacecraft_positions.get('astrometry'), self.location,
+                         self.altitude, self.longitude, self.latitude,
+                         self.sidereal_method, self.spacecraft_name)
+
+        return positions_key
+
     def find_Earth_positions(self):
         """
         Find the Earh positions relative to photometric and astrometric data
@@ -261,14 +416,19 @@ class Telescope(object):
                 self.Earth_positions[data_type] = earth_positions
                 self.Earth_speeds[data_type] = earth_speeds
 
-    def find_sidereal_time(self, sidereal_type='mean'):
+    def find_sidereal_time(self, sidereal_type='mean', method=None):
         """
         Returns the sidereal time (angle to vernal point) for each observations
 
         Parameters
         ----------
-        sidereal_type : str, 'mean' or 'apparent' (much, much slower!)
+        sidereal_type : str, 'mean' or 'apparent' (much, much slower with astropy!)
+        method : str, 'astropy' or 'numpy', default is the sidereal_method attribute
         """
+        if method is None:
+
+            method = self.sidereal_method
+
         for data_type in ['astrometry', 'photometry']:
 
             if data_type == 'photometry':
@@ -282,8 +442,8 @@ class Telescope(object):
             if data is not None:
                 time = data['time'].value
 
-                sidereal_times = parallax.Earth_telescope_sidereal_times(time,
-                                                                         sidereal_type=sidereal_type)
+                sidereal_times = parallax.Earth_telescope_sidereal_times(
+                    time, sidereal_type=sidereal_type, method=method)
 
                 self.sidereal_times[data_type] = sidereal_times
 
@@ -339,6 +499,8 @@ class Telescope(object):
     def compute_parallax(self, parallax_model, North_vector, East_vector):
         """
         Compute and set the deltas_positions attributes according to the parallax model.
+        The telescope positions are computed only once (see positions_initialized),
+        so a new parallax model or t0_par only redo the projections.
 
         Parameters
         ----------
@@ -348,9 +510,13 @@ class Telescope(object):
         East_vector: array, the projected Eat vector to project delta_position into
         details in microlparallax module.
         """
-        self.initialize_positions()
+        if not self.positions_initialized():
+
+            self.initialize_positions()
+
         parallax.parallax_combination(self, parallax_model, North_vector,
                                       East_vector)  # , right_ascension)
+        self.clear_data_arrays()
         print('Parallax(' + parallax_model[
             0] + ') estimated for the telescope ' + self.name + ': SUCCESS')
 
@@ -457,3 +623,22 @@ class Telescope(object):
                 except webbrowser.Error:
 
                     pass
+
+
+def same_data_keys(data_key, other_data_key):
+    """
+    Check if two data keys (see Telescope.data_key) are made of the same objects
+
+    Parameters
+    ----------
+    data_key : tuple, a data key
+    other_data_key : tuple, another data key
+
+    Returns
+    -------
+    same : bool, True if the data did not change
+    """
+    same = (len(data_key) == len(other_data_key)) and all(
+        data is other_data for data, other_data in zip(data_key, other_data_key))
+
+    return same
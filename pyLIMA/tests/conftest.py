@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def pyLIMA_cache_directory(tmp_path_factory):
+    """
+    Keep the pyLIMA persistent caches (Earth ephemerides, JPL Horizons...) of the
+    tests in a temporary directory, instead of the user ~/.pyLIMA/cache
+    """
+    from pyLIMA.parallax import ephemerides_cache
+
+    directory = str(tmp_path_factory.mktemp('pyLIMA_cache'))
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+
+        monkeypatch.setenv('PYLIMA_CACHE_DIR', directory)
+
+        # The default Earth cache is created at import, i.e. before this fixture
+        monkeypatch.setattr(ephemerides_cache.EARTH_EPHEMERIDES_CACHE, 'directory',
+                            os.path.join(directory, 'Earth_ephemerides'))
+
+        yield directory
@@ -22,7 +22,7 @@ def test_astrometric_position_of_the_source():
     # Without time_ref
     telescope = mock.MagicMock()
     telescope.name = 'test'
-    telescope.astrometry['time'].value = np.array([2459857, 2459959])
+    telescope.data_arrays.return_value = {'time': np.array([2459857, 2459959])}
     telescope.astrometry['ra'].unit = 'deg'
     dico = {'astrometry': np.array([np.array([0.2, 0.1]), np.array([0.6, 0.98])])}
     telescope.Earth_positions.__getitem__.side_effect = dico.__getitem__
@@ -50,7 +50,7 @@ def test_astrometric_position_of_the_source():
     # With time_ref and pixel_scale
     telescope = mock.MagicMock()
     telescope.name = 'test'
-    telescope.astrometry['time'].value = np.array([2459857, 2459959])
+    telescope.data_arrays.return_value = {'time': np.array([2459857, 2459959])}
     telescope.astrometry['ra'].unit = 'pix'
     dico = {'astrometry': np.array([np.array([0.2, 0.1]), np.array([0.6, 0.98])])}
     telescope.Earth_positions.__getitem__.side_effect = dico.__getitem__
@@ -84,7 +84,7 @@ def test_source_astrometric_positions():
     # Without shifts
     telescope = mock.MagicMock()
     telescope.name = 'test'
-    telescope.astrometry['time'].value = np.array([2459857, 2459959])
+    telescope.data_arrays.return_value = {'time': np.array([2459857, 2459959])}
     telescope.astrometry['ra'].unit = 'deg'
     dico = {'astrometry': np.array([np.array([0.2, 0.1]), np.array([0.6, 0.98])])}
     telescope.Earth_positions_projected.__getitem__.side_effect = dico.__getitem__
@@ -109,7 +109,7 @@ def test_source_astrometric_positions():
     # With shifts
     telescope = mock.MagicMock()
     telescope.name = 'test'
-    telescope.astrometry['time'].value = np.array([2459857, 2459959])
+    telescope.data_arrays.return_value = {'time': np.array([2459857, 2459959])}
     telescope.astrometry['ra'].unit = 'deg'
     dico = {'astrometry': np.array([np.array([0.2, 0.1]), np.array([0.6, 0.98])])}
     telescope.Earth_positions_projected.__getitem__.side_effect = dico.__getitem__
@@ -136,7 +136,7 @@ def test_lens_astrometric_positions():
     # Without shifts
     telescope = mock.MagicMock()
     telescope.name = 'test'
-    telescope.astrometry['time'].value = np.array([2459857, 2459959])
+    telescope.data_arrays.return_value = {'time': np.array([2459857, 2459959])}
     telescope.astrometry['ra'].unit = 'deg'
     dico = {'astrometry': np.array([np.array([0.2, 0.1]), np.array([0.6, 0.98])])}
     telescope.Earth_positions_projected.__getitem__.side_effect = dico.__getitem__
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 import pyLIMA.fits as pyfit
 import pyLIMA.models as pymod
 
@@ -118,6 +119,20 @@ def test_TRF():
                         2.15371948e+04,  2.23667118e+03]]), atol=0, rtol=0.001)
 
 
+def test_TRF_numerical_Jacobian():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+    pspl.Jacobian_flag = 'Numerical'
+
+    my_fit = pyfit.TRFfit(pspl)
+    my_fit.fit()
+
+    # Dense finite differences, i.e. the exact trust region solver
+    assert my_fit.fit_results['fit_object']['nfev'] <= 20
+    assert np.allclose(my_fit.fit_results['chi2'], 8440.16949, atol=0, rtol=10 ** -6)
+
+
 def test_DE():
     eve = create_event()
 
@@ -135,6 +150,51 @@ def test_DE():
 
     assert values[3].shape == (88, 10)
 
+
+def test_DE_vectorized():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.DEfit(fspl, DE_population_size=1, max_iteration=10,
+                         display_progress=False, strategy='best1bin',
+                         vectorized=True)
+    my_fit.fit()
+
+    values = [my_fit.fit_results[key] for key in my_fit.fit_results.keys()]
+
+    assert len(values[0]) == 8
+
+    assert values[3].shape == (88, 10)
+
+    best = np.argmin(values[3][:, -2])
+
+    assert np.allclose(values[1], values[3][best, -2])
+
+
+def test_MCMC_vectorize():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.MCMCfit(fspl, MCMC_walkers=2, MCMC_links=10, vectorize=True)
+
+    my_fit.model_parameters_guess = [79.93092166436098, 0.008144359355309872,
+                                     10.110765454770114,
+                                     0.022598878807753468, ]
+    my_fit.fit()
+
+    values = [my_fit.fit_results[key] for key in my_fit.fit_results.keys()]
+
+    assert values[2].shape == (10, 8, 6)
+
+    assert values[3].shape == (10, 8, 10)
+
+    log_probability = my_fit.fit_results['fit_object'].get_log_prob()
+
+    assert np.allclose(values[2][:, :, -2], log_probability)
+
+
 def test_MCMC():
 
     eve = create_event()
@@ -159,6 +219,481 @@ def test_MCMC():
     assert values[3].shape == (10, 8, 10)
 
 
+def test_MCMC_chains_with_fluxes():
+    from pyLIMA.fits.trials_recorder import TrialsRecorder
+
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    for vectorize in [False, True]:
+
+        my_fit = pyfit.MCMCfit(fspl, MCMC_walkers=2, MCMC_links=10,
+                               vectorize=vectorize)
+        my_fit.trials_recorder = TrialsRecorder(mode='none')
+
+        my_fit.model_parameters_guess = [79.93092166436098, 0.008144359355309872,
+                                         10.110765454770114,
+                                         0.022598878807753468, ]
+        my_fit.fit()
+
+        chains = my_fit.fit_results['MCMC_chains']
+        chains_with_fluxes = my_fit.fit_results['MCMC_chains_with_fluxes']
+
+        assert len(my_fit.trials_parameters) == 0
+        assert np.allclose(chains_with_fluxes[:, :, :4], chains[:, :, :4])
+
+        sample = chains_with_fluxes[-1, 0]
+        fluxes = fspl.find_telescopes_fluxes(sample[:4])
+
+        assert np.allclose(sample[4:-2], list(fluxes.values()))
+        assert np.allclose(sample[-2], chains[-1, 0, -2])
+
+
+def test_GRID_warm_start_checkpoint(tmp_path):
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    checkpoint = str(tmp_path / 'grid.txt')
+
+    my_fit = pyfit.GRIDfit(pspl, fix_parameters=['u0', 'tE'], grid_resolution=3,
+                           max_iteration=5, warm_start=True, checkpoint=checkpoint)
+    my_fit.fit_parameters['t0'][1] = [79, 81]
+    my_fit.fit()
+
+    population = my_fit.fit_results['GRIDS_population']
+
+    assert population.shape == (9, 8)
+    assert np.loadtxt(checkpoint).shape == (9, 2 + 8)
+
+    indexes = my_fit.grid_indexes(my_fit.construct_the_hyper_grid())
+
+    assert len(my_fit.neighbours_models(4, indexes, dict(enumerate(population)))) == 4
+
+    # Resume from the checkpoint, nothing left to fit
+    resumed_fit = pyfit.GRIDfit(pspl, fix_parameters=['u0', 'tE'], grid_resolution=3,
+                                max_iteration=5, warm_start=True,
+                                checkpoint=checkpoint)
+    resumed_fit.fit_parameters['t0'][1] = [79, 81]
+    resumed_fit.fit()
+
+    assert np.allclose(resumed_fit.fit_results['GRIDS_population'], population)
+    assert np.loadtxt(checkpoint).shape == (9, 2 + 8)
+
+    # A checkpoint of another grid is not resumed
+    other_fit = pyfit.GRIDfit(pspl, fix_parameters=['u0', 'tE'], grid_resolution=4,
+                              max_iteration=5, checkpoint=checkpoint)
+    other_fit.fit_parameters['t0'][1] = [79, 81]
+
+    with pytest.raises(ValueError):
+
+        other_fit.fit()
+
+
+def test_GRID_load_checkpoint_large_values(tmp_path):
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.GRIDfit(pspl, fix_parameters=['t0'], grid_resolution=1000,
+                           checkpoint=str(tmp_path / 'grid.txt'))
+    my_fit.fit_parameters['t0'][1] = [2460000, 2460001]
+
+    hyper_grid = my_fit.construct_the_hyper_grid()
+    my_fit.save_checkpoint(hyper_grid[500], np.arange(8.))
+
+    models = my_fit.load_checkpoint(hyper_grid)
+
+    # The neighbouring pixels are 1e-3 days apart, i.e. within the default rtol
+    assert list(models.keys()) == [500]
+    assert np.allclose(models[500], np.arange(8.))
+
+
+def test_GRID_adaptive_refinement():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.GRIDfit(pspl, fix_parameters=['u0', 'tE'], grid_resolution=3,
+                           max_iteration=5, warm_start=True, refinement_levels=1,
+                           refinement_threshold=0)
+    my_fit.fit_parameters['t0'][1] = [79, 81]
+    my_fit.fit()
+
+    population = my_fit.fit_results['GRIDS_population']
+
+    # Only the best pixel is split in 4
+    assert population.shape == (9 + 4, 8)
+    assert np.allclose(my_fit.intervals, np.array([2, 499.9]) / 3 / 2)
+    assert my_fit.fit_results['chi2'] == population[:, -1].min()
+
+
+def test_BOOTSTRAP_weights():
+    eve = create_event()
+
+    pspl = pymod.PSPLmodel(eve)
+
+    my_fit = pyfit.BOOTSTRAPfit(pspl, bootstrap_method='weights')
+    my_fit.model_parameters_guess = [79.93, 0.008, 10.1]
+
+    np.random.seed(3)
+    weights = my_fit.generate_residuals_weights()
+
+    assert len(weights) == weights.sum() == 3624
+
+    trf = pyfit.TRFfit(pspl)
+    parameters = np.array([79.93, 0.008, 10.1, 2917, 3125, 92640, 141830.])
+    residuals = trf.objective_function(parameters)
+    jacobian = trf.residuals_Jacobian(parameters)
+
+    trf.residuals_weights = weights
+
+    assert np.allclose(trf.objective_function(parameters), residuals * weights ** 0.5)
+    assert np.allclose(trf.residuals_Jacobian(parameters),
+                       jacobian * weights[:, None] ** 0.5)
+
+    my_fit.fit(number_of_samples=2)
+
+    assert my_fit.fit_results['samples'].shape == (2, 7)
+
+
+def test_residuals_Jacobian_sparsity():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    my_fit = pyfit.TRFfit(fspl)
+
+    sparsity = my_fit.residuals_Jacobian_sparsity()
+
+    assert sparsity.shape == (3624, 8)
+    assert np.allclose(sparsity.sum(axis=0),
+                       [3624, 3624, 3624, 3624, 3587, 3587, 37, 37])
+
+    parameters = np.array([79.93, 0.0081, 10.11, 0.0226, 2917, 3125, 92640, 141830])
+    jacobian = my_fit.residuals_Jacobian(parameters)
+
+    assert np.all((jacobian != 0) <= sparsity.toarray())
+
+    # The fluxes of the two telescopes are evaluated together, i.e. 6 evaluations
+    from scipy.optimize._numdiff import approx_derivative
+
+    evaluations = []
+
+    def objective_function(fit_process_parameters):
+
+        evaluations.append(fit_process_parameters)
+
+        return pyfit.TRFfit.objective_function(my_fit, fit_process_parameters)
+
+    my_fit.objective_function = objective_function
+
+    objective_function, jacobian_function = my_fit.grouped_numerical_Jacobian(
+        sparsity, ([-np.inf] * 8, [np.inf] * 8))
+
+    residuals = objective_function(parameters)
+    grouped_jacobian = jacobian_function(parameters)
+
+    assert len(evaluations) == 1 + 6
+    assert np.allclose(grouped_jacobian,
+                       approx_derivative(my_fit.objective_function, parameters,
+                                         method='2-point', f0=residuals),
+                       rtol=10 ** -6, atol=10 ** -6)
+
+    del my_fit.objective_function
+    fspl.Jacobian_flag = 'Numerical'
+    my_fit.fit()
+
+    # u0 sign is degenerate
+    assert np.allclose(np.abs(my_fit.fit_results['best_model'][:4]),
+                       [79.93092166158918, 0.008144355475100886, 10.110765705232229,
+                        0.022598879182430687], rtol=0.001)
+    assert np.allclose(my_fit.fit_results['covariance_matrix'][0, 0], 6.5e-07,
+                       rtol=0.01)
+
+
+def test_astrometric_residuals_Jacobian():
+    from scipy.optimize._numdiff import approx_derivative
+
+    eve = create_event()
+    eve.ra = 270
+    eve.dec = -30
+
+    time = np.linspace(2459000, 2459200, 40)
+    astrometry = np.c_[time, np.random.normal(0, 1e-7, 40), [1e-7] * 40,
+                       np.random.normal(0, 1e-7, 40), [1e-7] * 40]
+
+    eve.telescopes.append(
+        telescopes.Telescope(name='Astro', camera_filter='I', astrometry=astrometry,
+                             astrometry_names=['time', 'ra', 'err_ra', 'dec',
+                                               'err_dec'],
+                             astrometry_units=['JD', 'deg', 'deg', 'deg', 'deg']))
+
+    pspl = pymod.PSPLmodel(eve, parallax=['Full', 2459100])
+
+    assert pspl.Jacobian_flag == 'Analytical'
+
+    my_fit = pyfit.TRFfit(pspl)
+
+    parameters = np.array([2459100, 0.3, 40., 1.2, 0.2, 3., -2., 0., 0., 0.1, -0.2,
+                           2917, 3125, 92640, 141830])
+    jacobian = my_fit.residuals_Jacobian(parameters)
+
+    step = np.abs(parameters) * 10 ** -6 + 10 ** -6
+    step[0] = 10 ** -3
+    numerical_jacobian = approx_derivative(my_fit.objective_function, parameters,
+                                           method='3-point', abs_step=step)
+
+    assert jacobian.shape == (3624 + 80, 15)
+    assert np.allclose(jacobian[3624:, 11:], 0)
+    assert np.allclose(jacobian[3624:], numerical_jacobian[3624:],
+                       atol=10 ** -5 * np.abs(numerical_jacobian[3624:]).max())
+
+
+def test_fluxes_marginalization():
+    from scipy import integrate
+
+    eve = event.Event()
+
+    time = np.linspace(-20, 20, 12)
+    impact = np.sqrt(0.3 ** 2 + (time / 10) ** 2)
+    magnification = (impact ** 2 + 2) / (impact * np.sqrt(impact ** 2 + 4))
+    flux = 500 * magnification + 100 + np.random.normal(0, 20, len(time))
+
+    telescope = telescopes.Telescope(name='T', camera_filter='I',
+                                     lightcurve=np.c_[time, flux, [20.] * 12],
+                                     lightcurve_names=['time', 'flux', 'err_flux'],
+                                     lightcurve_units=['JD', 'W/m^2', 'W/m^2'])
+    eve.telescopes.append(telescope)
+
+    pspl = pymod.PSPLmodel(eve, blend_flux_parameter='fblend')
+    parameters = np.array([0.0, 0.3, 10.])
+
+    for fluxes_priors in [{}, {'T': [np.array([480., 120.]),
+                                     np.diag([30. ** 2, 40. ** 2])]}]:
+
+        mcmc_fit = pyfit.MCMCfit(pspl, telescopes_fluxes_method='marginalize')
+        mcmc_fit.fluxes_priors = fluxes_priors
+
+        ln_likelihood, priors, pyLIMA_parameters = mcmc_fit.model_likelihood(
+            parameters)
+
+        f_source = pyLIMA_parameters['fsource_T']
+        f_blend = pyLIMA_parameters['fblend_T']
+
+        def likelihood(fblend, fsource):
+
+            pyLIMA_parameters = pspl.compute_pyLIMA_parameters(
+                list(parameters) + [fsource, fblend])
+            model = pspl.compute_the_microlensing_model(telescope,
+                                                        pyLIMA_parameters)
+
+            ln_likelihood = -0.5 * np.sum((flux - model['photometry']) ** 2 / 400 +
+                                          np.log(2 * np.pi * 400))
+
+            if fluxes_priors:
+
+                mean, covariance = fluxes_priors['T']
+                delta = np.array([fsource, fblend]) - mean
+                ln_likelihood += -0.5 * (delta @ np.linalg.solve(covariance, delta)
+                                         + np.log(np.linalg.det(2 * np.pi *
+                                                                covariance)))
+
+            return np.exp(ln_likelihood)
+
+        evidence = integrate.dblquad(likelihood, f_source - 200, f_source + 200,
+                                     f_blend - 150, f_blend + 150, epsabs=0,
+                                     epsrel=10 ** -8)[0]
+
+        assert np.allclose(ln_likelihood - priors, -np.log(evidence), atol=10 ** -4)
+
+        batch = np.array([parameters, [1.0, 0.4, 12.]])
+        objective = [mcmc_fit.standard_objective_function(vector) for vector in
+                     batch]
+
+        assert np.allclose(mcmc_fit.standard_objective_function_batch(batch),
+                           objective)
+
+    # noblend, with the median source flux
+    pspl = pymod.PSPLmodel(eve, blend_flux_parameter='noblend')
+    mcmc_fit = pyfit.MCMCfit(pspl, telescopes_fluxes_method='marginalize')
+
+    ln_likelihood, priors, pyLIMA_parameters = mcmc_fit.model_likelihood(parameters)
+
+    f_source = pyLIMA_parameters['fsource_T']
+
+    assert np.allclose(f_source, np.median(flux / magnification))
+
+    def likelihood(fsource):
+
+        pyLIMA_parameters = pspl.compute_pyLIMA_parameters(list(parameters) +
+                                                           [fsource])
+        model = pspl.compute_the_microlensing_model(telescope, pyLIMA_parameters)
+
+        return np.exp(-0.5 * np.sum((flux - model['photometry']) ** 2 / 400 +
+                                    np.log(2 * np.pi * 400)))
+
+    evidence = integrate.quad(likelihood, f_source - 200, f_source + 200,
+                              epsabs=0, epsrel=10 ** -10)[0]
+
+    assert np.allclose(ln_likelihood - priors, -np.log(evidence), atol=10 ** -4)
+
+    objective = [mcmc_fit.standard_objective_function(vector) for vector in batch]
+
+    assert np.allclose(mcmc_fit.standard_objective_function_batch(batch), objective)
+
+
+def test_standard_objective_function_batch():
+    eve = create_event()
+
+    fspl = pymod.FSPLmodel(eve)
+
+    parameters = np.array([[79.93, 0.0081, 10.11, 0.0226],
+                           [79.8, 0.01, 9.5, 0.03],
+                           [80.1, 0.2, 12.0, 0.001]])
+
+    for loss_function in ['chi2', 'likelihood', 'soft_l1']:
+
+        de_fit = pyfit.DEfit(fspl, loss_function=loss_function)
+
+        objective = [de_fit.standard_objective_function(vector) for vector in
+                     parameters]
+        objective_batch = de_fit.standard_objective_function_batch(parameters)
+        de_fit.merge_trials()
+
+        assert np.allclose(objective, objective_batch)
+        assert len(de_fit.trials_parameters) == 6
+        assert np.allclose(de_fit.trials_parameters[:3],
+                           de_fit.trials_parameters[3:])
+        assert np.allclose(de_fit.trials_priors[:3], de_fit.trials_priors[3:])
+
+    # The extra priors see the flux regression sums of each trial
+    class FluxRegressionPrior(object):
+
+        def pdf(self, pyLIMA_parameters):
+
+            sums = [value for key, value in pyLIMA_parameters.items() if
+                    key.startswith('flux_regression_')]
+
+            return 1 / (1 + np.sum([np.sum(value[3:]) for value in sums]))
+
+    de_fit = pyfit.DEfit(fspl)
+    de_fit.extra_priors = [FluxRegressionPrior()]
+
+    objective = [de_fit.standard_objective_function(vector) for vector in
+                 parameters]
+
+    assert np.allclose(objective, de_fit.standard_objective_function_batch(parameters))
+
+
+def test_trials_recorder():
+    import glob
+    import os
+    from pyLIMA.fits.trials_recorder import TrialsRecorder
+
+    trials = np.arange(30.).reshape(10, 3)
+
+    recorder = TrialsRecorder(buffer_size=2)
+
+    for trial in trials[:5]:
+
+        recorder.record(trial[:1], trial[1], trial[2])
+
+    # i.e. a worker of a computational pool
+    owner = recorder.owner
+    recorder.owner = -1
+    recorder.record_batch(trials[5:, :1], trials[5:, 1], trials[5:, 2])
+    recorder.owner = owner
+
+    parameters, objective, priors = recorder.merge()
+
+    assert np.allclose(np.c_[parameters, objective, priors], trials)
+    assert len(recorder.merge()[0]) == 10
+
+    recorder = TrialsRecorder(mode='ring', max_trials=4, subsample=2)
+    recorder.record_batch(trials[:, :1], trials[:, 1], trials[:, 2])
+
+    assert np.allclose(recorder.merge()[0].ravel(), [6, 12, 18, 24])
+
+    recorder = TrialsRecorder(mode='reservoir', max_trials=4)
+    recorder.record_batch(trials[:, :1], trials[:, 1], trials[:, 2])
+
+    assert len(recorder.merge()[0]) == 4
+
+    # The merged trials are copies
+    parameters, objective, priors = recorder.merge()
+    objective *= -1
+
+    assert np.all(recorder.merge()[1] > 0)
+
+    # The workers keep their own bounded ring or reservoir
+    for mode in ['ring', 'reservoir']:
+
+        recorder = TrialsRecorder(mode=mode, max_trials=4)
+        recorder.record_batch(trials[:5, :1], trials[:5, 1], trials[:5, 2])
+
+        recorder.owner = -1
+
+        for trial in trials:
+
+            recorder.record(trial[:1], trial[1], trial[2])
+
+        recorder.record_batch(trials[:, :1], trials[:, 1], trials[:, 2])
+        recorder.owner = os.getpid()
+
+        worker_files = glob.glob(os.path.join(recorder.directory, 'trials_*.bin'))
+
+        assert len(worker_files) == 1
+        assert os.path.getsize(worker_files[0]) == (4 + 1) * 3 * 8
+
+        parameters, objective, priors = recorder.merge()
+        trials_kept = np.c_[parameters, objective, priors]
+
+        assert len(trials_kept) == 4
+        assert recorder.n_stored == 25
+        assert np.all([np.any(np.all(trials == trial, axis=1))
+                       for trial in trials_kept])
+
+        if mode == 'ring':
+
+            assert np.allclose(trials_kept, trials[-4:])
+
+    # The workers files grow with the recorded trials, not with max_trials
+    for mode in ['all', 'ring']:
+
+        recorder = TrialsRecorder(mode=mode, buffer_size=4)
+        recorder.owner = -1
+
+        for trial in trials:
+
+            recorder.record(trial[:1], trial[1], trial[2])
+
+        recorder.owner = os.getpid()
+
+        worker_files = glob.glob(os.path.join(recorder.directory, 'trials_*.bin'))
+
+        assert os.path.getsize(worker_files[0]) == (16 + 1) * 3 * 8
+
+        parameters, objective, priors = recorder.merge()
+
+        assert np.allclose(np.c_[parameters, objective, priors], trials)
+        assert len(recorder.buffer) == 10
+
+    # Trials of different widths are not recorded together
+    recorder = TrialsRecorder()
+    recorder.record(trials[0, :1], trials[0, 1], trials[0, 2])
+
+    with pytest.raises(ValueError):
+
+        recorder.record(trials[0], trials[0, 1], trials[0, 2])
+
+    recorder = TrialsRecorder(mode='none')
+    recorder.record(trials[0, :1], trials[0, 1], trials[0, 2])
+
+    assert len(recorder.merge()[0]) == 0
+
+
 def test_objective_functions():
 
     eve = create_event()
@@ -78,6 +78,25 @@ def test_magnification_FSPL_Jacobian():
     assert np.allclose(jacobian, [-1.71720554e-01, -1.02195194e+02, 9.95481471e-04,
                                   7.42711447e+00])
 
+    jacobian, magnification = magnification_Jacobian.magnification_FSPL_Jacobian(
+        pspl, telo, pym, return_magnification=True)
+
+    assert np.allclose(magnification, pspl.model_magnification(telo, pym))
+
+
+def test_Yoo_table_interpolation():
+    from pyLIMA.magnification import magnification_FSPL
+
+    z_yoo = np.linspace(magnification_FSPL.YOO_TABLE[0][0],
+                        magnification_FSPL.YOO_TABLE[0][-1], 1000)
+
+    table_values = magnification_FSPL.Yoo_table_interpolation(z_yoo)
+
+    for ind in range(4):
+
+        assert np.allclose(table_values[ind],
+                           magnification_FSPL.YOO_TABLE[ind + 1](z_yoo))
+
 
 def test_magnification_numerical_Jacobian():
     from pyLIMA.magnification import magnification_Jacobian
@@ -105,6 +124,76 @@ def test_magnification_numerical_Jacobian():
                                   7.43527365e+00])  # not as precise...
 
 
+def test_magnification_numerical_Jacobian_steps_and_pool():
+    import pickle
+    from multiprocessing.pool import ThreadPool
+
+    from pyLIMA.magnification import magnification_Jacobian
+    import pyLIMA.telescopes
+    from pyLIMA.models import PSPLmodel
+    from pyLIMA import event
+
+    ev = event.Event()
+    lightcurve = np.c_[np.linspace(2456780, 2456800, 50), [12.8] * 50, [0.01] * 50]
+
+    telo = pyLIMA.telescopes.Telescope(name='fake', camera_filter='I',
+                                       lightcurve=lightcurve,
+                                       lightcurve_names=['time', 'mag', 'err_mag'],
+                                       lightcurve_units=['JD', 'mag', 'mag'])
+
+    ev.telescopes.append(telo)
+
+    pspl = PSPLmodel(ev)
+    pym = pspl.compute_pyLIMA_parameters([2456789.2, 0.1, 34.5])
+
+    analytical_jacobian = magnification_Jacobian.magnification_PSPL_Jacobian(
+        pspl, telo, pym)[0]
+
+    serial_jacobian = magnification_Jacobian.magnification_numerical_Jacobian(
+        pspl, telo, pym)
+
+    pspl.Jacobian_steps = {'t0': 10 ** -12, 'u0': 10 ** -6}
+
+    with ThreadPool(2) as pool:
+
+        pspl.Jacobian_pool = pool
+        pooled_jacobian = magnification_Jacobian.magnification_numerical_Jacobian(
+            pspl, telo, pym)
+
+        assert pickle.loads(pickle.dumps(pspl)).Jacobian_pool is None
+
+    pspl.Jacobian_pool = None
+
+    assert np.allclose(pooled_jacobian[:, 2], serial_jacobian[:, 2])
+    # The smaller t0 step is more precise
+    assert np.abs(pooled_jacobian[:, 0] - analytical_jacobian[:, 0]).max() < \
+           np.abs(serial_jacobian[:, 0] - analytical_jacobian[:, 0]).max()
+    assert np.allclose(pooled_jacobian, analytical_jacobian, rtol=10 ** -4,
+                       atol=10 ** -4)
+
+    # The ModelPool workers hold the model, only the parameters are sent
+    mapped_functions = []
+
+    class RecordingModelPool(magnification_Jacobian.ModelPool):
+
+        def map(self, function, iterable):
+
+            mapped_functions.append(function)
+
+            return super().map(function, iterable)
+
+    with RecordingModelPool(pspl, 2) as pool:
+
+        pspl.Jacobian_pool = pool
+        model_pool_jacobian = magnification_Jacobian.magnification_numerical_Jacobian(
+            pspl, telo, pym)
+
+    pspl.Jacobian_pool = None
+
+    assert np.allclose(model_pool_jacobian, pooled_jacobian)
+    assert len(pickle.dumps(mapped_functions[0])) < len(pickle.dumps(telo)) / 10
+
+
 def test_magnification_PSPL():
     from pyLIMA.magnification import magnification_PSPL
 
@@ -177,3 +266,191 @@ def test_magnification_PSBL():
                                                          x_source, y_source)
 
     assert np.allclose(magnification[0],4.264164845939242)
+
+
+def test_magnification_USBL_batched():
+    from pyLIMA.magnification import magnification_VBB
+
+    tau = np.linspace(-0.5, 0.5, 50)
+    u0 = 0.1
+    alpha = 0.3
+    separation = np.array([1.23] * len(tau))
+    mass_ratio = 0.034
+    x_source = -(tau * np.cos(alpha) - u0 * np.sin(alpha))
+    y_source = -(tau * np.sin(alpha) + u0 * np.cos(alpha))
+    rho = 0.056
+
+    trajectory = magnification_VBB.straight_trajectory(separation, x_source, y_source)
+
+    assert np.allclose(trajectory[0], tau)
+    assert np.allclose(trajectory[1:], [u0, alpha])
+
+    batched = magnification_VBB.magnification_USBL(separation, mass_ratio,
+                                                   x_source, y_source, rho)
+    loop = magnification_VBB.magnification_USBL(separation, mass_ratio,
+                                                x_source, y_source, rho,
+                                                batched=False)
+
+    assert np.allclose(batched, loop)
+
+    y_source[10] += 0.01
+
+    assert magnification_VBB.straight_trajectory(separation, x_source,
+                                                 y_source) is None
+
+
+def test_magnification_USBL_finite_source_tolerance():
+    from pyLIMA.magnification import magnification_VBB
+
+    tau = np.linspace(-3, 3, 300)
+    u0 = 0.05
+    alpha = 0.5
+    separation = np.array([1.1] * len(tau))
+    mass_ratio = 0.003
+    x_source = -(tau * np.cos(alpha) - u0 * np.sin(alpha))
+    y_source = -(tau * np.sin(alpha) + u0 * np.cos(alpha))
+    rho = 0.005
+
+    magnification_VBB.VBM.a1 = 0
+    default_tolerance = magnification_VBB.VBM.Tol
+    magnification_VBB.VBM.Tol = 10 ** -3
+
+    try:
+
+        magnification_ps, contour_mask = magnification_VBB.finite_source_tiers(
+            separation, mass_ratio, x_source, y_source, rho, 10 ** -3)
+
+        # Most of the epochs are far from the caustics
+        assert contour_mask.mean() < 0.2
+
+        tiered = magnification_VBB.magnification_USBL(separation, mass_ratio,
+                                                      x_source, y_source, rho,
+                                                      batched=False,
+                                                      finite_source_tolerance=10 ** -3)
+
+        contour = magnification_VBB.magnification_USBL(separation, mass_ratio,
+                                                       x_source, y_source, rho,
+                                                       batched=False)
+
+        assert np.allclose(tiered[contour_mask], contour[contour_mask])
+        assert np.allclose(tiered[~contour_mask], magnification_ps[~contour_mask])
+        assert np.allclose(tiered, contour, atol=10 ** -3, rtol=0)
+
+        tiered = magnification_VBB.magnification_FSBL(separation, mass_ratio,
+                                                      x_source, y_source, rho, 0.5,
+                                                      finite_source_tolerance=10 ** -3)
+
+        assert np.allclose(tiered[~contour_mask], magnification_ps[~contour_mask])
+
+    finally:
+
+        magnification_VBB.VBM.Tol = default_tolerance
+        magnification_VBB.VBM.a1 = 0
+
+
+def test_magnification_parallax_double_source_Jacobian():
+    from pyLIMA.magnification import magnification_Jacobian
+    import pyLIMA.telescopes
+    from pyLIMA.models import PSPLmodel, FSPLmodel
+    from pyLIMA import event
+
+    ev = event.Event(ra=270, dec=-30)
+    time = np.linspace(2456780, 2456800, 50)
+    lightcurve = np.c_[time, [12.8] * len(time), [0.01] * len(time)]
+
+    telo = pyLIMA.telescopes.Telescope(name='fake', camera_filter='I',
+                                       lightcurve=lightcurve,
+                                       lightcurve_names=['time', 'mag', 'err_mag'],
+                                       lightcurve_units=['JD', 'mag', 'mag'])
+    telo.ld_gamma = 0.5
+
+    ev.telescopes.append(telo)
+
+    values = {'t0': 2456789.2, 'u0': 0.05, 'tE': 10.1, 'rho': 0.03, 'piEN': 0.3,
+              'piEE': -0.2, 'delta_t0': 1.5, 'delta_u0': 0.02, 'rho_2': 0.04,
+              'q_flux_I': 0.4}
+
+    # The FSPL derivatives are interpolated from the Yoo et al. tables
+    for model, tolerance in [(PSPLmodel, 10 ** -3), (FSPLmodel, 10 ** -1)]:
+
+        microlensing_model = model(ev, parallax=['Full', 2456789],
+                                   double_source=['Static'])
+
+        assert microlensing_model.Jacobian_flag == 'Analytical'
+
+        keys = [key for key in microlensing_model.model_dictionnary if
+                key in values]
+        pym = microlensing_model.compute_pyLIMA_parameters(
+            [values[key] for key in keys])
+
+        jacobian, magnification = microlensing_model.model_magnification_Jacobian(
+            telo, pym)
+        numerical_jacobian = magnification_Jacobian.magnification_numerical_Jacobian(
+            microlensing_model, telo, pym)
+
+        assert jacobian.shape == (len(time), len(keys))
+        assert np.allclose(magnification,
+                           microlensing_model.model_magnification(telo, pym))
+        # the 2-point t0 derivative is not precise (t0~2.4e6), see below
+        assert np.allclose(jacobian[:, 1:], numerical_jacobian[:, 1:],
+                           atol=tolerance * np.abs(numerical_jacobian[:, 1:]).max(
+                               axis=0))
+
+        step = 10 ** -5
+        magnifications = []
+
+        for delta in [step, -step]:
+
+            pym_t0 = microlensing_model.compute_pyLIMA_parameters(
+                [values[key] + delta * (key == 't0') for key in keys])
+            magnifications.append(
+                microlensing_model.model_magnification(telo, pym_t0))
+
+        assert np.allclose(jacobian[:, 0],
+                           (magnifications[0] - magnifications[1]) / (2 * step),
+                           atol=tolerance * np.abs(jacobian[:, 0]).max())
+
+
+def test_magnification_fancy_parameters_Jacobian():
+    from pyLIMA.magnification import magnification_Jacobian
+    import pyLIMA.telescopes
+    from pyLIMA.models import PSPLmodel, FSPLmodel, pyLIMA_fancy_parameters
+    from pyLIMA import event
+
+    ev = event.Event()
+    time = np.linspace(2456780, 2456800, 50)
+    lightcurve = np.c_[time, [12.8] * len(time), [0.01] * len(time)]
+
+    telo = pyLIMA.telescopes.Telescope(name='fake', camera_filter='I',
+                                       lightcurve=lightcurve,
+                                       lightcurve_names=['time', 'mag', 'err_mag'],
+                                       lightcurve_units=['JD', 'mag', 'mag'])
+    telo.ld_gamma = 0.5
+
+    ev.telescopes.append(telo)
+
+    fancy = pyLIMA_fancy_parameters.StandardFancyParameters()
+
+    pspl = PSPLmodel(ev)
+    fancy_pspl = PSPLmodel(ev, fancy_parameters=fancy)
+
+    assert fancy_pspl.Jacobian_flag == 'Analytical'
+
+    jacobian = pspl.model_magnification_Jacobian(
+        telo, pspl.compute_pyLIMA_parameters([2456789.2, 0.1, 10 ** 1.5]))[0]
+    fancy_jacobian = fancy_pspl.model_magnification_Jacobian(
+        telo, fancy_pspl.compute_pyLIMA_parameters([2456789.2, 0.1, 1.5]))[0]
+
+    assert np.allclose(fancy_jacobian[:, :2], jacobian[:, :2])
+    assert np.allclose(fancy_jacobian[:, 2], jacobian[:, 2] * 10 ** 1.5 * np.log(10))
+
+    fancy_fspl = FSPLmodel(ev, fancy_parameters=fancy)
+    pym = fancy_fspl.compute_pyLIMA_parameters([2456789.2, 0.1, 1.5, -1.5])
+
+    fancy_jacobian, magnification = fancy_fspl.model_magnification_Jacobian(telo,
+                                                                            pym)
+    numerical_jacobian = magnification_Jacobian.magnification_numerical_Jacobian(
+        fancy_fspl, telo, pym)
+
+    assert np.allclose(fancy_jacobian[:, 1:], numerical_jacobian[:, 1:],
+                       atol=10 ** -1 * np.abs(numerical_jacobian[:, 1:]).max(axis=0))
@@ -36,6 +36,21 @@ def _create_event(JD=0, astrometry=False):
     event.telescopes[0].filter = 'I'
     event.telescopes[0].ld_gamma = 0.5
 
+    def data_arrays(data_type='photometry'):
+
+        if data_type == 'photometry':
+
+            data = event.telescopes[0].lightcurve
+
+        else:
+
+            data = event.telescopes[0].astrometry
+
+        return time_series.construct_data_arrays(
+            data, event.telescopes[0].deltas_positions[data_type])
+
+    event.telescopes[0].data_arrays.side_effect = data_arrays
+
     return event
 
 
@@ -146,6 +161,27 @@ def test_derive_telescope_flux():
     assert np.allclose(pym['fsource_Test'], 13664813.15722887)
     assert np.allclose(pym['fblend_Test'], -13666064.196499277)
 
+    flux = event.telescopes[0].lightcurve['flux'].value
+    err_flux = event.telescopes[0].lightcurve['err_flux'].value
+
+    Model = FSPLmodel(event, origin=['nothere', [9, 8]],
+                      blend_flux_parameter='noblend')
+    pym = Model.compute_pyLIMA_parameters(params)
+
+    Model.derive_telescope_flux(event.telescopes[0], pym, magnification)
+
+    assert np.allclose(pym['fsource_Test'], np.median(flux / magnification))
+    assert pym['fblend_Test'] == 0
+
+    Model.noblend_flux_estimator = 'regression'
+    pym = Model.compute_pyLIMA_parameters(params)
+
+    Model.derive_telescope_flux(event.telescopes[0], pym, magnification)
+
+    assert np.allclose(pym['fsource_Test'],
+                       np.sum(magnification * flux / err_flux ** 2) /
+                       np.sum(magnification ** 2 / err_flux ** 2))
+
 
 def test_find_telescopes_fluxes():
     event = _create_event()
@@ -160,6 +196,20 @@ def test_find_telescopes_fluxes():
     assert np.allclose(fluxes['ftotal_Test'], -1251.039270406589)
 
 
+def test_derive_telescopes_fluxes():
+    event = _create_event()
+
+    Model = FSPLmodel(event, origin=['nothere', [9, 8]])
+
+    pym = Model.compute_pyLIMA_parameters([0.5, 0.002, 35, 0.05])
+
+    covariances = Model.derive_telescopes_fluxes(pym)
+
+    assert np.allclose(pym['fsource_Test'], 13664813.15722887)
+    assert np.allclose(pym['ftotal_Test'], -1251.039270406589)
+    assert covariances['Test'].shape == (2, 2)
+
+
 def test_compute_pyLIMA_parameters():
     event = _create_event()
 
@@ -322,3 +372,140 @@ def test_USBL():
     magi = Model.model_magnification(event.telescopes[0], pym)
 
     assert np.allclose(magi, [76.16515049, 2.11882843])
+
+
+def test_shared_timelines():
+    from pyLIMA import event, telescopes
+
+    your_event = event.Event()
+
+    for name, times in [('Tel1', [0, 5, 10, 20]), ('Tel2', [5, 10, 15])]:
+        lightcurve = np.c_[times, [19] * len(times), [0.01] * len(times)]
+        your_event.telescopes.append(
+            telescopes.Telescope(name=name, camera_filter='I',
+                                 lightcurve=lightcurve.astype(float),
+                                 lightcurve_names=['time', 'mag', 'err_mag'],
+                                 lightcurve_units=['JD', 'mag', 'mag']))
+
+    Model = USBLmodel(your_event)
+
+    assert Model.shared_timelines['Tel1'] is Model.shared_timelines['Tel2']
+    assert np.allclose(
+        Model.shared_timelines['Tel1'].telescope.lightcurve['time'].value,
+        [0, 5, 10, 15, 20])
+
+    params = [10, 0.1, 20, 0.025, 1.24, 0.002, 0.01]
+    pym = Model.compute_pyLIMA_parameters(params)
+
+    shared = [Model.shared_magnification(telescope, pym)
+              for telescope in your_event.telescopes]
+    alone = [Model.model_magnification(telescope, pym)
+             for telescope in your_event.telescopes]
+
+    assert np.allclose(shared[0], alone[0])
+    assert np.allclose(shared[1], alone[1])
+
+    stored_magnification = Model.shared_timelines['Tel1'].stored_magnification
+
+    assert len(stored_magnification) == 2
+    assert len(stored_magnification[1]) == 5
+
+    # Concurrent threads with different parameters
+    from concurrent.futures import ThreadPoolExecutor
+
+    all_params = [[10, u0, 20, 0.025, 1.24, 0.002, 0.01] for u0 in
+                  np.linspace(0.05, 0.5, 20)]
+
+    def magnifications(params):
+
+        pym = Model.compute_pyLIMA_parameters(params)
+
+        return [Model.shared_magnification(telescope, pym) for telescope in
+                your_event.telescopes]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+
+        shared = list(pool.map(magnifications, all_params * 5))
+
+    for params, magnification in zip(all_params * 5, shared):
+
+        pym = Model.compute_pyLIMA_parameters(params)
+
+        assert np.allclose(magnification[1], Model.model_magnification(
+            your_event.telescopes[1], pym))
+
+    # New parallax deltas
+    shared_timeline = Model.shared_timelines['Tel1']
+
+    for telescope in your_event.telescopes:
+
+        telescope.deltas_positions['photometry'] = np.zeros((2, len(
+            telescope.lightcurve)))
+
+    assert shared_timeline.is_valid(your_event.telescopes[0]) is False
+    assert np.allclose(Model.shared_magnification(your_event.telescopes[0], pym),
+                       Model.model_magnification(your_event.telescopes[0], pym))
+    assert Model.shared_timelines['Tel1'] is not shared_timeline
+    assert Model.shared_timelines['Tel1'].is_valid(your_event.telescopes[0])
+
+    your_event.telescopes[1].lightcurve = your_event.telescopes[1].lightcurve[:2]
+
+    assert Model.shared_timelines['Tel2'].is_valid(your_event.telescopes[1]) is False
+    assert len(Model.shared_magnification(your_event.telescopes[1], pym)) == 2
+
+
+def test_compute_pyLIMA_parameters_layout():
+    from pyLIMA.models import pyLIMA_fancy_parameters
+
+    event = _create_event()
+
+    Model = FSPLmodel(event,
+                      fancy_parameters=pyLIMA_fancy_parameters.StandardFancyParameters())
+
+    assert Model.parameters_layout.model_keys == ['t0', 'u0', 'log_tE', 'log_rho',
+                                                  'fsource_Test', 'ftotal_Test']
+    assert [conversion[0] for conversion in
+            Model.parameters_layout.conversions] == ['tE', 'rho']
+
+    pym = Model.compute_pyLIMA_parameters([0.5, 0.002, 1.0, -2.0])
+
+    assert np.allclose([pym['tE'], pym['rho']], [10, 0.01])
+    assert pym['fsource_Test'] is None
+    assert 'Rmatrix' not in pym
+
+    pym['Rmatrix'] = np.eye(2)
+    pym['fsource_Test'] = 12.0
+
+    assert list(pym.keys()) == ['t0', 'u0', 'log_tE', 'log_rho', 'fsource_Test',
+                                'ftotal_Test', 'tE', 'rho', 'Rmatrix']
+    assert pym['fsource_Test'] == 12.0
+    assert np.allclose(pym.copy()['Rmatrix'], np.eye(2))
+    assert np.allclose(pym.copy().vector, [0.5, 0.002, 1.0, -2.0])
+
+
+def test_compute_the_microlensing_model_batch():
+    event = _create_event()
+
+    Model = FSPLmodel(event, double_source=['Static', 0])
+
+    parameters = np.array([[0.5, 0.002, 32.0, 0.01, 1.2, 0.1, 0.02, 0.3],
+                           [4.5, 0.2, 12.0, 0.1, -0.5, 0.05, 0.01, 0.8],
+                           [15.5, 0.02, 22.0, 0.05, 2.1, 0.3, 0.005, 0.1]])
+
+    assert Model.model_batch_capable()
+
+    pym_batch = Model.compute_pyLIMA_parameters_batch(parameters)
+
+    assert pym_batch['t0'].shape == (3, 1)
+
+    batch = Model.compute_the_microlensing_model_batch(event.telescopes[0],
+                                                       pym_batch)
+
+    for ind, vector in enumerate(parameters):
+
+        pym = Model.compute_pyLIMA_parameters(vector)
+        model = Model.compute_the_microlensing_model(event.telescopes[0], pym)
+
+        assert np.allclose(batch['photometry'][ind], model['photometry'])
+        assert np.allclose(pym_batch['fsource_Test'][ind], pym['fsource_Test'])
+        assert np.allclose(pym_batch['ftotal_Test'][ind], pym['ftotal_Test'])
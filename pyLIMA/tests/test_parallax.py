@@ -1,5 +1,7 @@
 import numpy as np
+from astropy.coordinates import solar_system_ephemeris
 from pyLIMA.parallax import astropy_ephemerides, JPL_ephemerides, parallax
+from pyLIMA.parallax import ephemerides_cache, spacecraft_trajectory
 
 from pyLIMA import telescopes
 
@@ -35,6 +37,109 @@ def test_horizons_API():
 
 
 
+HORIZONS_HEADER = """API VERSION: 1.2
+API SOURCE: NASA/JPL Horizons API
+
+*******************************************************************************
+Ephemeris / API_USER Mon Jan 16 06:01:20 2023 Pasadena, USA      / Horizons
+*******************************************************************************
+Target body name: Hubble Space Telescope (spacecraft) (-48) {source: HST_2023}
+Center body name: Earth (399)                     {source: DE441}
+Center-site name: GEOCENTRIC
+*******************************************************************************
+ Date_________JDUT, , , R.A._(ICRF), DEC__(ICRF), dRA*cosD, d(DEC)/dt, \
+            delta,     deldot,
+**************************************************************************\
+*************************
+$$SOE
+"""
+
+HORIZONS_FOOTER = """$$EOE
+*******************************************************************************
+Column meaning:
+*******************************************************************************
+"""
+
+
+def horizons_row(epoch):
+    # Horizons prints the quantities in numerical order: 1 (RA, DEC), 3 (rates),
+    # 20 (delta, deldot)
+    return (' ' + '%.9f' % epoch + ', ,m, ' + '%.7f' % (epoch % 360) +
+            ', -28.0000000, 1.5000000, -0.5000000, 0.00004631215822, 2.0000000,')
+
+
+def test_parse_horizons_ephemerides():
+    text = HORIZONS_HEADER + horizons_row(2456789) + '\n' + HORIZONS_FOOTER
+    ephemerides = JPL_ephemerides.parse_horizons_ephemerides(text)
+
+    # [JD, RA, DEC, delta, dRA*cosD, dDEC/dt, deldot]
+    assert np.allclose(ephemerides, [[2456789, 2456789 % 360, -28.0, 4.631215822e-05,
+                                      1.5, -0.5, 2.0]])
+
+
+def test_horizons_cache(tmp_path):
+    import http.server
+    import threading
+    import urllib.parse
+
+    import pytest
+
+    requests_epochs = []
+
+    class StandInHorizons(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            epochs = [float(epoch) for epoch in query['TLIST'][0].split()]
+            requests_epochs.append(epochs)
+
+            text = HORIZONS_HEADER + '\n'.join(
+                [horizons_row(epoch) for epoch in epochs]) + '\n' + HORIZONS_FOOTER
+
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(text.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHorizons)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:' + str(server.server_address[1])
+
+    try:
+        times = 2459000 + np.arange(120.)
+        ephemerides = JPL_ephemerides.horizons_ephemerides(
+            'HST', times, cache_directory=str(tmp_path), url=url, max_workers=3)
+
+        assert len(requests_epochs) == 3
+        assert np.allclose(ephemerides[:, 0], times)
+        assert np.allclose(ephemerides[:, 1], times % 360)
+        assert np.allclose(ephemerides[:, 2:], [-28.0, 4.631215822e-05, 1.5, -0.5,
+                                                2.0])
+
+        positions = JPL_ephemerides.horizons_API('HST', times[10:20],
+                                                 cache_directory=str(tmp_path),
+                                                 url=url, offline=True)[1]
+
+        assert len(requests_epochs) == 3
+        assert np.allclose(positions[:, 3], 4.631215822e-05)
+        assert np.allclose(positions, ephemerides[10:20, :4])
+
+        JPL_ephemerides.horizons_ephemerides('HST', times + 0.5,
+                                             cache_directory=str(tmp_path), url=url)
+
+        assert len(requests_epochs) == 6
+
+        with pytest.raises(JPL_ephemerides.EphemeridesException):
+            JPL_ephemerides.horizons_ephemerides('HST', times + 0.25,
+                                                 cache_directory=str(tmp_path),
+                                                 url=url, offline=True)
+
+    finally:
+        server.shutdown()
+
+
 def test_EN_trajectory_angle():
     angle = parallax.EN_trajectory_angle(0.65, -0.5)
 
@@ -81,6 +186,27 @@ def test_Earth_ephemerides():
                                        [0.00181462, -0.01573381, -0.00682075]])))
 
 
+def test_Earth_ephemerides_cache(tmp_path):
+    times = np.r_[np.linspace(2457750, 2457760, 500), 2459000.3]
+
+    with solar_system_ephemeris.set('builtin'):
+        pos_speed = astropy_ephemerides.Earth_ephemerides(times)
+
+    cache = ephemerides_cache.EarthEphemeridesCache(directory=str(tmp_path))
+    positions, speeds = cache.Earth_ephemerides(times)
+
+    assert np.allclose(positions, pos_speed[0].xyz.value.T, rtol=0, atol=10 ** -9)
+    assert np.allclose(speeds, pos_speed[1].xyz.value.T, rtol=0, atol=10 ** -9)
+    assert len(list(tmp_path.glob('*.npy'))) == 2
+
+    cache.clear()
+    position, speed = cache.Earth_ephemerides(2459000.3)
+
+    assert position.shape == (3,)
+    assert np.allclose(position, positions[-1], rtol=0, atol=10 ** -15)
+    assert np.allclose(speed, speeds[-1], rtol=0, atol=10 ** -15)
+
+
 def test_Earth_telescope_sidereal_times():
     times = np.array([258927, 2458936])
 
@@ -91,6 +217,30 @@ def test_Earth_telescope_sidereal_times():
     assert np.allclose(eph, [3.73945738, 0.09380926])
 
 
+def test_Greenwich_sidereal_times():
+    times = np.linspace(2450000, 2461000, 1000)
+
+    for sidereal_type in ['mean', 'apparent']:
+        astropy_sidereal = parallax.Earth_telescope_sidereal_times(
+            times, sidereal_type=sidereal_type)
+        numpy_sidereal = parallax.Earth_telescope_sidereal_times(
+            times, sidereal_type=sidereal_type, method='numpy')
+
+        # UT1-UTC < 0.9 s
+        assert np.allclose(np.angle(np.exp(1j * (numpy_sidereal - astropy_sidereal))),
+                           0, atol=7 * 10 ** -5)
+
+    telo = telescopes.Telescope(name='fake', camera_filter='I',
+                                lightcurve=np.array([[2458936, 12.8, 0.01]]),
+                                lightcurve_names=['time', 'mag', 'err_mag'],
+                                lightcurve_units=['JD', 'mag', 'mag'])
+    telo.sidereal_method = 'numpy'
+    telo.find_sidereal_time()
+
+    assert np.allclose(telo.sidereal_times['photometry'],
+                       parallax.Greenwich_sidereal_times(np.array([2458936])))
+
+
 def test_space_ephemerides():
     lightcurve = np.array([[2456789, 12.8, 0.01], [2456790, 12, 0.25]])
     time_to_treat = lightcurve[:, 0]
@@ -114,6 +264,85 @@ def test_space_ephemerides():
 )
 
 
+def test_spacecraft_trajectory():
+    import pickle
+
+    def orbit(time):
+        ra = 2 * np.pi * time / 90
+        dec = 0.3 * np.sin(2 * np.pi * time / 120)
+        distance = 0.01 + 10 ** -4 * time
+
+        ra_rate = 2 * np.pi / 90 * np.cos(dec)
+        dec_rate = 0.3 * 2 * np.pi / 120 * np.cos(2 * np.pi * time / 120)
+
+        positions = distance[:, None] * np.c_[np.cos(dec) * np.cos(ra),
+                                              np.cos(dec) * np.sin(ra), np.sin(dec)]
+        ephemerides = np.c_[2459000 + time, ra * 180 / np.pi, dec * 180 / np.pi,
+                            distance,
+                            ra_rate / spacecraft_trajectory.ARCSECOND_PER_HOUR,
+                            dec_rate / spacecraft_trajectory.ARCSECOND_PER_HOUR,
+                            10 ** -4 * spacecraft_trajectory.AU_KM / 86400 +
+                            0 * time]
+
+        return ephemerides, positions
+
+    ephemerides, positions = orbit(np.arange(0, 101, 2.))
+    times, true_positions = orbit(np.linspace(0, 100, 1001))
+
+    trajectory = spacecraft_trajectory.SpacecraftTrajectory(ephemerides)
+    no_speeds_trajectory = spacecraft_trajectory.SpacecraftTrajectory(
+        ephemerides[:, :4])
+
+    assert trajectory.velocity_aware
+    assert not no_speeds_trajectory.velocity_aware
+    assert np.allclose(trajectory.positions, positions)
+
+    # Real Horizons layout: RA, DEC, dRA*cosD, d(DEC)/dt, delta, deldot
+    rows = [' ' + '%.9f' % row[0] + ', , , ' + ', '.join(
+        ['%.10f' % value for value in row[[1, 2, 4, 5, 3, 6]]]) + ','
+            for row in ephemerides]
+    text = HORIZONS_HEADER + '\n'.join(rows) + '\n' + HORIZONS_FOOTER
+    horizons_trajectory = spacecraft_trajectory.SpacecraftTrajectory(
+        JPL_ephemerides.parse_horizons_ephemerides(text))
+
+    assert np.allclose(horizons_trajectory.positions, positions, rtol=0,
+                       atol=10 ** -10)
+    assert np.allclose(horizons_trajectory.speeds, trajectory.speeds, rtol=0,
+                       atol=10 ** -10)
+
+    node_times = ephemerides[:, 0]
+    HST_sampling = JPL_ephemerides.horizons_obstimes('HST') / 24 / 60
+
+    assert trajectory.covers(node_times, max_step=HST_sampling)
+    assert not trajectory.covers(node_times + 0.5, max_step=HST_sampling)
+    assert trajectory.covers(node_times[:-1] + 0.5, max_step=2.0)
+    assert not trajectory.covers(node_times + 0.5)
+
+    errors = np.abs(trajectory.positions_speeds(times[:, 0])[0] - true_positions)
+    errors_no_speeds = np.abs(no_speeds_trajectory.positions_speeds(times[:, 0])[0]
+                              - true_positions)
+
+    assert errors.max() < 10 ** -7
+    assert errors_no_speeds.max() < 10 ** -4
+
+    trajectory = pickle.loads(pickle.dumps(trajectory))
+
+    telo = telescopes.Telescope(name='fake', camera_filter='I',
+                                lightcurve=np.c_[times[:, 0], [12.8] * 1001,
+                                                 [0.01] * 1001],
+                                lightcurve_names=['time', 'mag', 'err_mag'],
+                                lightcurve_units=['JD', 'mag', 'mag'],
+                                spacecraft_name='fake', location='Space')
+    telo.spacecraft_trajectory = trajectory
+
+    satellite_positions, spacecraft_positions = parallax.space_ephemerides(
+        telo, times[:, 0])
+
+    assert telo.spacecraft_trajectory is trajectory
+    assert spacecraft_positions is trajectory.spacecraft_positions
+    assert np.allclose(satellite_positions, -true_positions, atol=10 ** -7)
+
+
 def test_annual_parallax():
     times = np.array([258927, 2458936])
     earth = np.array([[-0.45314827, 0.7931182, 0.35879775],
@@ -207,6 +207,44 @@ def test_simulate_lightcurve():
                   [146.03715777, 146.06859992, 146.02559542])
 
 
+def test_simulate_lightcurve_and_fit():
+    from pyLIMA import telescopes
+    from pyLIMA.fits import TRF_fit
+    from pyLIMA.models import PSPLmodel
+
+    event = simulator.simulate_a_microlensing_event()
+    times = np.linspace(2459980, 2460020, 100)
+
+    telo = telescopes.Telescope(name='Fake', camera_filter='I',
+                                lightcurve=np.c_[times, [1000.] * 100, [10.] * 100],
+                                lightcurve_names=['time', 'flux', 'err_flux'],
+                                lightcurve_units=['JD', 'W/m^2', 'W/m^2'])
+    event.telescopes.append(telo)
+
+    # The data arrays of the flat lightcurve are built before the simulation
+    assert np.allclose(telo.data_arrays('photometry')['flux'], 1000)
+
+    Model = PSPLmodel(event)
+    params = [2460000, 0.1, 10, 5000, 6000]
+
+    pym = Model.compute_pyLIMA_parameters(params)
+    simulator.simulate_lightcurve(Model, pym, add_noise=False)
+
+    assert np.allclose(telo.data_arrays('photometry')['flux'],
+                       telo.lightcurve['flux'].value)
+
+    fluxes = Model.find_telescopes_fluxes(params[:3])
+
+    assert np.allclose([fluxes['fsource_Fake'], fluxes['ftotal_Fake']],
+                       [5000, 6000])
+
+    trf = TRF_fit.TRFfit(Model)
+    trf.model_parameters_guess = [2460000.5, 0.12, 9.5]
+    trf.fit()
+
+    assert np.allclose(trf.fit_results['best_model'], params, rtol=10 ** -4)
+
+
 def test_simulate_astrometry():
     from pyLIMA.models import PSPLmodel
 
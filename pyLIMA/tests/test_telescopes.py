@@ -50,6 +50,49 @@ def test_n_data():
     assert telo.n_data() == 2
 
 
+def test_data_arrays():
+    telo = simulate_telescope()
+
+    photometry = telo.data_arrays('photometry')
+
+    assert photometry is telo.data_arrays('photometry')
+    assert np.allclose(photometry['time'], [2456789, 2457789])
+    assert np.allclose(photometry['flux'], telo.lightcurve['flux'].value)
+    assert np.allclose(photometry['weights_flux'],
+                       1 / telo.lightcurve['err_flux'].value ** 2)
+    assert photometry['flux'].flags.c_contiguous
+    assert not photometry['flux'].flags.writeable
+    assert 'deltas_positions' not in photometry
+
+    astrometry = telo.data_arrays('astrometry')
+
+    assert np.allclose(astrometry['weights_dec'], 1 / 0.002 ** 2)
+
+    telo.deltas_positions['photometry'] = np.zeros((2, 2))
+    photometry = telo.data_arrays('photometry')
+
+    assert np.allclose(photometry['deltas_positions'], 0)
+
+    # The frozen arrays are copies, the telescope data stay writable
+    assert telo.deltas_positions['photometry'].flags.writeable
+    assert telo.lightcurve['flux'].value.flags.writeable
+    assert not np.shares_memory(photometry['flux'], telo.lightcurve['flux'].value)
+
+    telo.deltas_positions['photometry'][0, 0] = 1.0
+
+    assert photometry['deltas_positions'][0, 0] == 0
+
+    # A replaced column is detected
+    telo.lightcurve['flux'] = telo.lightcurve['flux'].value * 2
+
+    assert np.allclose(telo.data_arrays('photometry')['flux'],
+                       2 * photometry['flux'])
+
+    telo.lightcurve = telo.lightcurve[:1]
+
+    assert len(telo.data_arrays('photometry')['time']) == 1
+
+
 def test_initialize_positions():
     telo = simulate_telescope()
 
@@ -114,6 +157,59 @@ def test_compute_parallax():
                                              [-7.86600785e-05, -1.76877826e+01]])])
 
 
+def test_compute_parallax_reprojection():
+    telo = simulate_telescope()
+
+    telo.compute_parallax(['Full', 2456790], [0.25, 0.28, 1.26], [-.25, 1.28, 0])
+    Earth_positions = telo.Earth_positions['photometry']
+    deltas_positions = telo.deltas_positions['photometry']
+
+    assert telo.positions_initialized()
+
+    telo.compute_parallax(['Annual', 2457000], [0.25, 0.28, 1.26], [-.25, 1.28, 0])
+
+    assert telo.Earth_positions['photometry'] is Earth_positions
+    assert not np.allclose(telo.deltas_positions['photometry'], deltas_positions)
+
+    other_telo = simulate_telescope()
+    other_telo.compute_parallax(['Annual', 2457000], [0.25, 0.28, 1.26],
+                                [-.25, 1.28, 0])
+
+    assert np.allclose(telo.deltas_positions['photometry'],
+                       other_telo.deltas_positions['photometry'])
+
+    telo.trim_data(photometry_mask=[True, False])
+
+    assert telo.positions_initialized()
+
+    telo.altitude = 2000
+
+    assert not telo.positions_initialized()
+
+    # New spacecraft ephemerides
+    ephemerides = np.array([[2456780, 124.8, 18.3, 0.0097],
+                            [2457800, 124.8, 18.3, 0.0097]])
+    telo = simulate_telescope(location='Space', spacecraft_name='Gaia')
+    telo.spacecraft_positions = {'photometry': ephemerides,
+                                 'astrometry': ephemerides}
+
+    telo.compute_parallax(['Full', 2456790], [0.25, 0.28, 1.26], [-.25, 1.28, 0])
+    deltas_positions = telo.deltas_positions['photometry']
+
+    assert telo.positions_initialized()
+
+    ephemerides = ephemerides.copy()
+    ephemerides[:, 3] *= 2
+    telo.spacecraft_positions['photometry'] = ephemerides
+
+    assert not telo.positions_initialized()
+
+    telo.compute_parallax(['Full', 2456790], [0.25, 0.28, 1.26], [-.25, 1.28, 0])
+
+    assert telo.positions_initialized()
+    assert not np.allclose(telo.deltas_positions['photometry'], deltas_positions)
+
+
 def test_define_limb_darkening_coefficients():
     telo = simulate_telescope()
 
@@ -1,5 +1,7 @@
 import numpy as np
 from pyLIMA.toolbox import brightness_transformation
+from pyLIMA.toolbox import flux_regression
+from pyLIMA.toolbox import time_series
 
 
 def test_magnitude_to_flux():
@@ -37,3 +39,47 @@ def test_noisy_observations():
     flux_obs = brightness_transformation.noisy_observations(flux, exp_time=None)
 
     assert flux_obs != flux
+
+
+def test_solve_fluxes():
+    magnification = np.array([1.0, 1.5, 3.0, 7.0, 2.0])
+    err_flux = np.array([1.0, 2.0, 1.0, 0.5, 1.0])
+    flux = 100 * magnification + 20 + np.array([0.5, -1.0, 0.3, 0.1, -0.2])
+
+    data = time_series.construct_time_series(
+        np.c_[np.arange(5), flux, err_flux], ['time', 'flux', 'err_flux'],
+        ['JD', 'W/m^2', 'W/m^2'])
+    data_arrays = time_series.construct_data_arrays(data)
+
+    fluxes, covariance = np.polyfit(magnification, flux, 1, w=1 / err_flux,
+                                    cov='unscaled')
+
+    sums = flux_regression.weighted_sums(magnification, data_arrays)
+    f_source, f_blend, fblend_covariance = flux_regression.solve_fluxes(sums,
+                                                                        'fblend')
+
+    assert np.allclose([f_source, f_blend], fluxes)
+    assert np.allclose(fblend_covariance, covariance)
+
+    # ftotal = fsource+fblend
+    ftotal_covariance = flux_regression.solve_fluxes(sums, 'ftotal')[2]
+
+    assert np.allclose(ftotal_covariance[1, 1], covariance.sum())
+
+    f_source, f_blend, noblend_covariance = flux_regression.solve_fluxes(sums,
+                                                                         'noblend')
+
+    assert np.allclose(f_source, np.sum(magnification * flux / err_flux ** 2) /
+                       np.sum(magnification ** 2 / err_flux ** 2))
+    assert f_blend == 0
+
+    # Several telescopes (or sets of parameters) at once
+    sums = flux_regression.telescopes_weighted_sums([magnification,
+                                                     magnification ** 2],
+                                                    [data_arrays, data_arrays])
+    batch_sums = flux_regression.weighted_sums(np.array([magnification,
+                                                         magnification ** 2]),
+                                               data_arrays)
+
+    assert np.allclose(sums, batch_sums)
+    assert np.allclose(flux_regression.solve_fluxes(sums)[0][0], fluxes[0])
@@ -65,7 +65,7 @@ def replicate_a_telescope(microlensing_model, telescope_index, lightcurve_time=N
 
     attributes_to_copy = ['name','filter','location','ld_gamma','ld_sigma','ld_a1',
                           'ld_a2', 'ld_gamma1','ld_gamma2','location','spacecraft_name',
-                          'pixel_scale']
+                          'spacecraft_trajectory', 'pixel_scale']
 
     for key in attributes_to_copy:
 
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+def weighted_sums(magnification, data_arrays):
+    """
+    The weighted sums of the linear regression flux = f_source*A + f_blend, i.e. the
+    terms of the 2x2 normal equations. The second order terms are centered on the
+    weighted mean magnification, to avoid cancellations when the magnification is
+    almost constant. The data sums are cached in the data_arrays, see
+    time_series.construct_data_arrays.
+
+    Parameters
+    ----------
+    magnification : array, the (N,) or (K,N) magnification A
+    data_arrays : dict, the photometric data arrays of the telescope
+
+    Returns
+    -------
+    sums : array, the [sum(w),sum(w*F),sum(w*A),sum(w*(A-<A>)**2),
+    sum(w*(A-<A>)*F)] (each of shape (K,) for a (K,N) magnification)
+    """
+    weights = data_arrays['weights_flux']
+    sum_weights = data_arrays['sum_weights_flux']
+
+    sum_magnification = np.dot(magnification, weights)
+
+    centered_magnification = magnification - (sum_magnification /
+                                              sum_weights)[..., None]
+
+    sum_magnification2 = np.dot(centered_magnification ** 2, weights)
+    sum_flux_magnification = np.dot(centered_magnification,
+                                    data_arrays['weighted_flux'])
+
+    sums = np.array([np.zeros(np.shape(sum_magnification)) + sum_weights,
+                     np.zeros(np.shape(sum_magnification)) +
+                     data_arrays['sum_weighted_flux'],
+                     sum_magnification, sum_magnification2, sum_flux_magnification])
+
+    return sums
+
+
+def telescopes_weighted_sums(magnifications, telescopes_data_arrays):
+    """
+    The weighted sums of several telescopes in one pass, see weighted_sums
+
+    Parameters
+    ----------
+    magnifications : list, the (N_i,) magnification of each telescope
+    telescopes_data_arrays : list, the photometric data arrays of each telescope
+
+    Returns
+    -------
+    sums : array, the (5,n_telescopes) weighted sums
+    """
+    n_telescopes = len(magnifications)
+    n_data = [len(magnification) for magnification in magnifications]
+
+    telescopes_index = np.repeat(np.arange(n_telescopes), n_data)
+
+    magnification = np.concatenate(magnifications)
+    weights = np.concatenate([data_arrays['weights_flux'] for data_arrays in
+                              telescopes_data_arrays])
+    weighted_flux = np.concatenate([data_arrays['weighted_flux'] for data_arrays in
+                                    telescopes_data_arrays])
+
+    sum_weights = np.array([data_arrays['sum_weights_flux'] for data_arrays in
+                            telescopes_data_arrays], dtype=float)
+    sum_flux = np.array([data_arrays['sum_weighted_flux'] for data_arrays in
+                         telescopes_data_arrays], dtype=float)
+
+    sum_magnification = np.bincount(telescopes_index, weights * magnification,
+                                    n_telescopes)
+
+    centered_magnification = magnification - (sum_magnification /
+                                              sum_weights)[telescopes_index]
+
+    sums = np.array([sum_weights, sum_flux, sum_magnification,
+                     np.bincount(telescopes_index,
+                                 weights * centered_magnification ** 2, n_telescopes),
+                     np.bincount(telescopes_index,
+                                 weighted_flux * centered_magnification,
+                                 n_telescopes)])
+
+    return sums
+
+
+def median_source_flux(magnification, data_arrays):
+    """
+    The robust source flux estimator without blending, i.e. median(flux/A)
+
+    Parameters
+    ----------
+    magnification : array, the (N,) or (K,N) magnification A
+    data_arrays : dict, the photometric data arrays of the telescope
+
+    Returns
+    -------
+    f_source : float or array, the (K,) source fluxes for a (K,N) magnification
+    """
+    with np.errstate(all='ignore'):
+
+        f_source = np.median(data_arrays['flux'] / magnification, axis=-1)
+
+    return f_source
+
+
+def solve_fluxes(sums, blend_flux_parameter='ftotal'):
+    """
+    Solve the weighted linear regressions flux = f_source*A + f_blend in closed form,
+    i.e. the 2x2 normal equations, for any number of telescopes (or sets of
+    parameters). The covariance is the inverse of the normal matrix, transformed to
+    the blend_flux_parameter, i.e. (fsource,fblend), (fsource,gblend=fblend/fsource),
+    (fsource,ftotal=fsource+fblend) or (fsource,) if 'noblend'. Degenerated
+    regressions (e.g. a constant magnification) give null fluxes. Note that the
+    models estimate the 'noblend' source flux with median_source_flux by default.
+
+    Parameters
+    ----------
+    sums : array, the weighted sums, see weighted_sums
+    blend_flux_parameter : str, 'fblend', 'gblend', 'ftotal' or 'noblend'
+
+    Returns
+    -------
+    f_source : array, the source fluxes
+    f_blend : array, the blend fluxes
+    covariance : array, the (...,2,2) covariance matrices of (fsource,blend
+    parameter), the blend terms are null if 'noblend'
+    """
+    (sum_weights, sum_flux, sum_magnification, centered_sum_magnification2,
+     centered_sum_flux_magnification) = sums
+
+    covariance = np.zeros(np.shape(sum_weights) + (2, 2))
+
+    with np.errstate(all='ignore'):
+
+        mean_magnification = sum_magnification / sum_weights
+
+        if blend_flux_parameter == 'noblend':
+
+            sum_magnification2 = centered_sum_magnification2 + \
+                                 mean_magnification * sum_magnification
+            sum_flux_magnification = centered_sum_flux_magnification + \
+                                     mean_magnification * sum_flux
+
+            f_source = sum_flux_magnification / sum_magnification2
+            f_blend = np.zeros(np.shape(f_source))
+
+            covariance[..., 0, 0] = 1 / sum_magnification2
+
+        else:
+
+            f_source = centered_sum_flux_magnification / centered_sum_magnification2
+            f_blend = (sum_flux - f_source * sum_magnification) / sum_weights
+
+            # The inverse of the normal matrix
+            covariance[..., 0, 0] = 1 / centered_sum_magnification2
+            covariance[..., 0, 1] = -mean_magnification / centered_sum_magnification2
+            covariance[..., 1, 0] = covariance[..., 0, 1]
+            covariance[..., 1, 1] = 1 / sum_weights + \
+                                    mean_magnification ** 2 / \
+                                    centered_sum_magnification2
+
+            if blend_flux_parameter != 'fblend':
+
+                # Jacobian of (fsource,blend parameter) with (fsource,fblend)
+                jacobian = np.zeros(covariance.shape)
+                jacobian[..., 0, 0] = 1
+
+                if blend_flux_parameter == 'gblend':
+
+                    jacobian[..., 1, 0] = -f_blend / f_source ** 2
+                    jacobian[..., 1, 1] = 1 / f_source
+
+                if blend_flux_parameter == 'ftotal':
+
+                    jacobian[..., 1, 0] = 1
+                    jacobian[..., 1, 1] = 1
+
+                covariance = jacobian @ covariance @ np.swapaxes(jacobian, -1, -2)
+
+    bad_fit = ~(np.isfinite(f_source) & np.isfinite(f_blend))
+
+    f_source = np.where(bad_fit, 0.0, f_source)
+    f_blend = np.where(bad_fit, 0.0, f_blend)
+
+    return f_source, f_blend, covariance
@@ -61,3 +61,49 @@ def construct_time_series(data, columns_names, column_units):
     time_sorted_table = table[table['time'].argsort()]
 
     return time_sorted_table
+
+
+def construct_data_arrays(data, deltas_positions=None):
+    """
+    Construct the frozen arrays of a time series, used in the models and fits to
+    avoid the astropy Quantity machinery
+
+    Parameters
+    ----------
+    data : array, the astropy table
+    deltas_positions : array, the parallax deltas positions of the time series
+
+    Returns
+    -------
+    data_arrays : dict, a dictionnary of read-only C-contiguous float64 copies,
+    one per column, the weights (i.e. 1/err**2) of each 'err_' column, the
+    deltas_positions if given and the flux weighted sums of the fluxes linear
+    regression (see flux_regression.weighted_sums)
+    """
+    data_arrays = {}
+
+    for key in data.columns.keys():
+
+        # copies, so that freezing them leaves the table columns writable
+        data_arrays[key] = np.array(data[key].value, dtype=np.float64, copy=True)
+
+        if key.startswith('err_'):
+            data_arrays['weights_' + key[4:]] = 1 / data_arrays[key] ** 2
+
+    if 'weights_flux' in data_arrays:
+        data_arrays['weighted_flux'] = data_arrays['weights_flux'] * data_arrays[
+            'flux']
+        data_arrays['sum_weights_flux'] = np.array(np.sum(data_arrays[
+                                                              'weights_flux']))
+        data_arrays['sum_weighted_flux'] = np.array(np.sum(data_arrays[
+                                                               'weighted_flux']))
+
+    if deltas_positions is not None:
+        data_arrays['deltas_positions'] = np.array(deltas_positions,
+                                                    dtype=np.float64, copy=True)
+
+    for array in data_arrays.values():
+
+        array.flags.writeable = False
+
+    return data_arrays